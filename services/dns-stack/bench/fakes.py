@@ -0,0 +1,508 @@
+"""
+Local stand-ins for the UniFi, Netbox and Technitium APIs
+
+Serves just enough of each API for the DNS stack scripts to run end to
+end without live appliances:
+
+    UniFi:       GET  /proxy/network/api/s/<site>/stat/sta
+    Netbox:      GET  /api/status/, /api/dcim/sites/, /api/ipam/prefixes/
+                 GET/POST/PATCH /api/ipam/ip-addresses/ (single and bulk; filters,
+                      ordering=last_updated and last_updated bumped on writes)
+                 POST /api/users/tokens/provision/
+    Technitium:  GET  /api/user/login, /api/user/session/get, /api/zones/create,
+                      /api/settings/set, /api/zones/records/{get,add,delete}
+                 POST /api/zones/import
+
+All three APIs are served from one port.
+
+FakeUpdateServer adds Technitium's RFC 2136 dynamic updates (TSIG-signed
+UPDATE messages over TCP) on top of the same record store; it needs
+dnspython. Latency and error rate are
+configurable, and every request is counted per endpoint. Technitium
+session tokens are checked, and reset() invalidates them all.
+"""
+
+import base64
+import hashlib
+import json
+import random
+import re
+import socket
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List
+from urllib.parse import parse_qs, urlparse
+
+
+def host_ip(i: int) -> str:
+    """Address of the i-th fake host, spread across 10.203.0.0/16"""
+    return f"10.203.{i // 254}.{i % 254 + 1}"
+
+
+class FakeBackend:
+    """Shared in-memory state for all fake APIs"""
+
+    def __init__(self, hosts: int = 100, latency: float = 0.0, error_rate: float = 0.0,
+                 seed: int = 0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests: Dict[str, int] = {}
+        self.bytes_sent = 0
+        self.logins = 0  # Never reset, so tokens from before a reset stay invalid
+        self.reset(hosts)
+
+    def reset(self, hosts: int):
+        """Load a fresh dataset of `hosts` clients and an empty zone"""
+        now = int(time.time())
+        with self.lock:
+            self.clients = [{
+                "mac": f"02:00:{i >> 24 & 255:02x}:{i >> 16 & 255:02x}:{i >> 8 & 255:02x}:{i & 255:02x}",
+                "ip": host_ip(i),
+                "hostname": f"host-{i}",
+                "last_seen": now,
+                "is_wired": i % 3 == 0,
+                "oui": "Fake",
+                "uptime": 3600,
+                "tx_bytes": 12345,
+                "rx_bytes": 67890,
+            } for i in range(hosts)]
+            self.ip_addresses = [{
+                "id": i + 1,
+                "address": f"{host_ip(i)}/16",
+                "dns_name": f"host-{i}",
+                "status": {"value": "active", "label": "Active"},
+                "description": "",
+                "last_updated": "2026-01-01T00:00:00Z",
+            } for i in range(hosts)]
+            self.next_ip_id = hosts + 1
+            self.zones = {}
+            self.records: Dict[tuple, List[Dict]] = {}
+            self.requests = {}
+            self.bytes_sent = 0
+            self.tokens = set()  # Technitium sessions; a reset logs everyone out
+
+    def count(self, endpoint: str):
+        with self.lock:
+            self.requests[endpoint] = self.requests.get(endpoint, 0) + 1
+
+    def total_requests(self) -> int:
+        with self.lock:
+            return sum(self.requests.values())
+
+    # -- Technitium record helpers -------------------------------------------
+
+    def set_records(self, name: str, rtype: str, records: List[Dict], overwrite: bool):
+        with self.lock:
+            key = (name.lower(), rtype)
+            if overwrite or key not in self.records:
+                self.records[key] = records
+            else:
+                existing = self.records[key]
+                existing.extend(r for r in records if r["rData"] not in [e["rData"] for e in existing])
+
+    def delete_records(self, name: str, rtype: str, rdata: Dict):
+        with self.lock:
+            key = (name.lower(), rtype)
+            remaining = [r for r in self.records.get(key, []) if r["rData"] != rdata]
+            if remaining:
+                self.records[key] = remaining
+            else:
+                self.records.pop(key, None)
+
+
+def timestamp() -> str:
+    """Netbox-style last_updated value for now"""
+    return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+
+def record_data(rtype: str, params: Dict[str, str]) -> Dict:
+    """Technitium rData for the record type, built from API parameters"""
+    if rtype == "A" or rtype == "AAAA":
+        return {"ipAddress": params.get("ipAddress", "")}
+    if rtype == "PTR":
+        return {"ptrName": params.get("ptrName", "")}
+    if rtype == "TXT":
+        return {"text": params.get("text", "")}
+    return {"value": params.get("value", "")}
+
+
+ZONE_LINE = re.compile(r"^(\S+)\s+(\d+)\s+IN\s+(\S+)\s+(.+)$")
+
+
+class FakeHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    wbufsize = 1 << 16  # Send headers and body in one segment (avoids delayed-ACK stalls)
+    backend: FakeBackend = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def reply(self, status: int, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        with self.backend.lock:
+            self.backend.bytes_sent += len(body)
+
+    def read_body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        if self.headers.get("Content-Type", "").startswith("application/json") and raw:
+            return json.loads(raw)
+        return raw.decode()
+
+    def handle_request(self, method: str):
+        url = urlparse(self.path)
+        params = {k: v[0] for k, v in parse_qs(url.query).items()}
+        multi = parse_qs(url.query)
+        body = self.read_body() if method != "GET" else None
+        path = url.path
+        endpoint = re.sub(r"/\d+/$", "/{id}/", re.sub(r"/s/[^/]+/", "/s/{site}/", path))
+        backend = self.backend
+        backend.count(f"{method} {endpoint}")
+
+        if backend.latency:
+            time.sleep(backend.latency)
+        if backend.error_rate and backend.random.random() < backend.error_rate:
+            return self.reply(503, {"error": "injected failure"})
+
+        if path.endswith("/stat/sta"):
+            return self.reply(200, {"meta": {"rc": "ok"}, "data": backend.clients})
+        if path.startswith("/api/zones/") or path.startswith("/api/user/") or path == "/api/settings/set":
+            return self.technitium(path, params, body)
+        if path.startswith("/api/"):
+            return self.netbox(method, path, params, multi, body)
+        return self.reply(404, {"error": f"unknown endpoint {path}"})
+
+    # -- Technitium ----------------------------------------------------------
+
+    def technitium(self, path: str, params: Dict[str, str], body):
+        backend = self.backend
+        if path == "/api/user/login":
+            with backend.lock:
+                backend.logins += 1
+                token = f"fake-token-{backend.logins}"
+                backend.tokens.add(token)
+            return self.reply(200, {"status": "ok", "token": token})
+        with backend.lock:
+            valid = params.get("token") in backend.tokens
+        if not valid:
+            return self.reply(200, {"status": "invalid-token",
+                                    "errorMessage": "Invalid token or session expired."})
+        if path == "/api/user/session/get":
+            return self.reply(200, {"status": "ok", "response": {"username": params.get("user", "admin")}})
+        if path in ("/api/zones/create", "/api/settings/set"):
+            return self.reply(200, {"status": "ok", "response": {}})
+        if path == "/api/zones/records/get":
+            zone = params.get("zone", "").lower()
+            domain = params.get("domain", zone).lower()
+            with backend.lock:
+                if params.get("listZone") == "true":
+                    records = [r for (name, _), rs in backend.records.items()
+                               if name == zone or name.endswith("." + zone) for r in rs]
+                else:
+                    records = [r for (name, _), rs in backend.records.items() if name == domain for r in rs]
+            return self.reply(200, {"status": "ok", "response": {"records": records}})
+        if path == "/api/zones/records/add":
+            rtype = params.get("type", "A")
+            record = {
+                "name": params.get("domain", ""),
+                "type": rtype,
+                "ttl": int(params.get("ttl", 3600)),
+                "rData": record_data(rtype, params),
+                "comments": params.get("comments", ""),
+            }
+            backend.set_records(record["name"], rtype, [record], params.get("overwrite") == "true")
+            return self.reply(200, {"status": "ok", "response": {"addedRecord": record}})
+        if path == "/api/zones/records/delete":
+            rtype = params.get("type", "A")
+            backend.delete_records(params.get("domain", ""), rtype, record_data(rtype, params))
+            return self.reply(200, {"status": "ok", "response": {}})
+        if path == "/api/zones/import":
+            imported: Dict[tuple, List[Dict]] = {}
+            for line in (body or "").splitlines():
+                match = ZONE_LINE.match(line.strip())
+                if not match:
+                    continue
+                name, ttl, rtype, value = match.groups()
+                name = name.rstrip(".")
+                key = "ipAddress" if rtype in ("A", "AAAA") else "ptrName" if rtype == "PTR" else "text"
+                imported.setdefault((name, rtype), []).append({
+                    "name": name, "type": rtype, "ttl": int(ttl),
+                    "rData": {key: value.strip().strip('"').rstrip(".") if rtype == "PTR" else value.strip().strip('"')},
+                    "comments": "",
+                })
+            for (name, rtype), records in imported.items():
+                backend.set_records(name, rtype, records, params.get("overwrite") == "true")
+            return self.reply(200, {"status": "ok", "response": {}})
+        return self.reply(404, {"status": "error", "errorMessage": f"unknown endpoint {path}"})
+
+    # -- Netbox --------------------------------------------------------------
+
+    def netbox(self, method: str, path: str, params: Dict[str, str], multi: Dict[str, List[str]], body):
+        backend = self.backend
+        if path == "/api/status/":
+            return self.reply(200, {"netbox-version": "4.1.0"})
+        if path == "/api/users/tokens/provision/":
+            return self.reply(201, {"key": "0" * 40})
+        if path in ("/api/dcim/sites/", "/api/ipam/prefixes/"):
+            if method == "GET":
+                return self.reply(200, {"count": 1, "next": None, "results": [{"id": 1}]})
+            return self.reply(201, {"id": 1})
+        if path == "/api/ipam/ip-addresses/":
+            if method == "GET":
+                return self.list_ip_addresses(params, multi)
+            if method == "POST":
+                items = body if isinstance(body, list) else [body]
+                created = []
+                with backend.lock:
+                    for item in items:
+                        record = dict(item, id=backend.next_ip_id,
+                                      status={"value": item.get("status", "active")},
+                                      last_updated=timestamp())
+                        backend.next_ip_id += 1
+                        backend.ip_addresses.append(record)
+                        created.append(record)
+                return self.reply(201, created if isinstance(body, list) else created[0])
+            if method == "PATCH":
+                return self.reply(200, self.patch_ip_addresses(body if isinstance(body, list) else [body]))
+        match = re.match(r"^/api/ipam/ip-addresses/(\d+)/$", path)
+        if match and method == "PATCH":
+            return self.reply(200, self.patch_ip_addresses([dict(body, id=int(match.group(1)))])[0])
+        return self.reply(404, {"detail": "Not found."})
+
+    def list_ip_addresses(self, params: Dict[str, str], multi: Dict[str, List[str]]):
+        backend = self.backend
+        with backend.lock:
+            results = backend.ip_addresses
+            if "address" in params:
+                host = params["address"].split("/")[0]
+                results = [r for r in results if r["address"].split("/")[0] == host]
+            if params.get("dns_name__empty") == "false":
+                results = [r for r in results if r.get("dns_name")]
+            if "status" in multi:
+                results = [r for r in results if r["status"]["value"] in multi["status"]]
+            if "last_updated__gte" in params:
+                results = [r for r in results if r.get("last_updated", "") >= params["last_updated__gte"]]
+            if "parent" in params:
+                import ipaddress
+                network = ipaddress.ip_network(params["parent"], strict=False)
+                results = [r for r in results if ipaddress.ip_address(r["address"].split("/")[0]) in network]
+            if params.get("ordering", "").lstrip("-") == "last_updated":
+                results = sorted(results, key=lambda r: r.get("last_updated", ""),
+                                 reverse=params["ordering"].startswith("-"))
+            results = list(results)
+
+        limit = int(params.get("limit", 50)) or 1000
+        limit = min(limit, 1000)  # Netbox MAX_PAGE_SIZE
+        offset = int(params.get("offset", 0))
+        page = results[offset:offset + limit]
+        if "fields" in params:
+            fields = params["fields"].split(",")
+            page = [{k: r.get(k) for k in fields} for r in page]
+
+        next_url = None
+        if offset + limit < len(results):
+            query = {k: v for k, v in params.items()}
+            query.update(limit=limit, offset=offset + limit)
+            next_url = (f"http://{self.headers['Host']}/api/ipam/ip-addresses/?"
+                        + "&".join(f"{k}={v}" for k, v in query.items()))
+        return self.reply(200, {"count": len(results), "next": next_url, "previous": None, "results": page})
+
+    def patch_ip_addresses(self, items: List[Dict]) -> List[Dict]:
+        backend = self.backend
+        updated = []
+        with backend.lock:
+            by_id = {r["id"]: r for r in backend.ip_addresses}
+            for item in items:
+                record = by_id.get(item.get("id"))
+                if record is not None:
+                    record.update({k: v for k, v in item.items() if k != "id"})
+                    record["last_updated"] = timestamp()
+                    updated.append(record)
+        return updated
+
+    def do_GET(self):
+        self.handle_request("GET")
+
+    def do_POST(self):
+        self.handle_request("POST")
+
+    def do_PATCH(self):
+        self.handle_request("PATCH")
+
+
+class FakeServer:
+    """Runs the fake APIs on a background thread"""
+
+    def __init__(self, backend: FakeBackend, host: str = "127.0.0.1", port: int = 0):
+        handler = type("Handler", (FakeHandler,), {"backend": backend})
+        self.backend = backend
+        self.httpd = ThreadingHTTPServer((host, port), handler)
+        self.httpd.daemon_threads = True
+        self.url = f"http://{host}:{self.httpd.server_port}"
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class FakeUpdateServer:
+    """
+    DNS server accepting TSIG-signed RFC 2136 UPDATE messages over TCP and
+    applying them to the backend's records, one counted request
+    ("dns-update") per message. Messages with a bad signature get NOTAUTH
+    and change nothing.
+    """
+
+    def __init__(self, backend: FakeBackend, key_name: str, secret: str, host: str = "127.0.0.1",
+                 port: int = 0):
+        import dns.tsigkeyring
+        self.backend = backend
+        self.keyring = dns.tsigkeyring.from_text({key_name: secret})
+        self.sock = socket.create_server((host, port))
+        self.host = host
+        self.port = self.sock.getsockname()[1]
+        threading.Thread(target=self.accept, daemon=True).start()
+
+    def accept(self):
+        while True:
+            try:
+                conn, _ = self.sock.accept()
+            except OSError:
+                return
+            threading.Thread(target=self.serve, args=(conn,), daemon=True).start()
+
+    def serve(self, conn: socket.socket):
+        def read(size: int) -> bytes:
+            data = b""
+            while len(data) < size:
+                chunk = conn.recv(size - len(data))
+                if not chunk:
+                    raise EOFError
+                data += chunk
+            return data
+
+        with conn:
+            while True:
+                try:
+                    wire = read(int.from_bytes(read(2), "big"))
+                except (EOFError, OSError):
+                    return
+                response = self.handle(wire).to_wire()
+                conn.sendall(len(response).to_bytes(2, "big") + response)
+
+    def handle(self, wire: bytes):
+        import dns.exception
+        import dns.message
+        import dns.rcode
+        import dns.rdataclass
+        import dns.rdatatype
+
+        backend = self.backend
+        backend.count("dns-update")
+        if backend.latency:
+            time.sleep(backend.latency)
+        try:
+            message = dns.message.from_wire(wire, keyring=self.keyring)
+        except dns.exception.DNSException:
+            response = dns.message.make_response(dns.message.from_wire(wire, keyring=False))
+            response.set_rcode(dns.rcode.NOTAUTH)
+            return response
+
+        for rrset in message.update:
+            name = rrset.name.to_text(omit_final_dot=True).lower()
+            rtype = dns.rdatatype.to_text(rrset.rdtype)
+            if rrset.deleting == dns.rdataclass.ANY:  # Delete the RRset (or every RRset) at the name
+                with backend.lock:
+                    for key in [key for key in backend.records
+                                if key[0] == name and rtype in ("ANY", key[1])]:
+                        del backend.records[key]
+                continue
+            records = []
+            for rdata in rrset:
+                if rtype in ("A", "AAAA"):
+                    data = {"ipAddress": rdata.address}
+                elif rtype == "PTR":
+                    data = {"ptrName": rdata.target.to_text(omit_final_dot=True)}
+                else:
+                    data = {"value": rdata.to_text()}
+                records.append({"name": name, "type": rtype, "ttl": rrset.ttl, "rData": data,
+                                "comments": ""})
+            if rrset.deleting == dns.rdataclass.NONE:  # Delete specific records
+                for record in records:
+                    backend.delete_records(name, rtype, record["rData"])
+            else:
+                backend.set_records(name, rtype, records, overwrite=False)
+        return dns.message.make_response(message)
+
+    def close(self):
+        self.sock.close()
+
+
+class FakeEventServer:
+    """
+    Minimal UniFi event websocket for exercising unifi-dns-sync --daemon.
+    Accepts any path, and send() pushes a JSON text frame to every client.
+    """
+
+    GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        self.sock = socket.create_server((host, port))
+        self.url = f"ws://{host}:{self.sock.getsockname()[1]}"
+        self.connections: List[socket.socket] = []
+        threading.Thread(target=self.accept, daemon=True).start()
+
+    def accept(self):
+        while True:
+            try:
+                conn, _ = self.sock.accept()
+            except OSError:
+                return
+            request = b""
+            while b"\r\n\r\n" not in request:
+                chunk = conn.recv(4096)
+                if not chunk:
+                    break
+                request += chunk
+            key = re.search(rb"Sec-WebSocket-Key:\s*(\S+)", request, re.IGNORECASE)
+            if not key:
+                conn.close()
+                continue
+            accept = base64.b64encode(hashlib.sha1(key.group(1) + self.GUID.encode()).digest()).decode()
+            conn.sendall(("HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\n"
+                          f"Connection: Upgrade\r\nSec-WebSocket-Accept: {accept}\r\n\r\n").encode())
+            self.connections.append(conn)
+
+    def send(self, message: Dict):
+        payload = json.dumps(message).encode()
+        size = len(payload)
+        if size < 126:
+            header = bytes([0x81, size])
+        elif size < 65536:
+            header = bytes([0x81, 126]) + size.to_bytes(2, "big")
+        else:
+            header = bytes([0x81, 127]) + size.to_bytes(8, "big")
+        for conn in list(self.connections):
+            try:
+                conn.sendall(header + payload)
+            except OSError:
+                self.connections.remove(conn)
+
+    def close(self):
+        self.sock.close()
+        for conn in self.connections:
+            conn.close()
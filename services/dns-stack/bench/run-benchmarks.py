@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+"""
+Benchmark the DNS stack scripts against local fake APIs
+
+Runs each script's sync path end to end against fakes.py, so changes to
+batching, paging or pooling can be measured without touching the real
+UniFi controller, Netbox or Technitium. Every scenario runs in its own
+subprocess, which keeps peak RSS per scenario and excludes the fakes.
+
+Scenarios:
+    unifi-full            unifi-dns-sync.py sync(), full resync into an empty zone
+    unifi-incremental     unifi-dns-sync.py sync(), second run with a warm state cache
+    netbox-dns            sync-netbox-to-dns.py sync_netbox_to_dns() into an empty zone
+    netbox-dns-unchanged  sync-netbox-to-dns.py second run with nothing changed in Netbox
+    setup                 setup-dns-ipam.py main(), updating Netbox and filling an empty zone
+
+Usage:
+    ./run-benchmarks.py                                # All scenarios, 100/1000/10000 hosts
+    ./run-benchmarks.py --sizes 50000 --latency-ms 5   # Simulate a slow controller
+    ./run-benchmarks.py --scenarios unifi-full --bulk --error-rate 0.01
+    ./run-benchmarks.py --json > results.json          # Machine-readable results
+    ./run-benchmarks.py --scenarios unifi-full --dynamic-update  # RFC 2136 instead of HTTP writes
+
+Requirements:
+    pip3 install requests
+    pip3 install dnspython   # Only for --dynamic-update
+"""
+
+import argparse
+import importlib.util
+import json
+import os
+import re
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List
+from urllib.parse import urlparse
+
+from fakes import FakeBackend, FakeServer, FakeUpdateServer
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+STACK_DIR = os.path.dirname(BENCH_DIR)
+REPO_DIR = os.path.dirname(os.path.dirname(STACK_DIR))
+NETBOX_SYNC_TEMPLATE = os.path.join(
+    REPO_DIR, "ansible/roles/netbox-dns-sync/templates/sync-netbox-to-dns.py.j2")
+sys.path.insert(0, STACK_DIR)  # The scripts import homelab_dns from next to themselves
+
+SCENARIOS = ["unifi-full", "unifi-incremental", "netbox-dns", "netbox-dns-unchanged", "setup"]
+DEFAULT_SIZES = [100, 1000, 10000]
+ZONE = "bench.test"
+TSIG_KEY_NAME = "bench"
+TSIG_SECRET = "YmVuY2gtdHNpZy1zZWNyZXQtYmVuY2gtdHNpZy1zZWNyZXQ="
+
+
+def load_script(name: str, path: str):
+    """Import a hyphenated script as a module"""
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def render_template(path: str, values: Dict) -> str:
+    """
+    Render the handful of {{ var }} / {{ var | to_json }} substitutions the
+    sync template uses; anything fancier needs real Jinja.
+    """
+    def substitute(match):
+        name, _, filt = match.group(1).partition("|")
+        value = values[name.strip()]
+        return json.dumps(value) if filt.strip() == "to_json" else str(value)
+
+    with open(path) as f:
+        return re.sub(r"\{\{\s*(.+?)\s*\}\}", substitute, f.read())
+
+
+def run_scenario(scenario: str, url: str, workdir: str, options: argparse.Namespace) -> Dict:
+    """Child side: run one scenario against the fakes at `url`"""
+    if scenario.startswith("unifi"):
+        module = load_script("unifi_dns_sync", os.path.join(STACK_DIR, "unifi-dns-sync.py"))
+        module.UNIFI_URL = module.DNS_URL = url
+        module.DNS_ZONE = ZONE
+        module.SITE_MAPPINGS = [{"site": "default", "zone": ZONE, "networks": ["10.203.0.0/16"]}]
+        module.STATIC_RECORDS_FILE = module.NETBOX_URL = ""
+        if options.update_port:
+            module.DYNAMIC_UPDATE_ZONES = [ZONE] + module.PTR_ZONES
+            module.DYNAMIC_UPDATE_SERVER = urlparse(url).hostname
+            module.DYNAMIC_UPDATE_PORT = options.update_port
+            module.TSIG_KEY_NAME, module.TSIG_SECRET = TSIG_KEY_NAME, TSIG_SECRET
+        session = module.make_session(max(options.pool_size, options.workers), backoff=0)
+        state_file = os.path.join(workdir, "state.json")
+        started = time.perf_counter()
+        added, updated, deleted, errors = module.sync(
+            session=session, workers=options.workers, bulk=options.bulk,
+            full_resync=scenario == "unifi-full", state_file=state_file,
+            token_cache=os.path.join(workdir, "tokens.json"))
+        return {"wall": time.perf_counter() - started, "changes": added + updated + deleted,
+                "errors": errors}
+
+    if scenario.startswith("netbox-dns"):
+        rendered = os.path.join(workdir, "sync-netbox-to-dns.py")
+        with open(rendered, "w") as f:
+            f.write(render_template(NETBOX_SYNC_TEMPLATE, {
+                "sync_netbox_url": url, "sync_netbox_token": "0" * 40,
+                "sync_dns_url": url, "sync_dns_username": "admin", "sync_dns_password": "admin",
+                "sync_dns_zone": ZONE, "sync_log_file": os.path.join(workdir, "sync.log"),
+                "sync_metrics_file": os.path.join(workdir, "sync.prom"),
+                "sync_token_cache_file": os.path.join(workdir, "tokens.json"), "sync_token_max_age": 43200,
+                "sync_http_pool_size": options.pool_size, "sync_http_retries": 3,
+                "sync_http_backoff": 0, "sync_http_rate_limit": 500,
+                "sync_breaker_failures": 5, "sync_breaker_cooldown": 30, "sync_netbox_page_size": 1000,
+                "sync_netbox_page_workers": options.workers, "sync_netbox_statuses": [],
+                "sync_state_file": os.path.join(workdir, "sync-state.json"), "sync_full_interval": 3600,
+            }))
+        module = load_script("sync_netbox_to_dns", rendered)
+        session = module.make_session(max(options.pool_size, options.workers), backoff=0)
+        dns = module.TechnitiumDNS(url, "admin", "admin", session=session,
+                                   token_cache=module.TOKEN_CACHE_FILE)
+        netbox = module.NetboxClient(url, "0" * 40, session=session)
+        started = time.perf_counter()
+        dns.login()
+        added, updated, errors = module.sync_netbox_to_dns(
+            dns, netbox, ZONE, state_file=os.path.join(workdir, "sync-state.json"))
+        return {"wall": time.perf_counter() - started, "changes": added + updated, "errors": errors}
+
+    if scenario == "setup":
+        module = load_script("setup_dns_ipam", os.path.join(STACK_DIR, "setup-dns-ipam.py"))
+        module.UNIFI_URL = module.NETBOX_URL = module.DNS_URL = url
+        module.DNS_ZONE = ZONE
+        module.SITES = [{"unifi_site": "default", "name": "Bench", "slug": "bench", "zone": ZONE,
+                         "prefixes": ["10.203.0.0/16"]}]  # Matches the fake dataset
+        module.HTTP_BACKOFF = 0
+        module.SETUP_JOURNAL = os.path.join(workdir, "setup-journal.jsonl")
+        module.TOKEN_CACHE_FILE = os.path.join(workdir, "tokens.json")
+        started = time.perf_counter()
+        module.main()
+        return {"wall": time.perf_counter() - started, "changes": None, "errors": None}
+
+    raise ValueError(f"Unknown scenario: {scenario}")
+
+
+def child_main(options: argparse.Namespace):
+    """Entry point of the per-scenario subprocess; prints one JSON result"""
+    import logging
+    logging.disable(logging.WARNING if options.quiet else logging.NOTSET)
+    result = run_scenario(options.child, options.url, options.workdir, options)
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    result["peak_rss_mb"] = rss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+    print(json.dumps(result))
+
+
+def spawn(scenario: str, url: str, workdir: str, options: argparse.Namespace) -> Dict:
+    """Run one scenario in a fresh interpreter and return its result"""
+    cmd = [sys.executable, os.path.abspath(__file__), "--child", scenario, "--url", url,
+           "--workdir", workdir, "--workers", str(options.workers),
+           "--pool-size", str(options.pool_size)]
+    if options.bulk:
+        cmd.append("--bulk")
+    if options.update_port:
+        cmd += ["--update-port", str(options.update_port)]
+    if not options.verbose:
+        cmd.append("--quiet")
+    proc = subprocess.run(cmd, stdout=subprocess.PIPE, cwd=BENCH_DIR, text=True)
+    if proc.returncode != 0:
+        return {"wall": None, "changes": None, "errors": None, "peak_rss_mb": None,
+                "failed": f"exit status {proc.returncode}"}
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def benchmark(options: argparse.Namespace) -> List[Dict]:
+    backend = FakeBackend(latency=options.latency_ms / 1000, error_rate=options.error_rate,
+                          seed=options.seed)
+    results = []
+    updates = FakeUpdateServer(backend, TSIG_KEY_NAME, TSIG_SECRET) if options.dynamic_update else None
+    options.update_port = updates.port if updates else None
+    with FakeServer(backend) as server:
+        for size in options.sizes:
+            for scenario in options.scenarios:
+                backend.reset(size)
+                with tempfile.TemporaryDirectory() as workdir:
+                    warmup = {"unifi-incremental": "unifi-full",
+                              "netbox-dns-unchanged": "netbox-dns"}.get(scenario)
+                    if warmup:
+                        # Warm-up run populates the zone and the state cache
+                        spawn(warmup, server.url, workdir, options)
+                        backend.requests = {}
+                        backend.bytes_sent = 0
+                    result = spawn(scenario, server.url, workdir, options)
+                result.update(scenario=scenario, hosts=size, requests=backend.total_requests(),
+                              mb_received=backend.bytes_sent / (1024 * 1024),
+                              by_endpoint=dict(backend.requests))
+                results.append(result)
+                if not options.json:
+                    print_row(result)
+    if updates:
+        updates.close()
+    return results
+
+
+def print_row(result: Dict):
+    def fmt(value, spec):
+        width = int(re.match(r">(\d+)", spec).group(1))
+        return "-".rjust(width) if value is None else format(value, spec)
+
+    print(f"{result['scenario']:<20} {result['hosts']:>7} {fmt(result['wall'], '>9.2f')} "
+          f"{result['requests']:>9} {result['mb_received']:>8.1f} "
+          f"{fmt(result['peak_rss_mb'], '>9.1f')} {fmt(result['changes'], '>8')} "
+          f"{fmt(result['errors'], '>7')}  {result.get('failed', '')}", flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the DNS stack scripts against local fake APIs",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog=__doc__
+    )
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=SCENARIOS,
+                        help="Scenarios to run (default: all)")
+    parser.add_argument("--sizes", nargs="+", type=int, default=DEFAULT_SIZES,
+                        help="Host counts to benchmark (default: 100 1000 10000)")
+    parser.add_argument("--latency-ms", type=float, default=0,
+                        help="Latency added to every fake API response")
+    parser.add_argument("--error-rate", type=float, default=0,
+                        help="Fraction of requests answered with HTTP 503")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for injected errors")
+    parser.add_argument("--workers", type=int, default=4, help="Concurrent workers/page fetches")
+    parser.add_argument("--pool-size", type=int, default=10, help="HTTP connection pool size")
+    parser.add_argument("--bulk", action="store_true", help="Use zone-file import in unifi scenarios")
+    parser.add_argument("--dynamic-update", action="store_true",
+                        help="Write unifi scenarios' records with RFC 2136 updates (needs dnspython)")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    parser.add_argument("--verbose", "-v", action="store_true", help="Show the scripts' own logging")
+    # Internal: per-scenario subprocess
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--url", help=argparse.SUPPRESS)
+    parser.add_argument("--workdir", help=argparse.SUPPRESS)
+    parser.add_argument("--update-port", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--quiet", action="store_true", help=argparse.SUPPRESS)
+    options = parser.parse_args()
+
+    if options.child:
+        child_main(options)
+        return
+
+    if not options.json:
+        print(f"latency={options.latency_ms}ms error_rate={options.error_rate} "
+              f"workers={options.workers} bulk={options.bulk} dynamic_update={options.dynamic_update}")
+        print(f"{'scenario':<20} {'hosts':>7} {'wall (s)':>9} {'requests':>9} {'MB recv':>8} "
+              f"{'RSS (MB)':>9} {'changes':>8} {'errors':>7}")
+    results = benchmark(options)
+    if options.json:
+        print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Shared clients for the homelab DNS stack
+
+One implementation of the UniFi, Netbox and Technitium DNS API clients
+and of the HTTP transport underneath them (keep-alive pooling, retries,
+per-host rate limiting and circuit breaking), Prometheus metrics, the
+token cache, and the state cache, journals and change damping the syncs
+keep between runs (all written atomically). setup-dns-ipam.py,
+unifi-dns-sync.py and the Ansible-deployed sync-netbox-to-dns.py are thin
+command line tools on top of it.
+
+Blocking clients live in the top-level package; homelab_dns.aio has
+asyncio variants of the same clients.
+
+Requirements:
+    pip3 install requests
+"""
+
+from .damping import Damper
+from .desired import compile_zone, load_static_records, netbox_hosts
+from .journal import Change, PlanJournal, StepJournal, journal_file, step_key
+from .metrics import Metrics
+from .netbox import IPAddressRecord, NetboxClient
+from .rfc2136 import DynamicUpdater, RecordUpdate
+from .state import load_state, save_state, zone_hash, zone_state_file
+from .storage import atomic_write, atomic_write_json
+from .technitium import TechnitiumDNS, ptr_address, qualify, render_zone_fragment, reverse_name
+from .tokens import load_token, save_token
+from .transport import CircuitOpenError, HostLimiter, host_limiter, iter_json_items, make_session
+from .unifi import ClientRecord, UnifiClient
+from .zoneindex import ZoneIndex, pack_ip, unpack_ip
+
+__all__ = [
+    "Change",
+    "CircuitOpenError",
+    "ClientRecord",
+    "Damper",
+    "DynamicUpdater",
+    "HostLimiter",
+    "IPAddressRecord",
+    "Metrics",
+    "NetboxClient",
+    "PlanJournal",
+    "RecordUpdate",
+    "StepJournal",
+    "TechnitiumDNS",
+    "UnifiClient",
+    "ZoneIndex",
+    "atomic_write",
+    "atomic_write_json",
+    "compile_zone",
+    "host_limiter",
+    "iter_json_items",
+    "journal_file",
+    "load_state",
+    "load_static_records",
+    "load_token",
+    "make_session",
+    "netbox_hosts",
+    "pack_ip",
+    "ptr_address",
+    "qualify",
+    "render_zone_fragment",
+    "reverse_name",
+    "save_state",
+    "save_token",
+    "step_key",
+    "unpack_ip",
+    "zone_hash",
+    "zone_state_file",
+]
@@ -0,0 +1,86 @@
+"""
+asyncio variants of the API clients
+
+Each async client wraps the matching blocking client: every method
+becomes a coroutine that runs the blocking call in the default thread
+pool (asyncio.to_thread), so the connection pools, retries, rate limits,
+circuit breakers and metrics of the shared session apply unchanged.
+Streaming methods become async iterators that pull results in batches.
+"""
+
+import asyncio
+from itertools import islice
+from typing import AsyncIterator, Dict, Iterator, TypeVar
+
+from .netbox import IPAddressRecord, NetboxClient
+from .technitium import TechnitiumDNS
+from .unifi import ClientRecord, UnifiClient
+
+T = TypeVar("T")
+
+ITER_BATCH_SIZE = 256  # Items fetched per thread hop by async iterators
+
+
+async def iterate_in_thread(iterator: Iterator[T], batch_size: int = ITER_BATCH_SIZE) -> AsyncIterator[T]:
+    """Consume a blocking iterator from a worker thread, `batch_size` items at a time"""
+    iterator = iter(iterator)
+    while True:
+        batch = await asyncio.to_thread(lambda: list(islice(iterator, batch_size)))
+        if not batch:
+            return
+        for item in batch:
+            yield item
+
+
+class AsyncClient:
+    """
+    Async facade over a blocking client.
+
+    Attributes are read from the wrapped client; methods are returned as
+    coroutine functions that run in a worker thread.
+    """
+
+    def __init__(self, client):
+        self.client = client
+
+    def __getattr__(self, name: str):
+        attr = getattr(self.client, name)
+        if not callable(attr):
+            return attr
+
+        async def call(*args, **kwargs):
+            return await asyncio.to_thread(attr, *args, **kwargs)
+
+        call.__name__ = name
+        call.__doc__ = attr.__doc__
+        return call
+
+
+class AsyncTechnitiumDNS(AsyncClient):
+    """TechnitiumDNS with coroutine methods"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(TechnitiumDNS(*args, **kwargs))
+
+
+class AsyncUnifiClient(AsyncClient):
+    """UnifiClient with coroutine methods and async client streams"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(UnifiClient(*args, **kwargs))
+
+    def iter_client_data(self, site: str = "default") -> AsyncIterator[Dict]:
+        return iterate_in_thread(self.client.iter_client_data(site))
+
+    def iter_clients(self, site: str = "default") -> AsyncIterator[ClientRecord]:
+        return iterate_in_thread(self.client.iter_clients(site))
+
+
+class AsyncNetboxClient(AsyncClient):
+    """NetboxClient with coroutine methods and an async IP address stream"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(NetboxClient(*args, **kwargs))
+
+    def iter_ip_addresses(self, *args, **kwargs) -> AsyncIterator[IPAddressRecord]:
+        return iterate_in_thread(self.client.iter_ip_addresses(*args, **kwargs))
@@ -0,0 +1,141 @@
+"""
+Change damping for DHCP clients whose address keeps moving
+
+A known host's new address is only published once it has been seen
+DAMPING_OBSERVATIONS runs in a row or for DAMPING_HOLD seconds. Hosts
+that keep flapping wait exponentially longer, up to DAMPING_MAX_HOLD.
+"""
+
+import json
+import logging
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .storage import atomic_write_json
+
+logger = logging.getLogger(__name__)
+
+DAMPING_OBSERVATIONS = 3
+DAMPING_HOLD = 300
+DAMPING_MAX_HOLD = 6 * 3600
+DAMPING_FLAP_WINDOW = 3600  # A change this soon after the last one counts as a flap
+
+
+class Damper:
+    """
+    Hysteresis for hosts whose address keeps changing.
+
+    When UniFi reports a new address for a host already in DNS, the
+    published address stays until the new one has been seen in
+    `observations` runs in a row or for `hold` seconds. A change released
+    within `flap_window` of the host's previous one, or a held change
+    that reverts to the published address, counts as a flap; every flap
+    doubles both thresholds (the hold is capped at `max_hold`). New hosts
+    and Netbox/static records are never held back.
+
+    Entries are stored per zone as compact lists
+    [candidate ip, first seen, observations, flaps, last change] and are
+    dropped once a host has been quiet for a flap window.
+    """
+
+    def __init__(self, path: str, entries: Optional[Dict[str, Dict[str, List]]] = None,
+                 observations: int = DAMPING_OBSERVATIONS, hold: float = DAMPING_HOLD,
+                 max_hold: float = DAMPING_MAX_HOLD, flap_window: float = DAMPING_FLAP_WINDOW):
+        self.path = path
+        self.entries = entries or {}
+        self.observations = max(1, observations)
+        self.hold = hold
+        self.max_hold = max(hold, max_hold)
+        self.flap_window = flap_window
+        self.held: Dict[str, int] = {}  # Changes held back per zone by the last filter()
+
+    @classmethod
+    def load(cls, path: str, **kwargs) -> "Damper":
+        """Damping state from the previous run (empty if missing or unusable)"""
+        entries = {}
+        try:
+            with open(path) as f:
+                entries = json.load(f)
+            if not isinstance(entries, dict):
+                raise ValueError("expected an object of zones")
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable damping state {path}: {e}")
+            entries = {}
+        return cls(path, entries, **kwargs)
+
+    def save(self):
+        """Write the damping state atomically"""
+        if not self.path:
+            return
+        try:
+            atomic_write_json(self.path, self.entries)
+        except OSError as e:
+            logger.warning(f"Could not write damping state {self.path}: {e}")
+
+    def thresholds(self, flaps: int) -> Tuple[int, float]:
+        """Observations and seconds a change must persist after `flaps` flaps"""
+        factor = 2 ** min(flaps, 16)
+        return int(self.observations * factor), min(self.hold * factor, self.max_hold)
+
+    def filter(self, zone: str, hosts: Dict[str, Dict], known: Dict[str, Dict],
+               now: Optional[float] = None) -> Dict[str, Dict]:
+        """
+        Observe this run's hosts and return them with every change that
+        hasn't persisted long enough replaced by the published address
+        from `known` (the state cache).
+        """
+        now = now or time.time()
+        entries = self.entries.setdefault(zone, {})
+        result: Dict[str, Dict] = {}
+        pending = set()
+        for hostname, host in hosts.items():
+            published = known.get(hostname)
+            entry = entries.get(hostname)
+            result[hostname] = host
+            if published is None or host.get("source", "unifi") != "unifi":
+                continue
+            recent = entry is not None and now - entry[4] < self.flap_window
+            if host["ip"] == published["ip"]:
+                if entry and entry[0]:
+                    # Back to the published address before the change was pushed
+                    entry[:] = ["", 0, 0, (entry[3] if recent else 0) + 1, now]
+                continue
+
+            if entry is None:
+                entry = entries[hostname] = ["", 0, 0, 0, 0]
+            if entry[0] != host["ip"]:
+                entry[0], entry[1], entry[2] = host["ip"], now, 0
+            entry[2] += 1
+            flaps = entry[3] if recent else 0
+            observations, hold = self.thresholds(flaps)
+            if entry[2] >= observations or now - entry[1] >= hold:
+                entry[:] = ["", 0, 0, flaps + 1 if recent else 0, now]
+            else:
+                result[hostname] = dict(host, ip=published["ip"])
+                pending.add(hostname)
+
+        for hostname, entry in list(entries.items()):
+            if entry[0] and hostname not in pending:
+                entry[0], entry[1], entry[2] = "", 0, 0  # Host left, or is no longer ours to damp
+            if not entry[0] and now - entry[4] >= self.flap_window:
+                del entries[hostname]  # Quiet for a whole flap window
+        self.held[zone] = len(pending)
+        return result
+
+    def flapping(self, zone: str) -> int:
+        """Hosts in `zone` currently backed off for flapping"""
+        now = time.time()
+        return sum(1 for entry in self.entries.get(zone, {}).values()
+                   if entry[3] and now - entry[4] < self.flap_window)
+
+    def next_release(self, zones: Optional[Iterable[str]] = None) -> Optional[float]:
+        """
+        Earliest time a held change in `zones` (default: all) becomes due
+        by its hold time (None if none)
+        """
+        zones = self.entries if zones is None else zones
+        due = [entry[1] + self.thresholds(entry[3])[1]
+               for zone in zones for entry in self.entries.get(zone, {}).values() if entry[0]]
+        return min(due) if due else None
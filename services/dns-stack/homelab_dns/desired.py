@@ -0,0 +1,117 @@
+"""
+Desired-state compiler
+
+Every source (UniFi DHCP clients, Netbox IPAM, static records) proposes
+{hostname: host} entries for a zone. compile_zone() merges them with an
+explicit precedence into the one record set the zone should hold, so a
+single diff and apply serve all sources instead of each sync rewriting
+the others' addresses and TTLs.
+"""
+
+import ipaddress
+import json
+import logging
+import time
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from .netbox import IPAddressRecord
+
+logger = logging.getLogger(__name__)
+
+SOURCE_PRECEDENCE = ("static", "netbox", "unifi")  # Highest precedence first
+SOURCE_TTLS = {"static": 3600, "netbox": 3600, "unifi": 300}
+
+
+def compile_zone(sources: Dict[str, Dict[str, Dict]], precedence: Sequence[str] = SOURCE_PRECEDENCE,
+                 ttls: Dict[str, int] = SOURCE_TTLS) -> Tuple[Dict[str, Dict], int]:
+    """
+    Merge per-source {hostname: {"ip", ...}} maps into one.
+
+    A hostname belongs to the first source in `precedence` that has it;
+    that source's address and TTL win and every merged host is tagged
+    with "ttl" and "source". Sources missing from `precedence` are
+    ignored. Returns (merged hosts, number of names where at least one
+    lower-precedence source wanted a different address or TTL).
+    """
+    merged: Dict[str, Dict] = {}
+    overridden = set()
+    for source in precedence:
+        for hostname, host in sources.get(source, {}).items():
+            name = hostname.lower()
+            winner = merged.get(name)
+            if winner is None:
+                merged[name] = dict(host, ttl=ttls[source], source=source)
+            elif (winner["ip"], winner["ttl"]) != (host["ip"], ttls[source]):
+                overridden.add(name)
+                logger.debug(f"  [overridden] {name}: {source} wants {host['ip']} "
+                             f"(TTL {ttls[source]}), {winner['source']} wins with {winner['ip']}")
+    return merged, len(overridden)
+
+
+def netbox_hosts(ip_addresses: Iterable[IPAddressRecord], zones: List[str]) -> Dict[str, Dict[str, Dict]]:
+    """
+    Project Netbox IP addresses onto zones as {zone: {hostname: host}}.
+
+    Names ending in one of `zones` go to that zone, other names to the
+    first zone unless they are fully qualified (trailing dot). A name
+    with several addresses keeps the first one.
+    """
+    now = int(time.time())
+    hosts: Dict[str, Dict[str, Dict]] = {zone: {} for zone in zones}
+    suffixes = sorted(((f".{zone.lower()}", zone) for zone in zones), key=lambda s: -len(s[0]))
+    for record in ip_addresses:
+        name = record.dns_name.lower()
+        qualified = name.endswith(".")
+        name = name.rstrip(".")
+        for suffix, zone in suffixes:
+            if name.endswith(suffix):
+                name = name[:-len(suffix)]
+                break
+        else:
+            if qualified or not zones:
+                continue  # Fully qualified in another domain
+            zone = zones[0]
+        if name:
+            hosts[zone].setdefault(name, {"ip": record.address, "mac": "", "last_seen": now})
+    return hosts
+
+
+def load_static_records(path: str) -> Optional[Dict[str, Dict[str, Dict]]]:
+    """
+    Read static records as {zone: {hostname: host}} from a JSON file of
+    {zone: {hostname: ip}} ({} if there is no file).
+
+    Zones and hostnames are lowercased like the other sources. Entries
+    that aren't a hostname → IP address are logged and left out; a file
+    that can't be read or isn't a JSON object returns None, so callers
+    can tell "no static records" from "static records unknown".
+    """
+    if not path:
+        return {}
+    try:
+        with open(path) as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        logger.error(f"Unreadable static records file {path}: {e}")
+        return None
+    if not isinstance(data, dict):
+        logger.error(f"Invalid static records file {path}: expected {{zone: {{hostname: ip}}}}")
+        return None
+
+    now = int(time.time())
+    hosts: Dict[str, Dict[str, Dict]] = {}
+    for zone, records in data.items():
+        if not isinstance(records, dict):
+            logger.error(f"Ignoring static records for {zone}: expected {{hostname: ip}}")
+            continue
+        zone_hosts = hosts.setdefault(zone.lower(), {})
+        for hostname, ip in records.items():
+            try:
+                ipaddress.ip_address(ip if isinstance(ip, str) else "")
+            except ValueError:
+                logger.error(f"Ignoring static record {hostname}.{zone}: {ip!r} is not an IP address")
+                continue
+            zone_hosts[hostname.lower()] = {"ip": ip, "mac": "", "last_seen": now}
+    return hosts
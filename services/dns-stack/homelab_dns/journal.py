@@ -0,0 +1,219 @@
+"""
+Journals for resumable runs
+
+PlanJournal is unifi-dns-sync's write-ahead log of one zone's planned
+record changes; StepJournal records the finished steps of a multi-step
+run such as setup-dns-ipam.py.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from typing import Dict, List, NamedTuple, Optional
+
+from .storage import atomic_write
+
+logger = logging.getLogger(__name__)
+
+STEP_JOURNAL_MAX_AGE = 7 * 86400  # Older journals are from abandoned runs and are ignored
+JOURNAL_FSYNC_EVERY = 100         # PlanJournal completion marks written between fsyncs
+
+
+class Change(NamedTuple):
+    """A single planned DNS record change"""
+    action: str                       # "add", "update" or "delete"
+    hostname: str
+    ip: str
+    current_ip: Optional[str] = None  # Existing address for updates
+    rtype: str = "A"                  # "A", or "PTR" for the host's pointer at `ip`
+    ttl: Optional[int] = None         # Record TTL (None = the sync's default)
+
+
+def journal_file(state_file: str) -> str:
+    """PlanJournal path kept next to a zone's state cache"""
+    return f"{os.path.splitext(state_file)[0]}.journal"
+
+
+class PlanJournal:
+    """
+    Write-ahead log of one zone's planned changes.
+
+    The header (zone, the hosts snapshot the plan was made from, hosts to
+    forget) and every planned change are fsynced before the first change
+    is applied, and each applied change appends a completion mark. A run
+    that dies part way leaves the file behind; the next run applies only
+    the unmarked changes. Without marks the same file is a plan, which
+    --dry-run --plan-file writes and --apply-plan applies verbatim.
+    """
+
+    VERSION = 1
+
+    def __init__(self, path: Optional[str], zone: str, plan: List[Change], hosts: Dict[str, Dict],
+                 forget: List[str], full: bool, created: float, done: Optional[Dict[int, bool]] = None,
+                 fsync_every: int = JOURNAL_FSYNC_EVERY):
+        self.path = path
+        self.zone = zone
+        self.plan = plan
+        self.hosts = hosts
+        self.forget = forget
+        self.full = full
+        self.created = created
+        self.done: Dict[int, bool] = done or {}
+        self.fsync_every = fsync_every
+        self.lock = threading.Lock()
+        self.file = None
+        self.unsynced = 0
+
+    @classmethod
+    def write(cls, path: str, zone: str, plan: List[Change], hosts: Dict[str, Dict],
+              forget: List[str], full: bool) -> "PlanJournal":
+        """Durably write a new journal (a journal with no path if that fails)"""
+        journal = cls(path, zone, plan, hosts, forget, full, time.time())
+        header = {"journal": cls.VERSION, "zone": zone, "created": journal.created,
+                  "full": full, "hosts": hosts, "forget": forget}
+        lines = [json.dumps(header)] + [json.dumps(list(change)) for change in plan]
+        try:
+            atomic_write(path, "\n".join(lines) + "\n", fsync=True)
+        except OSError as e:
+            logger.warning(f"Could not write journal {path}, an interruption will not be resumable: {e}")
+            journal.path = None
+        return journal
+
+    @classmethod
+    def load(cls, path: str) -> Optional["PlanJournal"]:
+        """Read a journal or plan file (None if missing or unusable)"""
+        try:
+            with open(path) as f:
+                header = json.loads(f.readline())
+                if header.get("journal") != cls.VERSION:
+                    raise ValueError(f"unsupported journal version {header.get('journal')}")
+                plan, done = [], {}
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        break  # Torn final write
+                    if isinstance(entry, list):
+                        plan.append(Change(*entry))
+                    else:
+                        done[entry["done"]] = entry["ok"]
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, TypeError, KeyError, AttributeError) as e:
+            logger.warning(f"Ignoring unreadable journal {path}: {e}")
+            return None
+        return cls(path, header["zone"], plan, header.get("hosts", {}), header.get("forget", []),
+                   header.get("full", False), header.get("created", 0), done)
+
+    def pending(self) -> List[int]:
+        """Indexes of planned changes without a completion mark"""
+        return [i for i in range(len(self.plan)) if i not in self.done]
+
+    def mark(self, index: int, ok: bool):
+        """Record that plan[index] was applied (or failed for good)"""
+        with self.lock:
+            self.done[index] = ok
+            if not self.path:
+                return
+            try:
+                if self.file is None:
+                    self.file = open(self.path, "a")
+                self.file.write(json.dumps({"done": index, "ok": ok}) + "\n")
+                self.file.flush()
+                self.unsynced += 1
+                if self.unsynced >= self.fsync_every:
+                    os.fsync(self.file.fileno())
+                    self.unsynced = 0
+            except OSError as e:
+                logger.warning(f"Could not update journal {self.path}: {e}")
+                self.path = None
+
+    def remove(self):
+        """Delete the journal once its outcome is in the state cache"""
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+            if self.path:
+                try:
+                    os.unlink(self.path)
+                except FileNotFoundError:
+                    pass
+
+
+def step_key(kind: str, target: str, payload) -> str:
+    """
+    Journal key for one step: what it does, where (e.g. a prefix and an
+    address), and a hash of its input
+    """
+    digest = hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()[:16]
+    return f"{kind} {target} {digest}"
+
+
+class StepJournal:
+    """
+    Append-only record of the steps of a run that completed.
+
+    Each finished step (e.g. one address imported into a Netbox prefix or
+    one record imported into a DNS zone) is appended and fsynced under a
+    key that names it and includes a hash of its input, so a rerun after a
+    crash skips exactly the work that already landed, however its input
+    is ordered or batched this time, and redoes anything whose input has
+    since changed.
+    """
+
+    def __init__(self, path: str, max_age: float = STEP_JOURNAL_MAX_AGE):
+        self.path = path
+        self.completed = set()
+        self.lock = threading.Lock()  # Steps may finish on several worker threads
+        if not path:
+            return
+        try:
+            if time.time() - os.path.getmtime(path) > max_age:
+                logger.info(f"Discarding stale journal {path}")
+                os.unlink(path)
+                return
+            with open(path) as f:
+                for line in f:
+                    try:
+                        self.completed.add(json.loads(line)["step"])
+                    except (ValueError, KeyError, TypeError):
+                        break  # Torn final write
+        except FileNotFoundError:
+            return
+        except OSError as e:
+            logger.warning(f"Ignoring unreadable journal {path}: {e}")
+            return
+        if self.completed:
+            logger.info(f"Resuming an interrupted run: {len(self.completed)} steps already done")
+
+    def done(self, key: str) -> bool:
+        return key in self.completed
+
+    def mark(self, *keys: str):
+        """Durably record that the steps `keys` completed (one fsync for all)"""
+        with self.lock:
+            self.completed.update(keys)
+            if not self.path or not keys:
+                return
+            try:
+                os.makedirs(os.path.dirname(self.path) or ".", mode=0o700, exist_ok=True)
+                now = time.time()
+                with open(self.path, "a") as f:
+                    f.write("".join(json.dumps({"step": key, "at": now}) + "\n" for key in keys))
+                    f.flush()
+                    os.fsync(f.fileno())
+            except OSError as e:
+                logger.warning(f"Could not update journal {self.path}: {e}")
+                self.path = ""
+
+    def remove(self):
+        """Forget the journal; only call this after a run that finished every step"""
+        if self.path:
+            try:
+                os.unlink(self.path)
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,194 @@
+"""
+Prometheus metrics for the sync scripts
+
+Rendered for the node_exporter textfile collector after each run, or
+served over HTTP by long-running processes.
+"""
+
+import bisect
+import logging
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+
+import requests
+
+from .storage import atomic_write
+from .transport import SchedulingAdapter
+
+logger = logging.getLogger(__name__)
+
+
+def endpoint_label(path_url: str) -> str:
+    """API path without query string (keeps tokens out of labels) or numeric IDs"""
+    return re.sub(r"/\d+(?=/|$)", "/{id}", path_url.split("?", 1)[0])
+
+
+def format_labels(labels: Tuple[Tuple[str, str], ...]) -> str:
+    if not labels:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in labels)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(labels, escaped)) + "}"
+
+
+class Metrics:
+    """
+    Per-phase timings and HTTP request metrics in Prometheus text format.
+
+    attach() hooks a session so every response it receives is counted
+    per endpoint, with latency, retries and bytes transferred. Series are
+    prefixed with `namespace`; `help` adds or overrides HELP text for a
+    script's own series. Safe to share between worker threads.
+    """
+
+    BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+    HELP = {
+        "phase_duration_seconds": "Duration of each sync phase in the last run that executed it",
+        "http_requests_total": "HTTP requests by endpoint, method and status code",
+        "http_request_duration_seconds": "HTTP request latency by endpoint",
+        "http_retries_total": "HTTP retries (connection errors, 429, 5xx) by endpoint",
+        "http_request_bytes_total": "HTTP request body bytes sent by endpoint",
+        "http_response_bytes_total": "HTTP response body bytes received by endpoint",
+        "runs_total": "Sync runs by result",
+        "changes": "Record changes applied in the last run by action",
+        "errors": "Failed record changes in the last run",
+        "last_run_timestamp_seconds": "Unix time the last run finished",
+        "last_success_timestamp_seconds": "Unix time the last run without errors finished",
+        "deferred": "Record changes left for the next run because DNS was unavailable",
+        "http_concurrency_limit": "Current adaptive limit on requests in flight by host",
+        "http_throttled_seconds_total": "Time requests waited for the rate or concurrency limit by host",
+        "http_rejected_total": "Requests refused without being sent because the host's circuit was open",
+        "http_circuit_trips_total": "Times a host's circuit breaker opened",
+    }
+
+    def __init__(self, namespace: str, help: Optional[Dict[str, str]] = None):
+        self.namespace = namespace
+        self.help = dict(self.HELP, **(help or {}))
+        self.lock = threading.Lock()
+        self.gauges: Dict[Tuple[str, Tuple], float] = {}
+        self.counters: Dict[Tuple[str, Tuple], float] = {}
+        self.histograms: Dict[Tuple[str, Tuple], List[float]] = {}  # bucket counts + [sum, count]
+
+    def set(self, name: str, value: float, **labels):
+        with self.lock:
+            self.gauges[(name, tuple(sorted(labels.items())))] = value
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            series = self.histograms.setdefault(key, [0] * (len(self.BUCKETS) + 2))
+            series[bisect.bisect_left(self.BUCKETS, value)] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    @contextmanager
+    def phase(self, name: str, **labels):
+        """Time the enclosed block as one sync phase"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.set("phase_duration_seconds", round(time.perf_counter() - started, 6), phase=name, **labels)
+
+    def attach(self, session: requests.Session) -> requests.Session:
+        session.hooks["response"].append(self.observe_response)
+        for adapter in session.adapters.values():
+            if isinstance(adapter, SchedulingAdapter):
+                adapter.metrics = self
+        return session
+
+    def observe_response(self, response, *args, **kwargs):
+        """requests response hook"""
+        endpoint = endpoint_label(response.request.path_url)
+        self.inc("http_requests_total", endpoint=endpoint, method=response.request.method,
+                 code=str(response.status_code))
+        self.observe("http_request_duration_seconds", response.elapsed.total_seconds(), endpoint=endpoint)
+        retries = getattr(response.raw, "retries", None)
+        if retries is not None and retries.history:
+            self.inc("http_retries_total", len(retries.history), endpoint=endpoint)
+        if response.request.body:
+            self.inc("http_request_bytes_total", len(response.request.body), endpoint=endpoint)
+        # Don't drain streamed bodies just to measure them
+        size = response.headers.get("Content-Length") if kwargs.get("stream") else len(response.content)
+        if size is not None:
+            self.inc("http_response_bytes_total", int(size), endpoint=endpoint)
+
+    def record_run(self, errors: int, **changes: int):
+        """Summarise a finished run"""
+        now = int(time.time())
+        self.set("errors", errors)
+        for action, count in changes.items():
+            self.set("changes", count, action=action)
+        self.inc("runs_total", result="error" if errors else "success")
+        self.set("last_run_timestamp_seconds", now)
+        if not errors:
+            self.set("last_success_timestamp_seconds", now)
+
+    def render(self) -> str:
+        """Prometheus text exposition format"""
+        lines = []
+        with self.lock:
+            for kind, series in (("gauge", self.gauges), ("counter", self.counters),
+                                 ("histogram", self.histograms)):
+                for name in sorted({name for name, _ in series}):
+                    metric = f"{self.namespace}_{name}"
+                    lines.append(f"# HELP {metric} {self.help.get(name, name)}")
+                    lines.append(f"# TYPE {metric} {kind}")
+                    for (key, labels), value in sorted(series.items()):
+                        if key != name:
+                            continue
+                        if kind != "histogram":
+                            lines.append(f"{metric}{format_labels(labels)} {value}")
+                            continue
+                        cumulative = 0
+                        for bound, count in zip(self.BUCKETS + ("+Inf",), value):
+                            cumulative += count
+                            lines.append(f"{metric}_bucket{format_labels(labels + (('le', bound),))} {cumulative}")
+                        lines.append(f"{metric}_sum{format_labels(labels)} {round(value[-2], 6)}")
+                        lines.append(f"{metric}_count{format_labels(labels)} {value[-1]}")
+        return "\n".join(lines) + "\n"
+
+    def write_textfile(self, path: str):
+        """Atomically replace `path` so the textfile collector never reads a partial file"""
+        directory = os.path.dirname(path) or "."
+        if not os.path.isdir(directory):
+            logger.debug(f"Metrics directory {directory} missing, not writing {path}")
+            return
+        try:
+            atomic_write(path, self.render(), mode=0o644)
+        except OSError as e:
+            logger.warning(f"Could not write metrics to {path}: {e}")
+
+    def serve(self, port: int) -> ThreadingHTTPServer:
+        """Serve /metrics from a background thread"""
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?", 1)[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = metrics.render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer(("", port), Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+        logger.info(f"Serving metrics on :{port}/metrics")
+        return server
@@ -0,0 +1,490 @@
+"""
+Netbox IPAM API client
+"""
+
+import ipaddress
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+import requests
+
+from .tokens import load_token, save_token
+from .transport import STREAM_CHUNK_SIZE, iter_json_items, make_session
+
+logger = logging.getLogger(__name__)
+
+NETBOX_TOKEN_MAX_AGE = 30 * 86400  # Provisioned API tokens are replaced after this long
+NETBOX_BULK_CHUNK_SIZE = 100       # Objects per bulk create/update request
+NETBOX_PAGE_SIZE = 1000            # Results per request (Netbox MAX_PAGE_SIZE caps this)
+NETBOX_PAGE_WORKERS = 4            # Concurrent page requests (1 = follow "next" links)
+NETBOX_FIELDS = "address,dns_name,status,description"
+
+
+class IPAddressRecord:
+    """The fields of a Netbox IP address the sync uses"""
+
+    __slots__ = ("address", "dns_name", "status", "description")
+
+    def __init__(self, address: str, dns_name: str, status: str, description: str):
+        self.address = address
+        self.dns_name = dns_name
+        self.status = status
+        self.description = description
+
+
+class NetboxClient:
+    """
+    Client for the Netbox API
+
+    Authenticates with `token`, or provisions one from `username` and
+    `password` (see login()). `statuses` limits the IP addresses read for
+    DNS to those statuses (empty = all).
+    """
+
+    def __init__(self, base_url: str, token: Optional[str] = None, username: Optional[str] = None,
+                 password: Optional[str] = None, session: Optional[requests.Session] = None,
+                 statuses: Sequence[str] = ()):
+        self.base_url = base_url.rstrip('/')
+        self.session = session or make_session()
+        self.username = username
+        self.password = password
+        self.token = token
+        self.statuses = list(statuses)
+        self.headers = {
+            "Content-Type": "application/json",
+            "Accept": "application/json"
+        }
+        self.fetch_ok = False  # Whether the last iter_ip_addresses() saw every page
+
+        # If token provided, set it immediately
+        if token:
+            self.use_token(token)
+
+    def verify_token(self, token: str) -> Optional[bool]:
+        """Check an API token against Netbox (None if Netbox could not be reached)"""
+        try:
+            response = self.session.get(
+                f"{self.base_url}/api/status/",
+                headers=dict(self.headers, Authorization=f"Token {token}"),
+                timeout=10
+            )
+            return response.status_code == 200
+        except Exception as e:
+            logger.error(f"Token verification failed: {e}")
+            return None
+
+    def use_token(self, token: str):
+        """Send `token` with every following request"""
+        self.token = token
+        self.headers["Authorization"] = f"Token {token}"
+
+    def login(self, token_cache: Optional[str] = None, max_age: float = NETBOX_TOKEN_MAX_AGE) -> bool:
+        """
+        Authenticate with the configured token, else a token provisioned by
+        an earlier run (kept in `token_cache`), else provision a new one.
+        """
+        cache_key = f"netbox {self.base_url} {self.username}"
+        candidates = [(self.token, "provided token")]
+        if token_cache:
+            candidates.append((load_token(token_cache, cache_key, max_age), "cached token"))
+        for token, source in candidates:
+            if not token:
+                continue
+            valid = self.verify_token(token)
+            if valid is None:
+                return False
+            if valid:
+                self.use_token(token)
+                logger.info(f"Successfully authenticated with Netbox using {source}")
+                return True
+        if token_cache:
+            save_token(token_cache, cache_key, None)
+
+        # Otherwise try username/password
+        try:
+            # First, try to get or create API token
+            response = self.session.post(
+                f"{self.base_url}/api/users/tokens/provision/",
+                auth=(self.username, self.password),
+                json={"username": self.username},
+                timeout=10
+            )
+
+            if response.status_code in [200, 201]:
+                data = response.json()
+                self.use_token(data.get("key"))
+                if token_cache:
+                    save_token(token_cache, cache_key, self.token)
+                logger.info("Successfully authenticated with Netbox")
+                return True
+            else:
+                logger.error(f"Netbox login failed: {response.status_code} - {response.text}")
+                return False
+        except Exception as e:
+            logger.error(f"Netbox login error: {e}")
+            return False
+
+    def create_site(self, name: str, slug: str) -> Optional[int]:
+        """Create a site in Netbox"""
+        try:
+            # Check if site exists
+            response = self.session.get(
+                f"{self.base_url}/api/dcim/sites/",
+                headers=self.headers,
+                params={"slug": slug},
+                timeout=10
+            )
+
+            if response.status_code == 200:
+                sites = response.json().get("results", [])
+                if sites:
+                    site_id = sites[0]["id"]
+                    logger.info(f"Site '{name}' already exists (ID: {site_id})")
+                    return site_id
+
+            # Create new site
+            response = self.session.post(
+                f"{self.base_url}/api/dcim/sites/",
+                headers=self.headers,
+                json={
+                    "name": name,
+                    "slug": slug,
+                    "status": "active"
+                },
+                timeout=10
+            )
+
+            if response.status_code == 201:
+                site_id = response.json()["id"]
+                logger.info(f"Created site '{name}' (ID: {site_id})")
+                return site_id
+            else:
+                logger.error(f"Failed to create site: {response.status_code} - {response.text}")
+                return None
+        except Exception as e:
+            logger.error(f"Error creating site: {e}")
+            return None
+
+    def create_prefix(self, prefix: str, site_id: int) -> Optional[int]:
+        """Create a prefix in Netbox"""
+        try:
+            # Check if prefix exists
+            response = self.session.get(
+                f"{self.base_url}/api/ipam/prefixes/",
+                headers=self.headers,
+                params={"prefix": prefix},
+                timeout=10
+            )
+
+            if response.status_code == 200:
+                prefixes = response.json().get("results", [])
+                if prefixes:
+                    prefix_id = prefixes[0]["id"]
+                    logger.info(f"Prefix '{prefix}' already exists (ID: {prefix_id})")
+                    return prefix_id
+
+            # Create new prefix
+            response = self.session.post(
+                f"{self.base_url}/api/ipam/prefixes/",
+                headers=self.headers,
+                json={
+                    "prefix": prefix,
+                    "site": site_id,
+                    "status": "active"
+                },
+                timeout=10
+            )
+
+            if response.status_code == 201:
+                prefix_id = response.json()["id"]
+                logger.info(f"Created prefix '{prefix}' (ID: {prefix_id})")
+                return prefix_id
+            else:
+                logger.error(f"Failed to create prefix: {response.status_code} - {response.text}")
+                return None
+        except Exception as e:
+            logger.error(f"Error creating prefix: {e}")
+            return None
+
+    def create_ip_address(self, ip: str, dns_name: str, description: str = "") -> bool:
+        """Create an IP address in Netbox"""
+        try:
+            # Check if IP exists
+            response = self.session.get(
+                f"{self.base_url}/api/ipam/ip-addresses/",
+                headers=self.headers,
+                params={"address": f"{ip}/24"},
+                timeout=10
+            )
+
+            if response.status_code == 200:
+                ips = response.json().get("results", [])
+                if ips:
+                    # Update existing IP
+                    ip_id = ips[0]["id"]
+                    response = self.session.patch(
+                        f"{self.base_url}/api/ipam/ip-addresses/{ip_id}/",
+                        headers=self.headers,
+                        json={
+                            "dns_name": dns_name,
+                            "description": description
+                        },
+                        timeout=10
+                    )
+                    if response.status_code == 200:
+                        logger.info(f"Updated IP {ip} -> {dns_name}")
+                        return True
+                    return False
+
+            # Create new IP
+            response = self.session.post(
+                f"{self.base_url}/api/ipam/ip-addresses/",
+                headers=self.headers,
+                json={
+                    "address": f"{ip}/24",
+                    "dns_name": dns_name,
+                    "status": "active",
+                    "description": description
+                },
+                timeout=10
+            )
+
+            if response.status_code == 201:
+                logger.info(f"Created IP {ip} -> {dns_name}")
+                return True
+            else:
+                logger.error(f"Failed to create IP {ip}: {response.status_code} - {response.text}")
+                return False
+        except Exception as e:
+            logger.error(f"Error creating IP {ip}: {e}")
+            return False
+
+    def get_prefix_ip_addresses(self, prefix: str) -> Optional[Dict[str, Dict]]:
+        """Get every IP address inside a prefix as {ip: record}, or None on error"""
+        addresses = {}
+        url = f"{self.base_url}/api/ipam/ip-addresses/"
+        params = {"parent": prefix, "limit": 1000}
+
+        try:
+            while url:
+                response = self.session.get(url, headers=self.headers, params=params, timeout=30)
+                if response.status_code != 200:
+                    logger.error(f"Failed to list IPs in {prefix}: {response.status_code} - {response.text}")
+                    return None
+
+                data = response.json()
+                for record in data.get("results", []):
+                    addresses[record["address"].split("/")[0]] = record
+
+                # The "next" link already carries the query string
+                url = data.get("next")
+                params = None
+            return addresses
+        except Exception as e:
+            logger.error(f"Error listing IPs in {prefix}: {e}")
+            return None
+
+    def _bulk_write(self, method: str, items: List[Dict], ok_status: int) -> Tuple[bool, str]:
+        """Send one bulk POST/PATCH request, returning (ok, error detail)"""
+        try:
+            response = self.session.request(
+                method,
+                f"{self.base_url}/api/ipam/ip-addresses/",
+                headers=self.headers,
+                json=items,
+                timeout=60
+            )
+            if response.status_code == ok_status:
+                return True, ""
+            return False, f"{response.status_code} - {response.text[:200]}"
+        except Exception as e:
+            return False, str(e)
+
+    def import_ip_addresses(self, entries: List[Tuple[str, str, str]], prefix: str,
+                            chunk_size: int = NETBOX_BULK_CHUNK_SIZE,
+                            existing: Optional[Dict[str, Dict]] = None) -> int:
+        """
+        Create or update many (ip, dns_name, description) entries.
+
+        Existing addresses in the prefix are fetched once, then new
+        addresses are created and changed ones updated with chunked bulk
+        requests. Netbox applies each bulk request atomically, so a failed
+        chunk is reported and retried one entry at a time. IPs outside the
+        prefix go through create_ip_address(). Pass a prefetched
+        get_prefix_ip_addresses() result as `existing` to skip the lookup.
+        Returns the number imported.
+        """
+        if existing is None:
+            existing = self.get_prefix_ip_addresses(prefix)
+        if existing is None:
+            logger.warning("Falling back to per-IP import")
+            return sum(self.create_ip_address(*entry) for entry in entries)
+
+        network = ipaddress.ip_network(prefix, strict=False)
+        mask = network.prefixlen
+
+        # Later entries win, matching sequential create-or-update calls
+        latest = {}
+        for ip, dns_name, description in entries:
+            latest[ip] = (dns_name, description)
+
+        creates, updates, outside = [], [], []
+        unchanged = 0
+        for ip, (dns_name, description) in latest.items():
+            if ipaddress.ip_address(ip) not in network:
+                outside.append((ip, dns_name, description))
+            elif ip not in existing:
+                creates.append({
+                    "address": f"{ip}/{mask}",
+                    "dns_name": dns_name,
+                    "status": "active",
+                    "description": description
+                })
+            elif (existing[ip].get("dns_name"), existing[ip].get("description")) != (dns_name, description):
+                updates.append({"id": existing[ip]["id"], "dns_name": dns_name, "description": description})
+            else:
+                unchanged += 1
+
+        logger.info(f"Netbox import: {len(creates)} to create, {len(updates)} to update, "
+                    f"{unchanged} unchanged, {len(outside)} outside {prefix}")
+
+        imported = unchanged
+        failed_chunks = []
+        for method, items, ok_status, verb in (("POST", creates, 201, "Created"),
+                                               ("PATCH", updates, 200, "Updated")):
+            for start in range(0, len(items), chunk_size):
+                chunk = items[start:start + chunk_size]
+                ok, error = self._bulk_write(method, chunk, ok_status)
+                if ok:
+                    logger.info(f"{verb} {len(chunk)} IP addresses")
+                    imported += len(chunk)
+                    continue
+
+                # Retry entries individually so one bad name doesn't sink the chunk
+                failed = []
+                for item in chunk:
+                    if self._bulk_write(method, [item], ok_status)[0]:
+                        imported += 1
+                    else:
+                        failed.append(item.get("address") or str(item["id"]))
+                failed_chunks.append((method, start // chunk_size + 1, len(chunk), error, failed))
+
+        for ip, dns_name, description in outside:
+            if self.create_ip_address(ip, dns_name, description):
+                imported += 1
+
+        if failed_chunks:
+            logger.warning("Bulk import chunk errors:")
+            for method, number, size, error, failed in failed_chunks:
+                logger.warning(f"  {method} chunk {number} ({size} entries): {error}")
+                if failed:
+                    logger.warning(f"    still failing after retry: {', '.join(failed)}")
+
+        return imported
+
+    def change_marker(self) -> Optional[List]:
+        """
+        [count, newest last_updated] of the IP addresses we sync, from one
+        single-result query. Any create, edit or delete in the set changes
+        it, including edits that move an address out of the set.
+        """
+        params = {
+            "limit": 1,
+            "dns_name__empty": "false",
+            "ordering": "-last_updated",
+            "fields": "id,last_updated",
+        }
+        if self.statuses:
+            params["status"] = self.statuses
+        try:
+            response = self.session.get(f"{self.base_url}/api/ipam/ip-addresses/",
+                                        headers=self.headers, params=params, timeout=30)
+            if response.status_code != 200:
+                logger.warning(f"Netbox change check failed: {response.status_code}")
+                return None
+            data = response.json()
+            results = data.get("results") or [{}]
+            return [data.get("count", 0), results[0].get("last_updated") or ""]
+        except Exception as e:
+            logger.warning(f"Netbox change check failed: {e}")
+            return None
+
+    def _iter_page(self, url: str, params: Optional[Dict] = None,
+                   header: Optional[Dict] = None) -> Iterator[IPAddressRecord]:
+        """
+        Stream one page of results as compact records, raising on HTTP
+        errors. "count" and "next" are stored in `header`, along with
+        "returned", the number of results on the page.
+        """
+        header = header if header is not None else {}
+        header["returned"] = 0
+        with self.session.get(url, headers=self.headers, params=params, timeout=30, stream=True) as response:
+            if response.status_code != 200:
+                raise RuntimeError(f"Netbox API error: {response.status_code}")
+            for ip in iter_json_items(response.iter_content(STREAM_CHUNK_SIZE), "results", header):
+                header["returned"] += 1
+                # Only include IPs with DNS names (older Netbox ignores the filter)
+                dns_name = (ip.get("dns_name") or "").strip()
+                if dns_name:
+                    yield IPAddressRecord(
+                        ip.get("address", "").split("/")[0],  # Remove CIDR
+                        dns_name,
+                        (ip.get("status") or {}).get("value", "active"),
+                        ip.get("description", "")
+                    )
+
+    def iter_ip_addresses(self, page_size: int = NETBOX_PAGE_SIZE, workers: int = NETBOX_PAGE_WORKERS,
+                          fields: str = NETBOX_FIELDS) -> Iterator[IPAddressRecord]:
+        """
+        Stream all IP addresses from Netbox that have DNS names.
+
+        Filtering happens server-side and only the fields we use are
+        requested. Records are yielded as each page is parsed. Once the
+        first page reports the total count, the remaining pages are
+        fetched concurrently by offset, with at most `workers` pages
+        buffered at a time.
+        """
+        url = f"{self.base_url}/api/ipam/ip-addresses/"
+        params = {
+            "limit": page_size,
+            "offset": 0,
+            "dns_name__empty": "false",
+            "fields": fields,
+        }
+        if self.statuses:
+            params["status"] = self.statuses
+
+        self.fetch_ok = False
+        try:
+            first: Dict = {}
+            yield from self._iter_page(url, params, first)
+            count = first.get("count")
+            page_len = first["returned"]
+
+            if workers > 1 and count and page_len and first.get("next"):
+                def fetch(offset: int) -> List[IPAddressRecord]:
+                    return list(self._iter_page(url, dict(params, limit=page_len, offset=offset)))
+
+                # Use the server's effective page size in case it capped our limit
+                offsets = iter(range(page_len, count, page_len))
+                with ThreadPoolExecutor(max_workers=workers) as pool:
+                    pending = deque(pool.submit(fetch, offset) for offset in islice(offsets, workers))
+                    while pending:
+                        page = pending.popleft().result()
+                        offset = next(offsets, None)
+                        if offset is not None:
+                            pending.append(pool.submit(fetch, offset))
+                        yield from page
+            else:
+                next_url = first.get("next")
+                while next_url:
+                    header: Dict = {}
+                    yield from self._iter_page(next_url, header=header)
+                    next_url = header.get("next")
+            self.fetch_ok = True
+
+        except Exception as e:
+            logger.error(f"Error fetching IP addresses from Netbox: {e}")
@@ -0,0 +1,116 @@
+"""
+RFC 2136 dynamic update client
+
+Writes records with DNS UPDATE messages instead of one HTTP request per
+record: many adds and deletes are packed into a few TSIG-signed messages
+sent over a single TCP connection. Needs dnspython
+(pip3 install dnspython); without it `available` is False and callers
+stay on the HTTP API.
+"""
+
+import logging
+import socket
+from typing import Iterable, List, NamedTuple
+
+try:
+    import dns.query
+    import dns.rcode
+    import dns.tsigkeyring
+    import dns.update
+except ImportError:  # dnspython, only needed for dynamic updates
+    dns = None
+
+from .technitium import qualify
+
+logger = logging.getLogger(__name__)
+
+UPDATE_BATCH_SIZE = 200  # Record changes per UPDATE message
+UPDATE_TIMEOUT = 10      # Seconds to wait for the connection and each response
+
+
+class RecordUpdate(NamedTuple):
+    """One record change for DynamicUpdater.apply()"""
+    action: str   # "add" (replaces other records of the type at the name) or "delete"
+    name: str     # Relative to the zone or fully qualified
+    rtype: str
+    value: str    # Address for A/AAAA, target name for PTR/CNAME
+    ttl: int = 3600
+
+
+class DynamicUpdater:
+    """
+    Sends record changes to a DNS server as TSIG-signed UPDATE messages.
+
+    Only zones listed in `zones` are handled; the server must allow
+    updates signed with the key for them (in Technitium: zone options,
+    Dynamic Updates, with the TSIG key added under Settings).
+    """
+
+    def __init__(self, server: str, key_name: str, secret: str, zones: Iterable[str],
+                 algorithm: str = "hmac-sha256", port: int = 53,
+                 timeout: float = UPDATE_TIMEOUT, batch_size: int = UPDATE_BATCH_SIZE):
+        self.server = server
+        self.port = port
+        self.key_name = key_name
+        self.algorithm = algorithm
+        self.zones = {zone.lower() for zone in zones}
+        self.timeout = timeout
+        self.batch_size = max(1, batch_size)
+        self.keyring = dns.tsigkeyring.from_text({key_name: secret}) if dns and secret else None
+
+    @property
+    def available(self) -> bool:
+        """True if dnspython is installed and a key is configured"""
+        return self.keyring is not None
+
+    def handles(self, zone: str) -> bool:
+        return self.available and bool(zone) and zone.lower() in self.zones
+
+    def message(self, zone: str, updates: List[RecordUpdate]):
+        """One signed UPDATE message for `updates`, in order"""
+        message = dns.update.UpdateMessage(zone, keyring=self.keyring, keyname=self.key_name,
+                                           keyalgorithm=self.algorithm)
+        for update in updates:
+            name = f"{qualify(update.name, zone)}."
+            value = update.value if update.rtype in ("A", "AAAA") else f"{update.value.rstrip('.')}."
+            if update.action == "delete":
+                message.delete(name, update.rtype, value)
+            else:
+                message.replace(name, update.ttl, update.rtype, value)
+        return message
+
+    def apply(self, zone: str, updates: List[RecordUpdate]) -> List[bool]:
+        """
+        Send `updates` for one zone in messages of up to `batch_size`
+        changes over one TCP connection. The server applies each message
+        atomically, so every change gets its message's outcome. Returns
+        one success flag per update; everything after a connection error
+        is reported as failed so the caller can fall back to HTTP.
+        """
+        results = [False] * len(updates)
+        if not updates or not self.handles(zone):
+            return results
+
+        try:
+            sock = socket.create_connection((self.server, self.port), timeout=self.timeout)
+        except OSError as e:
+            logger.warning(f"Dynamic update server {self.server}:{self.port} unreachable: {e}")
+            return results
+
+        with sock:
+            for start in range(0, len(updates), self.batch_size):
+                batch = updates[start:start + self.batch_size]
+                try:
+                    response = dns.query.tcp(self.message(zone, batch), self.server,
+                                             timeout=self.timeout, sock=sock)
+                except Exception as e:
+                    logger.warning(f"Dynamic update of {zone} failed after {start} records: {e}")
+                    break
+                rcode = response.rcode()
+                if rcode == dns.rcode.NOERROR:
+                    logger.debug(f"Updated {len(batch)} records in {zone} with one UPDATE message")
+                    results[start:start + len(batch)] = [True] * len(batch)
+                else:
+                    logger.warning(f"Dynamic update of {len(batch)} records in {zone} refused: "
+                                   f"{dns.rcode.to_text(rcode)}")
+        return results
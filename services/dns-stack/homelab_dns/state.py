@@ -0,0 +1,87 @@
+"""
+State cache of unifi-dns-sync
+
+One JSON file per zone records the hosts the last runs published, so a
+run with no client changes can skip the zone entirely, plus a hash of the
+records those hosts should have in the zone, so a later full resync can
+spot edits made outside the sync.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import time
+from typing import Dict, List, Optional
+
+from .storage import atomic_write_json
+
+logger = logging.getLogger(__name__)
+
+STATE_VERSION = 3  # 2: PTR records, 3: per-host TTL and source (each forces one full resync)
+
+
+def zone_state_file(state_file: str, zone: str, zones: List[str]) -> str:
+    """State cache path for a zone; with several zones each gets its own file"""
+    if len(zones) <= 1:
+        return state_file
+    root, ext = os.path.splitext(state_file)
+    return f"{root}.{zone}{ext or '.json'}"
+
+
+def zone_hash(records: Dict[str, str]) -> str:
+    """Stable hash of a {hostname: ip} zone snapshot"""
+    digest = hashlib.sha256()
+    for name in sorted(records):
+        digest.update(f"{name} {records[name]}\n".encode())
+    return digest.hexdigest()
+
+
+def load_state(path: str, zone: str) -> Optional[Dict]:
+    """Load the state cache from the previous run (None if missing or unusable)"""
+    try:
+        with open(path) as f:
+            state = json.load(f)
+    except FileNotFoundError:
+        logger.info("No state cache found, doing a full resync")
+        return None
+    except (OSError, ValueError) as e:
+        logger.warning(f"Ignoring unreadable state cache {path}: {e}")
+        return None
+
+    if not isinstance(state, dict) or state.get("version") != STATE_VERSION or state.get("zone") != zone \
+            or not isinstance(state.get("clients"), dict):
+        logger.info("State cache does not match this zone, doing a full resync")
+        return None
+    return state
+
+
+def save_state(path: str, previous: Dict, hosts: Dict[str, Dict], failed: List[str],
+               removed: List[str], zone: str, full: bool = False):
+    """
+    Merge this run's hosts into the state cache and write it atomically.
+
+    Hosts in `failed` keep their previous entry (or none) so the next run
+    retries them; hosts in `removed` are forgotten. The zone hash covers
+    the records we expect to find for every cached host, so a later full
+    resync can spot outside edits.
+    """
+    clients = dict(previous.get("clients", {}))
+    for hostname, host in hosts.items():
+        if hostname not in failed:
+            clients[hostname] = host
+    for hostname in removed:
+        clients.pop(hostname, None)
+
+    state = {
+        "version": STATE_VERSION,
+        "zone": zone,
+        "clients": clients,
+        "zone_hash": zone_hash({hostname: host["ip"] for hostname, host in clients.items()}),
+        "last_full_sync": time.time() if full else previous.get("last_full_sync", 0),
+        "updated": time.time(),
+    }
+    try:
+        atomic_write_json(path, state)
+    except OSError as e:
+        logger.warning(f"Could not write state cache {path}: {e}")
@@ -0,0 +1,44 @@
+"""
+Atomic file writes for caches, state files, journals and metrics
+
+Every file the tools keep between runs is written to a temporary file in
+the same directory and renamed over the old one, so a crash or a reader
+(the textfile collector, the next run) never sees a partial file.
+"""
+
+import json
+import os
+import tempfile
+from typing import Optional
+
+
+def atomic_write(path: str, text: str, mode: Optional[int] = None, dir_mode: int = 0o777,
+                 fsync: bool = False):
+    """
+    Replace `path` with `text` atomically.
+
+    The file is created 0600 unless `mode` is given; a missing directory
+    is created with `dir_mode`. With `fsync` the data is on disk before
+    the rename. Raises OSError (after removing the temporary file).
+    """
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, mode=dir_mode, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(path)}-")
+    try:
+        with os.fdopen(fd, "w") as f:
+            f.write(text)
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        if mode is not None:
+            os.chmod(tmp, mode)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+
+
+def atomic_write_json(path: str, data, **kwargs):
+    """Replace `path` with `data` as compact JSON atomically (see atomic_write)"""
+    atomic_write(path, json.dumps(data, separators=(",", ":")), **kwargs)
@@ -0,0 +1,409 @@
+"""
+Technitium DNS Server API client
+"""
+
+import ipaddress
+import logging
+import re
+import threading
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+import requests
+
+from .journal import step_key
+from .tokens import TOKEN_MAX_AGE, load_token, save_token
+from .transport import host_limiter, make_session
+from .zoneindex import ZoneIndex
+
+logger = logging.getLogger(__name__)
+
+DNS_BULK_BATCH_SIZE = 500  # Records per zone file import
+
+# Names that can be written verbatim into a zone file
+ZONE_FILE_NAME = re.compile(r"^[A-Za-z0-9_-]+(\.[A-Za-z0-9_-]+)*$")
+
+# API parameter carrying the record data, by record type
+VALUE_PARAMS = {"A": "ipAddress", "AAAA": "ipAddress", "PTR": "ptrName", "CNAME": "cname"}
+
+
+def qualify(name: str, zone: str) -> str:
+    """Fully qualified name (without the trailing dot) of `name` in `zone`"""
+    name = name.rstrip(".")
+    if name in ("", "@"):
+        return zone
+    if name.lower() == zone.lower() or name.lower().endswith(f".{zone.lower()}"):
+        return name
+    return f"{name}.{zone}"
+
+
+@lru_cache(maxsize=None)
+def reverse_name(ip: str) -> Optional[str]:
+    """in-addr.arpa / ip6.arpa name for an address (None if invalid)"""
+    try:
+        return ipaddress.ip_address(ip).reverse_pointer
+    except ValueError:
+        return None
+
+
+def ptr_address(name: str) -> Optional[str]:
+    """Address a reverse name points from (None unless it names a single host)"""
+    name = name.rstrip(".").lower()
+    try:
+        if name.endswith(".in-addr.arpa"):
+            labels = name[:-len(".in-addr.arpa")].split(".")
+            if len(labels) == 4:
+                return str(ipaddress.IPv4Address(".".join(reversed(labels))))
+        elif name.endswith(".ip6.arpa"):
+            nibbles = name[:-len(".ip6.arpa")].split(".")
+            if len(nibbles) == 32:
+                return str(ipaddress.IPv6Address(int("".join(reversed(nibbles)), 16)))
+    except ValueError:
+        pass
+    return None
+
+
+def render_zone_fragment(zone: str, records: List[Tuple[str, str]], ttl: int, rtype: str = "A") -> str:
+    """Render (hostname, ip) pairs as RFC 1035 zone file A records, or (ip, target) pairs as PTRs"""
+    if rtype == "PTR":
+        return "".join(f"{reverse_name(ip)}. {ttl} IN PTR {target}.\n" for ip, target in records)
+    return "".join(f"{qualify(hostname, zone)}. {ttl} IN A {ip}\n" for hostname, ip in records)
+
+
+class TechnitiumDNS:
+    """
+    Client for the Technitium DNS Server API
+
+    The session token is kept in `token_cache` between runs, so a run only
+    logs in when the cached token is missing, older than `token_max_age`,
+    or rejected by the server (rejected tokens are renewed once,
+    transparently, even with many worker threads). Records written with
+    an `owner` carry it as their comment, so list_records() can tell them
+    apart from hand-managed ones.
+    """
+
+    timeout = 10       # Single-record calls
+    bulk_timeout = 30  # Zone listings and imports
+
+    def __init__(self, base_url: str, username: str, password: str,
+                 session: Optional[requests.Session] = None,
+                 token_cache: Optional[str] = None, token_max_age: float = TOKEN_MAX_AGE,
+                 owner: str = ""):
+        self.base_url = base_url.rstrip('/')
+        self.username = username
+        self.password = password
+        self.token = None
+        self.session = session or make_session()
+        self.token_cache = token_cache
+        self.token_max_age = token_max_age
+        self.cache_key = f"technitium {self.base_url} {username}"
+        self.owner = owner
+        self._login_lock = threading.Lock()
+
+    def login(self, force: bool = False) -> bool:
+        """Reuse the cached session token, or authenticate and cache a new one"""
+        if not force and self.token_cache:
+            token = load_token(self.token_cache, self.cache_key, self.token_max_age)
+            if token:
+                logger.debug("Using cached DNS session token")
+                self.token = token
+                return True
+        try:
+            response = self.session.get(
+                f"{self.base_url}/api/user/login",
+                params={"user": self.username, "pass": self.password, "includeInfo": "false"},
+                timeout=self.timeout
+            )
+            data = response.json()
+            if data.get("status") == "ok":
+                self.token = data.get("token")
+                if self.token_cache:
+                    save_token(self.token_cache, self.cache_key, self.token)
+                logger.info("Successfully authenticated with DNS server")
+                return True
+            logger.error(f"DNS login failed: {data.get('errorMessage', 'Unknown error')}")
+            return False
+        except Exception as e:
+            logger.error(f"DNS login error: {e}")
+            return False
+
+    def relogin(self, stale: Optional[str]) -> bool:
+        """Replace a rejected token; concurrent callers share one new login"""
+        with self._login_lock:
+            if self.token != stale:
+                return bool(self.token)
+            logger.info("DNS session token expired, logging in again")
+            if self.token_cache:
+                save_token(self.token_cache, self.cache_key, None)
+            if self.login(force=True):
+                return True
+            self.token = None
+            return False
+
+    def available(self) -> bool:
+        """False while the circuit breaker for this server is refusing requests"""
+        limiter = host_limiter(self.session, self.base_url)
+        return not (limiter and limiter.is_open)
+
+    def request(self, method: str, path: str, params: Dict, **kwargs) -> Dict:
+        """Call the API with the session token, logging in again once if it was rejected"""
+        for attempt in (1, 2):
+            token = self.token
+            response = self.session.request(method, f"{self.base_url}{path}",
+                                            params={"token": token, **params}, **kwargs)
+            if response.status_code != 401:
+                data = response.json()
+                if data.get("status") != "invalid-token":
+                    return data
+            if attempt == 2 or not self.relogin(token):
+                return {"status": "invalid-token", "errorMessage": "DNS session token was rejected"}
+
+    def list_zone(self, zone: str) -> Optional[List[Dict]]:
+        """Every record in the zone as returned by the API (None on error)"""
+        if not self.token:
+            return None
+        try:
+            data = self.request("GET", "/api/zones/records/get",
+                                {"zone": zone, "domain": zone, "listZone": "true"},
+                                timeout=self.bulk_timeout)
+            if data.get("status") != "ok":
+                logger.error(f"Failed to list zone {zone}: {data.get('errorMessage', 'Unknown error')}")
+                return None
+            return data.get("response", {}).get("records", [])
+        except Exception as e:
+            logger.error(f"Error listing zone {zone}: {e}")
+            return None
+
+    def get_zone(self, zone: str) -> Optional[Dict[Tuple[str, str], List[Dict]]]:
+        """Every record in the zone indexed by (lowercase name, type), or None on error"""
+        records = self.list_zone(zone)
+        if records is None:
+            return None
+        index: Dict[Tuple[str, str], List[Dict]] = {}
+        for record in records:
+            key = (record.get("name", "").lower(), record.get("type", ""))
+            index.setdefault(key, []).append(record)
+        return index
+
+    def list_records(self, zone: str) -> List[Dict]:
+        """A records in the zone as [{"name" (relative), "ip", "ttl", "owned"}] ([] on error)"""
+        records = []
+        for record in self.list_zone(zone) or []:
+            if record.get("type") != "A":
+                continue
+            name = record.get("name", "")
+            if name.endswith(f".{zone}"):
+                name = name[:-len(f".{zone}")]
+            elif name == zone:
+                name = "@"
+            ip = record.get("rData", {}).get("ipAddress", "")
+            if name and ip:
+                records.append({
+                    "name": name.lower(),
+                    "ip": ip,
+                    "ttl": record.get("ttl"),
+                    "owned": bool(self.owner) and record.get("comments", "") == self.owner,
+                })
+        return records
+
+    def list_ptr_records(self, zone: str) -> Optional[List[Dict]]:
+        """PTR records in a reverse zone as [{"ip", "target", "owned"}] (None on error)"""
+        listing = self.list_zone(zone)
+        if listing is None:
+            return None
+        return self.ptr_records(listing)
+
+    def get_ptr_records(self, zone: str, ip: str) -> Optional[List[Dict]]:
+        """PTR records at one address, in the same form (None on error)"""
+        if not self.token:
+            return None
+        try:
+            data = self.request("GET", "/api/zones/records/get",
+                                {"zone": zone, "domain": reverse_name(ip)}, timeout=self.timeout)
+            if data.get("status") != "ok":
+                logger.error(f"Failed to look up PTR records for {ip}: {data.get('errorMessage', 'Unknown error')}")
+                return None
+            return self.ptr_records(data.get("response", {}).get("records", []))
+        except Exception as e:
+            logger.error(f"Error looking up PTR records for {ip}: {e}")
+            return None
+
+    def ptr_records(self, listing: List[Dict]) -> List[Dict]:
+        """The PTR records of an API listing as [{"ip", "target", "owned"}]"""
+        records = []
+        for record in listing:
+            if record.get("type") != "PTR":
+                continue
+            ip = ptr_address(record.get("name", ""))
+            target = record.get("rData", {}).get("ptrName", "").rstrip(".").lower()
+            if ip and target:
+                records.append({"ip": ip, "target": target,
+                                "owned": bool(self.owner) and record.get("comments", "") == self.owner})
+        return records
+
+    def get_records(self, zone: str) -> ZoneIndex:
+        """A records in the zone indexed by name and by address (empty on error)"""
+        return ZoneIndex(self.list_records(zone))
+
+    def add_record(self, zone: str, name: str, rtype: str, value: str, ttl: int = 3600,
+                   overwrite: bool = True) -> bool:
+        """
+        Add a record; `name` may be relative to the zone or fully qualified.
+        With `overwrite`, other records of this type at the name are replaced.
+        """
+        if not self.token:
+            return False
+
+        fqdn = qualify(name, zone)
+        params = {
+            "zone": zone,
+            "domain": fqdn,
+            "type": rtype,
+            VALUE_PARAMS.get(rtype, "value"): value,
+            "ttl": ttl,
+            "overwrite": "true" if overwrite else "false",
+        }
+        if self.owner:
+            params["comments"] = self.owner
+        try:
+            data = self.request("GET", "/api/zones/records/add", params, timeout=self.timeout)
+            if data.get("status") == "ok":
+                logger.debug(f"Added {rtype} record: {fqdn} -> {value}")
+                return True
+            logger.error(f"Failed to add {rtype} record {fqdn}: {data.get('errorMessage', 'Unknown error')}")
+            return False
+        except Exception as e:
+            logger.error(f"Error adding {rtype} record {fqdn}: {e}")
+            return False
+
+    def delete_record(self, zone: str, name: str, rtype: str, value: str) -> bool:
+        """Delete the record of type `rtype` from `name` to `value`"""
+        if not self.token:
+            return False
+
+        fqdn = qualify(name, zone)
+        try:
+            data = self.request("GET", "/api/zones/records/delete", {
+                "zone": zone,
+                "domain": fqdn,
+                "type": rtype,
+                VALUE_PARAMS.get(rtype, "value"): value,
+            }, timeout=self.timeout)
+            if data.get("status") == "ok":
+                logger.debug(f"Deleted {rtype} record: {fqdn} -> {value}")
+                return True
+            logger.error(f"Failed to delete {rtype} record {fqdn}: {data.get('errorMessage', 'Unknown error')}")
+            return False
+        except Exception as e:
+            logger.error(f"Error deleting {rtype} record {fqdn}: {e}")
+            return False
+
+    def import_records(self, zone: str, records: List[Tuple[str, str]], ttl: int = 3600,
+                       rtype: str = "A") -> bool:
+        """
+        Add or update many records in one zone file import: (hostname, ip)
+        pairs for A records, (ip, target fqdn) pairs for PTR records.
+        """
+        if not self.token:
+            return False
+
+        try:
+            data = self.request(
+                "POST", "/api/zones/import",
+                {"zone": zone, "overwrite": "true", "overwriteSoaSerial": "false"},
+                data=render_zone_fragment(zone, records, ttl, rtype),
+                headers={"Content-Type": "text/plain"},
+                timeout=self.bulk_timeout
+            )
+            if data.get("status") == "ok":
+                logger.debug(f"Imported {len(records)} {rtype} records into {zone}")
+                return True
+            logger.warning(f"Zone import failed: {data.get('errorMessage', 'Unknown error')}")
+            return False
+        except Exception as e:
+            logger.warning(f"Error importing {len(records)} records: {e}")
+            return False
+
+    def add_records(self, zone: str, records: List[Tuple[str, str]], ttl: int = 3600,
+                    batch_size: int = DNS_BULK_BATCH_SIZE, journal=None) -> int:
+        """
+        Add many A records using batched zone file imports.
+        Batches that fail (and names that can't be written to a zone file)
+        fall back to one add_record call each. Records already marked done
+        in `journal` (a StepJournal) are skipped and newly added ones are
+        marked, keyed per hostname so a rerun resumes however the records
+        are ordered. Returns the number added.
+        """
+        # Later entries win, matching sequential overwrite=true adds
+        latest = {}
+        for hostname, ip in records:
+            latest[hostname] = ip
+
+        def key(hostname: str, ip: str) -> str:
+            return step_key("dns-import", f"{zone} {hostname.lower()}", [ttl, ip])
+
+        def mark(entries: List[Tuple[str, str]]):
+            if journal is not None:
+                journal.mark(*(key(hostname, ip) for hostname, ip in entries))
+
+        added = 0
+        if journal is not None:
+            pending = {h: ip for h, ip in latest.items() if not journal.done(key(h, ip))}
+            added, latest = len(latest) - len(pending), pending
+
+        bulk = [(h, ip) for h, ip in latest.items() if ZONE_FILE_NAME.match(h)]
+        single = [(h, ip) for h, ip in latest.items() if not ZONE_FILE_NAME.match(h)]
+
+        for start in range(0, len(bulk), batch_size):
+            batch = bulk[start:start + batch_size]
+            if self.import_records(zone, batch, ttl):
+                logger.info(f"Imported {len(batch)} DNS records into {zone}")
+                mark(batch)
+                added += len(batch)
+            else:
+                logger.warning(f"Falling back to per-record adds for {len(batch)} records")
+                single.extend(batch)
+
+        done = []
+        for hostname, ip in single:
+            if self.add_record(zone, hostname, "A", ip, ttl):
+                done.append((hostname, ip))
+        mark(done)
+        return added + len(done)
+
+    def create_zone(self, zone: str) -> bool:
+        """Create a primary zone (succeeds if it already exists)"""
+        if not self.token:
+            return False
+
+        try:
+            data = self.request("GET", "/api/zones/create", {"zone": zone, "type": "Primary"},
+                                timeout=self.timeout)
+            if data.get("status") == "ok":
+                logger.info(f"Created DNS zone: {zone}")
+                return True
+            if "already exists" in data.get("errorMessage", "").lower():
+                logger.info(f"DNS zone already exists: {zone}")
+                return True
+            logger.error(f"Failed to create zone: {data.get('errorMessage', 'Unknown error')}")
+            return False
+        except Exception as e:
+            logger.error(f"Error creating zone: {e}")
+            return False
+
+    def configure_forwarders(self, forwarders: List[str]) -> bool:
+        """Configure upstream DNS forwarders"""
+        if not self.token:
+            return False
+
+        try:
+            data = self.request("GET", "/api/settings/set", {"forwarders": ",".join(forwarders)},
+                                timeout=self.timeout)
+            if data.get("status") == "ok":
+                logger.info(f"Configured DNS forwarders: {', '.join(forwarders)}")
+                return True
+            logger.error(f"Failed to set forwarders: {data.get('errorMessage', 'Unknown error')}")
+            return False
+        except Exception as e:
+            logger.error(f"Error setting forwarders: {e}")
+            return False
@@ -0,0 +1,52 @@
+"""
+On-disk cache of API tokens, so timer runs don't log in every time
+
+One JSON file maps a key (service, server and user) to a token and the
+time it was issued. The file is created 0600 in a 0700 directory.
+"""
+
+import json
+import logging
+import time
+from typing import Optional
+
+from .storage import atomic_write_json
+
+logger = logging.getLogger(__name__)
+
+TOKEN_MAX_AGE = 12 * 3600  # Log in afresh after this long even if the token still works
+
+
+def load_token(path: str, key: str, max_age: float = TOKEN_MAX_AGE) -> Optional[str]:
+    """Cached token for `key` (server and user), or None if missing or expired"""
+    try:
+        with open(path) as f:
+            entry = json.load(f).get(key)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError, AttributeError) as e:
+        logger.warning(f"Ignoring unreadable token cache {path}: {e}")
+        return None
+    if not isinstance(entry, dict) or time.time() - entry.get("created", 0) > max_age:
+        return None
+    return entry.get("token")
+
+
+def save_token(path: str, key: str, token: Optional[str]):
+    """Store (or with None, forget) the token for `key`; the file is only readable by us"""
+    try:
+        with open(path) as f:
+            tokens = json.load(f)
+        if not isinstance(tokens, dict):
+            tokens = {}
+    except (OSError, ValueError):
+        tokens = {}
+    if token:
+        tokens[key] = {"token": token, "created": time.time()}
+    else:
+        tokens.pop(key, None)
+
+    try:
+        atomic_write_json(path, tokens, dir_mode=0o700)  # Created 0600
+    except OSError as e:
+        logger.warning(f"Could not write token cache {path}: {e}")
@@ -0,0 +1,307 @@
+"""
+HTTP transport shared by every client
+
+One keep-alive session per process, with urllib3 retries and a
+HostLimiter per backend host (rate limit, adaptive concurrency, circuit
+breaker), plus a streaming parser for large JSON responses.
+"""
+
+import codecs
+import json
+import logging
+import re
+import threading
+import time
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+from urllib.parse import urlparse
+
+import requests
+import urllib3
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# UniFi controllers use self-signed certificates
+urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+
+logger = logging.getLogger(__name__)
+
+HTTP_POOL_SIZE = 10       # Max open connections per host
+HTTP_RETRIES = 3          # Retries on connection errors / 429 / 5xx
+HTTP_BACKOFF = 0.5        # Backoff factor between retries (0.5s, 1s, 2s...)
+STREAM_CHUNK_SIZE = 64 * 1024  # Bytes read at a time when streaming large JSON responses
+
+# Adaptive request scheduling - applied per backend host on top of the pool
+HTTP_RATE_LIMIT = 500.0    # Requests per second per host (0 = unlimited)
+HTTP_BURST = 50            # Requests allowed back to back before the rate applies
+HTTP_LATENCY_TARGET = 1.0  # Slower responses (or 429/5xx) halve the concurrency limit
+BREAKER_FAILURES = 5       # Consecutive failures that open a host's circuit
+BREAKER_COOLDOWN = 30      # Seconds an open circuit rejects requests before probing again
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """A request was refused locally because its host's circuit breaker is open"""
+
+
+class HostLimiter:
+    """
+    Request scheduling for one backend host.
+
+    A token bucket caps the request rate, and the number of requests in
+    flight adapts AIMD-style: each fast success raises the limit by about
+    one per round trip, and slow responses, 429s, 5xx and connection errors
+    halve it (at most once per latency target). After BREAKER_FAILURES
+    failures in a row the circuit opens: requests fail immediately for
+    BREAKER_COOLDOWN seconds, then a single probe decides whether it closes.
+    """
+
+    def __init__(self, host: str, max_concurrency: int, rate: float = HTTP_RATE_LIMIT,
+                 burst: int = HTTP_BURST, latency_target: float = HTTP_LATENCY_TARGET,
+                 failure_threshold: int = BREAKER_FAILURES, cooldown: float = BREAKER_COOLDOWN):
+        self.host = host
+        self.max_concurrency = max(1, max_concurrency)
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.latency_target = latency_target
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.cond = threading.Condition()
+        self.limit = float(self.max_concurrency)
+        self.in_flight = 0
+        self.tokens = float(self.burst)
+        self.refilled = time.monotonic()
+        self.last_decrease = 0.0
+        self.failures = 0
+        self.open_until = 0.0  # 0 = closed
+        self.probing = False
+
+    @property
+    def is_open(self) -> bool:
+        """True while requests are being refused (not yet due for a probe)"""
+        with self.cond:
+            return bool(self.open_until) and (time.monotonic() < self.open_until or self.probing)
+
+    def acquire(self) -> Tuple[float, bool]:
+        """
+        Wait for a concurrency slot and a rate token. Returns the seconds
+        spent waiting and whether this request is the half-open probe.
+        """
+        started = time.monotonic()
+        probe = False
+        with self.cond:
+            if self.open_until:
+                if started < self.open_until or self.probing:
+                    raise CircuitOpenError(f"circuit open for {self.host}")
+                self.probing = probe = True  # Half-open: this request decides
+
+            # Both conditions are re-checked after every wake: waiting releases
+            # the lock, so other requests may have taken the slot meanwhile
+            while True:
+                if self.in_flight >= int(self.limit):
+                    self.cond.wait()
+                    continue
+                if self.rate <= 0:
+                    break
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.refilled) * self.rate)
+                self.refilled = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    break
+                self.cond.wait((1 - self.tokens) / self.rate)
+            self.in_flight += 1
+        return time.monotonic() - started, probe
+
+    def release(self, ok: bool, elapsed: float, probe: bool = False) -> bool:
+        """Record a finished request; returns True if it tripped the breaker"""
+        tripped = False
+        with self.cond:
+            now = time.monotonic()
+            self.in_flight -= 1
+            if ok and elapsed <= self.latency_target:
+                self.limit = min(self.max_concurrency, self.limit + 1 / self.limit)
+            elif now - self.last_decrease >= self.latency_target:
+                self.limit = max(1.0, self.limit / 2)
+                self.last_decrease = now
+
+            if ok:
+                self.failures = 0
+                if self.open_until:
+                    logger.info(f"{self.host} is responding again, closing its circuit")
+                self.open_until = 0.0
+            else:
+                self.failures += 1
+                if probe or (not self.open_until and self.failures >= self.failure_threshold):
+                    tripped = not self.open_until
+                    self.open_until = now + self.cooldown
+                    logger.warning(f"{self.host}: {self.failures} failed requests in a row, "
+                                   f"pausing requests for {self.cooldown:g}s")
+            if probe:
+                self.probing = False
+            self.cond.notify_all()
+        return tripped
+
+
+class SchedulingAdapter(HTTPAdapter):
+    """HTTPAdapter that routes every request through its host's HostLimiter"""
+
+    def __init__(self, max_concurrency: int, rate: float = HTTP_RATE_LIMIT,
+                 failure_threshold: int = BREAKER_FAILURES, cooldown: float = BREAKER_COOLDOWN,
+                 **kwargs):
+        self.max_concurrency = max_concurrency
+        self.rate = rate
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.limiters: Dict[str, HostLimiter] = {}
+        self.limiters_lock = threading.Lock()
+        self.metrics = None  # Set by Metrics.attach()
+        super().__init__(**kwargs)
+
+    def limiter(self, url: str) -> HostLimiter:
+        host = urlparse(url).netloc
+        with self.limiters_lock:
+            if host not in self.limiters:
+                self.limiters[host] = HostLimiter(host, self.max_concurrency, self.rate,
+                                                  failure_threshold=self.failure_threshold,
+                                                  cooldown=self.cooldown)
+            return self.limiters[host]
+
+    def send(self, request, **kwargs):
+        limiter = self.limiter(request.url)
+        metrics = self.metrics
+        try:
+            waited, probe = limiter.acquire()
+        except CircuitOpenError:
+            if metrics:
+                metrics.inc("http_rejected_total", host=limiter.host)
+            raise
+        if metrics and waited > 0.001:
+            metrics.inc("http_throttled_seconds_total", round(waited, 6), host=limiter.host)
+
+        started = time.monotonic()
+        ok = False
+        try:
+            response = super().send(request, **kwargs)
+            ok = response.status_code < 500 and response.status_code != 429
+            return response
+        finally:
+            tripped = limiter.release(ok, time.monotonic() - started, probe)
+            if metrics:
+                metrics.set("http_concurrency_limit", round(limiter.limit, 2), host=limiter.host)
+                if tripped:
+                    metrics.inc("http_circuit_trips_total", host=limiter.host)
+
+
+def host_limiter(session: requests.Session, url: str) -> Optional[HostLimiter]:
+    """The limiter scheduling requests to `url`'s host, if the session has one"""
+    adapter = session.get_adapter(url)
+    return adapter.limiter(url) if isinstance(adapter, SchedulingAdapter) else None
+
+
+def make_session(pool_size: int = HTTP_POOL_SIZE, retries: int = HTTP_RETRIES,
+                 backoff: float = HTTP_BACKOFF, rate: float = HTTP_RATE_LIMIT,
+                 failures: int = BREAKER_FAILURES, cooldown: float = BREAKER_COOLDOWN) -> requests.Session:
+    """
+    Build a keep-alive HTTP session with per-host connection pools.
+
+    Every client shares one session so repeated calls to the same
+    controller reuse an open TCP/TLS connection instead of handshaking
+    per request. Idempotent methods are retried with exponential backoff,
+    and each host gets its own HostLimiter (rate limit, adaptive
+    concurrency up to `pool_size`, circuit breaker).
+    """
+    retry = Retry(
+        total=retries,
+        backoff_factor=backoff,
+        status_forcelist=(429, 500, 502, 503, 504),
+        raise_on_status=False,
+    )
+    adapter = SchedulingAdapter(pool_size, rate, failures, cooldown, pool_connections=4,
+                                pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def iter_json_items(chunks: Iterable[bytes], key: str, header: Optional[Dict] = None) -> Iterator:
+    """
+    Incrementally parse a JSON object arriving in byte chunks and yield
+    the elements of its top-level array `key` one at a time.
+
+    Only the unconsumed tail of the current chunk and one element are held
+    in memory, so response size doesn't matter. Other top-level fields
+    (e.g. "meta", "count", "next") are stored in `header` as they are seen.
+    Raises ValueError on malformed or truncated JSON.
+    """
+    decoder = json.JSONDecoder()
+    delimiter = re.compile(r"[\s,\]}]")
+    text = codecs.getincrementaldecoder("utf-8")()
+    chunks = iter(chunks)
+    header = header if header is not None else {}
+    buf, pos = "", 0
+
+    def fill() -> bool:
+        nonlocal buf, pos
+        for chunk in chunks:
+            if chunk:
+                buf, pos = buf[pos:] + text.decode(chunk), 0
+                return True
+        return False
+
+    def peek() -> str:
+        nonlocal pos
+        while True:
+            while pos < len(buf) and buf[pos] in " \t\r\n":
+                pos += 1
+            if pos < len(buf):
+                return buf[pos]
+            if not fill():
+                return ""
+
+    def expect(char: str):
+        nonlocal pos
+        if peek() != char:
+            raise ValueError(f"Expected {char!r} at offset {pos} while streaming JSON")
+        pos += 1
+
+    def value():
+        nonlocal pos
+        peek()
+        while True:
+            try:
+                obj, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                if fill():
+                    continue
+                raise
+            # A number cut off by the chunk boundary parses as a shorter one
+            if isinstance(obj, (int, float)) and not delimiter.match(buf, end) and fill():
+                continue
+            pos = end
+            return obj
+
+    expect("{")
+    while True:
+        char = peek()
+        if char == "}":
+            return
+        if char == ",":
+            pos += 1
+            continue
+        name = value()
+        expect(":")
+        if name != key:
+            header[name] = value()
+            continue
+        expect("[")
+        while True:
+            char = peek()
+            if char == "]":
+                pos += 1
+                break
+            if char == ",":
+                pos += 1
+                continue
+            if not char:
+                raise ValueError("Truncated JSON array")
+            yield value()
@@ -0,0 +1,90 @@
+"""
+UniFi Network controller API client
+"""
+
+import csv
+import logging
+from typing import Dict, Iterator, List, Optional
+
+import requests
+
+from .transport import STREAM_CHUNK_SIZE, iter_json_items, make_session
+
+logger = logging.getLogger(__name__)
+
+
+class ClientRecord:
+    """The fields of a UniFi client the sync uses; the rest of the payload is dropped"""
+
+    __slots__ = ("hostname", "ip", "mac", "last_seen")
+
+    def __init__(self, client: Dict):
+        # Prefer hostname, fall back to name
+        self.hostname = client.get("hostname") or client.get("name") or ""
+        self.ip = client.get("ip", "")
+        self.mac = client.get("mac", "")
+        self.last_seen = client.get("last_seen")
+
+
+class UnifiClient:
+    """Client for the UniFi Controller API"""
+
+    timeout = 15
+
+    def __init__(self, base_url: str, api_key: str, session: Optional[requests.Session] = None):
+        self.base_url = base_url.rstrip('/')
+        self.session = session or make_session()
+        self.headers = {
+            "X-API-KEY": api_key,
+            "Accept": "application/json",
+        }
+
+    def iter_client_data(self, site: str = "default") -> Iterator[Dict]:
+        """
+        Stream all active clients of a UniFi site as the controller reports
+        them. The response is parsed as it arrives, so the full payload is
+        never held in memory. Raises on HTTP or JSON errors.
+        """
+        with self.session.get(
+            f"{self.base_url}/proxy/network/api/s/{site}/stat/sta",
+            headers=self.headers,
+            verify=False,
+            timeout=self.timeout,
+            stream=True
+        ) as response:
+            if response.status_code != 200:
+                raise RuntimeError(f"UniFi API error: {response.status_code}")
+            yield from iter_json_items(response.iter_content(STREAM_CHUNK_SIZE), "data")
+
+    def iter_clients(self, site: str = "default") -> Iterator[ClientRecord]:
+        """Stream all active clients of a UniFi site as compact records"""
+        for client in self.iter_client_data(site):
+            yield ClientRecord(client)
+
+    def get_clients(self, site: str = "default") -> List[Dict]:
+        """All clients of a site with their full payload ([] on error)"""
+        try:
+            clients = list(self.iter_client_data(site))
+            logger.info(f"Retrieved {len(clients)} clients from Unifi site {site}")
+            return clients
+        except Exception as e:
+            logger.error(f"Error fetching clients from Unifi: {e}")
+            return []
+
+    def export_to_csv(self, clients: List[Dict], filename: str):
+        """Export clients to CSV file"""
+        with open(filename, 'w', newline='') as csvfile:
+            fieldnames = ['hostname', 'ip', 'mac', 'name', 'type']
+            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
+
+            writer.writeheader()
+            for client in clients:
+                writer.writerow({
+                    'hostname': client.get('hostname', client.get('name', 'unknown')),
+                    'ip': client.get('ip', ''),
+                    'mac': client.get('mac', ''),
+                    'name': client.get('name', client.get('hostname', '')),
+                    'type': 'wireless' if client.get('is_wired', False) is False else 'wired'
+                })
+
+        logger.info(f"Exported {len(clients)} clients to {filename}")
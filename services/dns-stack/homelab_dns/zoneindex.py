@@ -0,0 +1,187 @@
+"""
+Compact in-memory zone model
+
+ZoneIndex keeps a zone's address records indexed both ways, name →
+addresses and address → names. The sync's diff, conflict checks and PTR
+planning can then ask "what does this name point at" and "which names
+hold this address" with a dictionary lookup instead of a scan. A name may
+hold several addresses, so multi-homed hosts survive a listing intact.
+
+To stay small for zones of 100k+ records, addresses are stored as
+integers and names are interned, so both indexes share one string per
+name. A name or address with a single partner is stored bare; a set is
+only allocated for the rare name or address with several. The owner tag
+rides in the low bit of a name's addresses, and only TTLs that differ
+from the zone's usual one are kept, so a record costs little more than
+its two dictionary entries.
+"""
+
+import ipaddress
+import socket
+import sys
+from typing import Dict, Iterable, Iterator, Optional, Set, Tuple, Union
+
+IPV6_OFFSET = 1 << 32  # Packed IPv6 addresses sit above the IPv4 range
+
+
+def pack_ip(ip: str) -> int:
+    """Integer form of an IPv4 or IPv6 address (ValueError if invalid)"""
+    try:
+        return int.from_bytes(socket.inet_pton(socket.AF_INET, ip), "big")
+    except OSError:
+        return int(ipaddress.IPv6Address(ip)) + IPV6_OFFSET
+
+
+def unpack_ip(value: int) -> str:
+    """Text form of a pack_ip() value"""
+    if value < IPV6_OFFSET:
+        return socket.inet_ntoa(value.to_bytes(4, "big"))
+    return str(ipaddress.IPv6Address(value - IPV6_OFFSET))
+
+
+def _link(index: Dict, key, value) -> bool:
+    """Add `value` to `key`'s entry, upgrading a bare value to a set"""
+    current = index.get(key)
+    if current is None:
+        index[key] = value
+    elif isinstance(current, set):
+        if value in current:
+            return False
+        current.add(value)
+    elif current == value:
+        return False
+    else:
+        index[key] = {current, value}
+    return True
+
+
+def _unlink(index: Dict, key, value):
+    """Remove `value` from `key`'s entry, collapsing a single-member set"""
+    current = index.get(key)
+    if isinstance(current, set):
+        current.discard(value)
+        if len(current) == 1:
+            index[key] = next(iter(current))
+    elif current == value:
+        del index[key]
+
+
+def _members(entry) -> Tuple:
+    if entry is None:
+        return ()
+    if isinstance(entry, set):
+        return tuple(sorted(entry))
+    return (entry,)
+
+
+class ZoneIndex:
+    """
+    Address records of a zone, indexed by name and by address.
+
+    Names are compared lowercase; addresses are IPv4 or IPv6 text.
+    Records are built from [{"name", "ip", "ttl", "owned"}] as returned by
+    TechnitiumDNS.list_records() (or "target" in place of "name" for
+    list_ptr_records(), which indexes pointers by target and address).
+    The TTL is kept per name, as DNS keeps it per record set.
+    """
+
+    def __init__(self, records: Iterable[Dict] = ()):
+        # name -> packed address * 2 + owned; packed address -> name
+        self._addresses: Dict[str, Union[int, Set[int]]] = {}
+        self._names: Dict[int, Union[str, Set[str]]] = {}
+        self._ttl: Optional[int] = None  # The first TTL seen; _ttls holds the exceptions
+        self._ttls: Dict[str, int] = {}
+        self._count = 0
+        for record in records:
+            self.add(record.get("name") or record.get("target", ""), record["ip"],
+                     record.get("ttl"), record.get("owned", False))
+
+    def add(self, name: str, ip: str, ttl: Optional[int] = None, owned: bool = False) -> bool:
+        """Index one record; False if `ip` isn't an address"""
+        try:
+            address = pack_ip(ip)
+        except (TypeError, ValueError):
+            return False
+        name = sys.intern(name.lower())
+        if _link(self._names, address, name):
+            self._count += 1
+            _link(self._addresses, name, address * 2 + bool(owned))
+        elif owned:  # Seen again, this time with the owner tag
+            _unlink(self._addresses, name, address * 2)
+            _link(self._addresses, name, address * 2 + 1)
+        if ttl is not None:
+            if self._ttl is None:
+                self._ttl = ttl
+            if ttl != self._ttl:
+                self._ttls[name] = ttl
+            else:
+                self._ttls.pop(name, None)
+        return True
+
+    def discard(self, name: str, ip: str):
+        """Drop one record if present"""
+        try:
+            address = pack_ip(ip)
+        except (TypeError, ValueError):
+            return
+        name = name.lower()
+        if not self.has(name, ip):
+            return
+        _unlink(self._addresses, name, address * 2)
+        _unlink(self._addresses, name, address * 2 + 1)
+        _unlink(self._names, address, name)
+        self._count -= 1
+        if name not in self._addresses:
+            self._ttls.pop(name, None)
+
+    def addresses(self, name: str) -> Tuple[str, ...]:
+        """Addresses `name` points at, lowest first"""
+        return tuple(unpack_ip(value >> 1) for value in _members(self._addresses.get(name.lower())))
+
+    def names(self, ip: str) -> Tuple[str, ...]:
+        """Names pointing at `ip`, sorted"""
+        try:
+            return _members(self._names.get(pack_ip(ip)))
+        except (TypeError, ValueError):
+            return ()
+
+    def has(self, name: str, ip: str) -> bool:
+        """True if `name` points at `ip` (among any other addresses)"""
+        return self._find(name, ip, (0, 1))
+
+    def ttl(self, name: str) -> Optional[int]:
+        """TTL of the name's records (None if it has none)"""
+        name = name.lower()
+        if name not in self._addresses:
+            return None
+        return self._ttls.get(name, self._ttl)
+
+    def owned(self, name: str, ip: str) -> bool:
+        """True if the record carried the writer's owner tag"""
+        return self._find(name, ip, (1,))
+
+    def _find(self, name: str, ip: str, flags: Tuple[int, ...]) -> bool:
+        try:
+            address = pack_ip(ip)
+        except (TypeError, ValueError):
+            return False
+        entry = self._addresses.get(name.lower())
+        if entry is None:
+            return False
+        values = entry if isinstance(entry, set) else (entry,)
+        return any(address * 2 + flag in values for flag in flags)
+
+    def items(self) -> Iterator[Tuple[str, str]]:
+        """Every record as (name, ip)"""
+        for name, entry in self._addresses.items():
+            for value in _members(entry):
+                yield name, unpack_ip(value >> 1)
+
+    def __contains__(self, name: str) -> bool:
+        return name.lower() in self._addresses
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._addresses)
+
+    def __len__(self) -> int:
+        return self._count
@@ -8,19 +8,25 @@ This script:
 3. Configures Technitium DNS zones and records
 4. Sets up automatic sync between Netbox and DNS
 
+Logins, Netbox/DNS setup and the Unifi fetch run concurrently, and Netbox
+and DNS are filled side by side from the same stream of Unifi clients.
+
 Author: Homelab Automation
 """
 
+import os
 import sys
-import json
-import requests
-import urllib3
+import asyncio
+import ipaddress
 import logging
-from typing import Dict, List, Optional, Tuple
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
 from datetime import datetime
 
-# Disable SSL warnings for self-signed certs
-urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+from homelab_dns import StepJournal, make_session, step_key
+from homelab_dns.aio import AsyncNetboxClient, AsyncTechnitiumDNS, AsyncUnifiClient
+from homelab_dns.netbox import NETBOX_TOKEN_MAX_AGE
+from homelab_dns.tokens import TOKEN_MAX_AGE
+from homelab_dns.transport import HTTP_BACKOFF, HTTP_POOL_SIZE, HTTP_RETRIES
 
 # Configuration
 UNIFI_URL = "https://10.203.3.1"
@@ -34,12 +40,43 @@ DNS_USER = "admin"
 DNS_PASS = "changeme"
 DNS_ZONE = "hq.doofus.co"
 DNS_UPSTREAM = ["1.1.1.1", "8.8.8.8"]
+DNS_PTR_ZONES = ["203.10.in-addr.arpa"]  # Reverse zones unifi-dns-sync keeps PTR records in
 
 # Site configuration
 SITE_NAME = "HQ"
 SITE_SLUG = "hq"
 PREFIX_NETWORK = "10.203.3.0/24"
 
+# UniFi site -> Netbox site/prefixes -> DNS zone. A client belongs to the
+# first mapping for its UniFi site with a prefix containing its IP; clients
+# outside every prefix go to the site's first mapping.
+SITES = [
+    {"unifi_site": "default", "name": SITE_NAME, "slug": SITE_SLUG,
+     "zone": DNS_ZONE, "prefixes": [PREFIX_NETWORK]},
+]
+SITE_WORKERS = 4  # UniFi sites fetched concurrently
+
+# Netbox IP import: prefetch the prefix once, then bulk create/update
+NETBOX_BULK_IMPORT = True
+NETBOX_BULK_CHUNK_SIZE = 100
+
+# Records per zone file import when populating DNS
+DNS_BULK_BATCH_SIZE = 500
+
+# Netbox chunks and DNS import batches written at once per backend while
+# the Unifi client stream is still being consumed
+PIPELINE_WORKERS = 4
+
+# Credentials reused between runs: the provisioned Netbox API token and the
+# Technitium session token (file is 0600; "" = always log in afresh). How long
+# each is reused: TOKEN_MAX_AGE and NETBOX_TOKEN_MAX_AGE in homelab_dns
+TOKEN_CACHE_FILE = os.path.expanduser("~/.cache/dns-ipam-setup/tokens.json")
+
+# Completed steps of an interrupted run, so a rerun picks up where it stopped
+# (removed once a run finishes; "" = always start from scratch)
+SETUP_JOURNAL = os.path.expanduser("~/.cache/dns-ipam-setup/journal.jsonl")
+SETUP_JOURNAL_MAX_AGE = 7 * 86400
+
 # Set up logging
 logging.basicConfig(
     level=logging.INFO,
@@ -48,373 +85,222 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
-class UnifiController:
-    """Client for Unifi Controller API"""
-
-    def __init__(self, base_url: str, api_key: str):
-        self.base_url = base_url.rstrip('/')
-        self.api_key = api_key
-        self.headers = {
-            "X-API-KEY": api_key,
-            "Accept": "application/json",
-            "Content-Type": "application/json"
-        }
-
-    def get_clients(self) -> List[Dict]:
-        """Get all clients from Unifi controller"""
-        try:
-            url = f"{self.base_url}/proxy/network/api/s/default/stat/sta"
-            response = requests.get(
-                url,
-                headers=self.headers,
-                verify=False,
-                timeout=10
-            )
-
-            if response.status_code == 200:
-                data = response.json()
-                clients = data.get("data", [])
-                logger.info(f"Retrieved {len(clients)} clients from Unifi")
-                return clients
+def find_prefix(ip: str, prefixes: List[str]) -> Optional[int]:
+    """Index of the first prefix containing `ip` (None if none or invalid)"""
+    try:
+        address = ipaddress.ip_address(ip)
+    except ValueError:
+        return None
+    for i, prefix in enumerate(prefixes):
+        if address in ipaddress.ip_network(prefix, strict=False):
+            return i
+    return None
+
+
+def assign_site(ip: str, indexes: List[int], sites: List[Dict]) -> int:
+    """
+    Index of the `sites` entry a client belongs to, out of the `indexes` of
+    the entries for its UniFi site: the first with a prefix containing its
+    IP, else the first of them.
+    """
+    return next((i for i in indexes if find_prefix(ip, sites[i]["prefixes"]) is not None), indexes[0])
+
+
+class SetupError(Exception):
+    """A backend could not be prepared for the import"""
+
+
+class WriteBuffer:
+    """
+    Entries on their way to one backend, grouped by target (a Netbox
+    prefix or a DNS zone).
+
+    Once a target has `size` entries they are handed to `write` as a task,
+    so writes start while the client stream is still arriving. A key seen
+    again after its entry was handed off is held back and written after
+    everything else, so later entries still win.
+    """
+
+    def __init__(self, size: int, write: Callable[[str, Dict, bool], Awaitable[int]]):
+        self.size = size
+        self.write = write
+        self.pending: Dict[str, Dict] = {}
+        self.written: Dict[str, set] = {}
+        self.late: Dict[str, Dict] = {}
+        self.tasks: List[asyncio.Task] = []
+
+    def add(self, target: str, key: str, value):
+        if key in self.written.get(target, ()):
+            self.late.setdefault(target, {})[key] = value
+            return
+        entries = self.pending.setdefault(target, {})
+        entries[key] = value
+        if len(entries) >= self.size:
+            self.flush(target)
+
+    def flush(self, target: str):
+        entries = self.pending.pop(target)
+        self.written.setdefault(target, set()).update(entries)
+        self.tasks.append(asyncio.create_task(self.write(target, entries, False)))
+
+    async def drain(self) -> int:
+        """Write the remaining and held back entries; returns the number written"""
+        for target in list(self.pending):
+            self.flush(target)
+        written = sum(await asyncio.gather(*self.tasks))
+        late = await asyncio.gather(*(self.write(target, entries, True)
+                                      for target, entries in self.late.items()))
+        return written + sum(late)
+
+
+async def setup_netbox(netbox: AsyncNetboxClient) -> Dict[str, Optional[Dict[str, Dict]]]:
+    """
+    Log in and create every site and prefix. Returns the IP addresses
+    already in each prefix ({} without bulk import), so writes don't have
+    to look them up again.
+    """
+    logger.info("Configuring Netbox IPAM...")
+    if not await netbox.login(TOKEN_CACHE_FILE, NETBOX_TOKEN_MAX_AGE):
+        raise SetupError("Failed to authenticate with Netbox")
+
+    async def setup_site(site: Dict):
+        site["id"] = await netbox.create_site(site["name"], site["slug"])
+        if not site["id"]:
+            raise SetupError(f"Failed to create site {site['name']}")
+        for prefix in site["prefixes"]:
+            if not await netbox.create_prefix(prefix, site["id"]):
+                raise SetupError(f"Failed to create prefix {prefix}")
+
+    await asyncio.gather(*(setup_site(site) for site in SITES))
+    if not NETBOX_BULK_IMPORT:
+        return {}
+    prefixes = list(dict.fromkeys(prefix for site in SITES for prefix in site["prefixes"]))
+    existing = await asyncio.gather(*(netbox.get_prefix_ip_addresses(prefix) for prefix in prefixes))
+    return dict(zip(prefixes, existing))
+
+
+async def setup_dns(dns: AsyncTechnitiumDNS, zones: List[str]):
+    """Log in, configure forwarders and create the forward and reverse zones"""
+    logger.info("Configuring Technitium DNS...")
+    if not await dns.login():
+        raise SetupError("Failed to authenticate with DNS server")
+
+    # Reverse zones start empty; unifi-dns-sync fills in the PTR records
+    all_zones = zones + DNS_PTR_ZONES
+    results = await asyncio.gather(dns.configure_forwarders(DNS_UPSTREAM),
+                                   *(dns.create_zone(zone) for zone in all_zones))
+    for zone, created in zip(all_zones, results[1:]):
+        if not created:
+            raise SetupError(f"Failed to create DNS zone {zone}")
+
+
+async def provision(unifi: AsyncUnifiClient, netbox: AsyncNetboxClient, dns: AsyncTechnitiumDNS,
+                    zones: List[str], journal: StepJournal) -> Tuple[List[Dict], int, int, bool]:
+    """
+    Stream the clients of every UniFi site into Netbox and DNS.
+
+    Netbox and DNS are set up while the clients arrive; each client is
+    routed to its prefix and zone as soon as it is parsed, and full
+    buffers are written with at most PIPELINE_WORKERS writes per backend
+    in flight. Returns the clients, the number of IP addresses imported
+    into Netbox, the number of DNS records added and whether every site
+    was fetched and every write landed.
+    """
+    netbox_ready = asyncio.create_task(setup_netbox(netbox))
+    dns_ready = asyncio.create_task(setup_dns(dns, zones))
+    netbox_slots = asyncio.Semaphore(PIPELINE_WORKERS)
+    dns_slots = asyncio.Semaphore(PIPELINE_WORKERS)
+    site_slots = asyncio.Semaphore(SITE_WORKERS)
+    failures = []  # What has to be rerun: failed sites and short writes
+
+    def address_key(prefix: str, entry: Tuple[str, str, str]) -> str:
+        ip, hostname, description = entry
+        return step_key("netbox-import", f"{prefix} {ip}", [hostname, description])
+
+    async def write_addresses(prefix: str, entries: Dict[str, Tuple[str, str]], late: bool) -> int:
+        existing = await netbox_ready
+        batch = [(ip, hostname, description) for ip, (hostname, description) in entries.items()
+                 if not journal.done(address_key(prefix, (ip, hostname, description)))]
+        done = len(entries) - len(batch)
+        if not batch:
+            return done
+        async with netbox_slots:
+            if NETBOX_BULK_IMPORT:
+                # Held back entries may update addresses created during this run
+                imported = await netbox.import_ip_addresses(batch, prefix, NETBOX_BULK_CHUNK_SIZE,
+                                                            None if late else existing.get(prefix))
+                landed = batch if imported >= len(batch) else []
             else:
-                logger.error(f"Unifi API error: {response.status_code} - {response.text}")
-                return []
-        except Exception as e:
-            logger.error(f"Error fetching clients from Unifi: {e}")
-            return []
-
-    def export_to_csv(self, clients: List[Dict], filename: str):
-        """Export clients to CSV file"""
-        import csv
-
-        with open(filename, 'w', newline='') as csvfile:
-            fieldnames = ['hostname', 'ip', 'mac', 'name', 'type']
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-
-            writer.writeheader()
-            for client in clients:
-                writer.writerow({
-                    'hostname': client.get('hostname', client.get('name', 'unknown')),
-                    'ip': client.get('ip', ''),
-                    'mac': client.get('mac', ''),
-                    'name': client.get('name', client.get('hostname', '')),
-                    'type': 'wireless' if client.get('is_wired', False) is False else 'wired'
-                })
-
-        logger.info(f"Exported {len(clients)} clients to {filename}")
-
-
-class NetboxClient:
-    """Client for Netbox API"""
-
-    def __init__(self, base_url: str, token: str = None, username: str = None, password: str = None):
-        self.base_url = base_url.rstrip('/')
-        self.username = username
-        self.password = password
-        self.token = token
-        self.headers = {
-            "Content-Type": "application/json",
-            "Accept": "application/json"
-        }
-
-        # If token provided, set it immediately
-        if token:
-            self.headers["Authorization"] = f"Token {token}"
-
-    def login(self) -> bool:
-        """Login and get API token"""
-        # If token already set, verify it works
-        if self.token:
+                landed = [entry for entry in batch if await netbox.create_ip_address(*entry)]
+                imported = len(landed)
+        await asyncio.to_thread(journal.mark, *(address_key(prefix, entry) for entry in landed))
+        if imported < len(batch):
+            failures.append(f"{len(batch) - imported} Netbox addresses in {prefix}")
+        return done + imported
+
+    async def write_records(zone: str, entries: Dict[str, str], late: bool) -> int:
+        await dns_ready
+        async with dns_slots:
+            added = await dns.add_records(zone, list(entries.items()), batch_size=DNS_BULK_BATCH_SIZE,
+                                          journal=journal)
+        if added < len(entries):
+            failures.append(f"{len(entries) - added} DNS records in {zone}")
+        return added
+
+    addresses = WriteBuffer(NETBOX_BULK_CHUNK_SIZE, write_addresses)
+    records = WriteBuffer(DNS_BULK_BATCH_SIZE, write_records)
+    unifi_sites = list(dict.fromkeys(site["unifi_site"] for site in SITES))
+    clients_by_site: Dict[str, List[Dict]] = {unifi_site: [] for unifi_site in unifi_sites}
+
+    async def pull(unifi_site: str):
+        indexes = [i for i, site in enumerate(SITES) if site["unifi_site"] == unifi_site]
+        clients = clients_by_site[unifi_site]
+        async with site_slots:
             try:
-                response = requests.get(
-                    f"{self.base_url}/api/status/",
-                    headers=self.headers,
-                    timeout=10
-                )
-                if response.status_code == 200:
-                    logger.info("Successfully authenticated with Netbox using provided token")
-                    return True
+                async for client in unifi.iter_client_data(unifi_site):
+                    clients.append(client)
+                    ip = client.get("ip", "")
+                    hostname = client.get("hostname") or client.get("name") or "unknown"
+                    if not ip or hostname == "unknown":
+                        continue
+                    site = SITES[assign_site(ip, indexes, SITES)]
+                    # Addresses outside every prefix ride along with the first one
+                    prefix = site["prefixes"][find_prefix(ip, site["prefixes"]) or 0]
+                    addresses.add(prefix, ip, (hostname, f"MAC: {client.get('mac', '')}"))
+                    records.add(site["zone"], hostname, ip)
             except Exception as e:
-                logger.error(f"Token verification failed: {e}")
-                return False
-
-        # Otherwise try username/password
-        try:
-            # First, try to get or create API token
-            response = requests.post(
-                f"{self.base_url}/api/users/tokens/provision/",
-                auth=(self.username, self.password),
-                json={"username": self.username},
-                timeout=10
-            )
-
-            if response.status_code in [200, 201]:
-                data = response.json()
-                self.token = data.get("key")
-                self.headers["Authorization"] = f"Token {self.token}"
-                logger.info("Successfully authenticated with Netbox")
-                return True
-            else:
-                logger.error(f"Netbox login failed: {response.status_code} - {response.text}")
-                return False
-        except Exception as e:
-            logger.error(f"Netbox login error: {e}")
-            return False
-
-    def create_site(self, name: str, slug: str) -> Optional[int]:
-        """Create a site in Netbox"""
-        try:
-            # Check if site exists
-            response = requests.get(
-                f"{self.base_url}/api/dcim/sites/",
-                headers=self.headers,
-                params={"slug": slug},
-                timeout=10
-            )
-
-            if response.status_code == 200:
-                sites = response.json().get("results", [])
-                if sites:
-                    site_id = sites[0]["id"]
-                    logger.info(f"Site '{name}' already exists (ID: {site_id})")
-                    return site_id
-
-            # Create new site
-            response = requests.post(
-                f"{self.base_url}/api/dcim/sites/",
-                headers=self.headers,
-                json={
-                    "name": name,
-                    "slug": slug,
-                    "status": "active"
-                },
-                timeout=10
-            )
-
-            if response.status_code == 201:
-                site_id = response.json()["id"]
-                logger.info(f"Created site '{name}' (ID: {site_id})")
-                return site_id
-            else:
-                logger.error(f"Failed to create site: {response.status_code} - {response.text}")
-                return None
-        except Exception as e:
-            logger.error(f"Error creating site: {e}")
-            return None
-
-    def create_prefix(self, prefix: str, site_id: int) -> Optional[int]:
-        """Create a prefix in Netbox"""
-        try:
-            # Check if prefix exists
-            response = requests.get(
-                f"{self.base_url}/api/ipam/prefixes/",
-                headers=self.headers,
-                params={"prefix": prefix},
-                timeout=10
-            )
-
-            if response.status_code == 200:
-                prefixes = response.json().get("results", [])
-                if prefixes:
-                    prefix_id = prefixes[0]["id"]
-                    logger.info(f"Prefix '{prefix}' already exists (ID: {prefix_id})")
-                    return prefix_id
-
-            # Create new prefix
-            response = requests.post(
-                f"{self.base_url}/api/ipam/prefixes/",
-                headers=self.headers,
-                json={
-                    "prefix": prefix,
-                    "site": site_id,
-                    "status": "active"
-                },
-                timeout=10
-            )
-
-            if response.status_code == 201:
-                prefix_id = response.json()["id"]
-                logger.info(f"Created prefix '{prefix}' (ID: {prefix_id})")
-                return prefix_id
-            else:
-                logger.error(f"Failed to create prefix: {response.status_code} - {response.text}")
-                return None
-        except Exception as e:
-            logger.error(f"Error creating prefix: {e}")
-            return None
-
-    def create_ip_address(self, ip: str, dns_name: str, description: str = "") -> bool:
-        """Create an IP address in Netbox"""
-        try:
-            # Check if IP exists
-            response = requests.get(
-                f"{self.base_url}/api/ipam/ip-addresses/",
-                headers=self.headers,
-                params={"address": f"{ip}/24"},
-                timeout=10
-            )
-
-            if response.status_code == 200:
-                ips = response.json().get("results", [])
-                if ips:
-                    # Update existing IP
-                    ip_id = ips[0]["id"]
-                    response = requests.patch(
-                        f"{self.base_url}/api/ipam/ip-addresses/{ip_id}/",
-                        headers=self.headers,
-                        json={
-                            "dns_name": dns_name,
-                            "description": description
-                        },
-                        timeout=10
-                    )
-                    if response.status_code == 200:
-                        logger.info(f"Updated IP {ip} -> {dns_name}")
-                        return True
-                    return False
-
-            # Create new IP
-            response = requests.post(
-                f"{self.base_url}/api/ipam/ip-addresses/",
-                headers=self.headers,
-                json={
-                    "address": f"{ip}/24",
-                    "dns_name": dns_name,
-                    "status": "active",
-                    "description": description
-                },
-                timeout=10
-            )
-
-            if response.status_code == 201:
-                logger.info(f"Created IP {ip} -> {dns_name}")
-                return True
-            else:
-                logger.error(f"Failed to create IP {ip}: {response.status_code} - {response.text}")
-                return False
-        except Exception as e:
-            logger.error(f"Error creating IP {ip}: {e}")
-            return False
-
-
-class TechnitiumDNS:
-    """Client for Technitium DNS Server API"""
-
-    def __init__(self, base_url: str, username: str, password: str):
-        self.base_url = base_url.rstrip('/')
-        self.username = username
-        self.password = password
-        self.token = None
-
-    def login(self) -> bool:
-        """Authenticate with Technitium DNS server"""
-        try:
-            response = requests.get(
-                f"{self.base_url}/api/user/login",
-                params={
-                    "user": self.username,
-                    "pass": self.password,
-                    "includeInfo": "false"
-                },
-                timeout=10
-            )
-            data = response.json()
-            if data.get("status") == "ok":
-                self.token = data.get("token")
-                logger.info("Successfully authenticated with DNS server")
-                return True
-            else:
-                logger.error(f"DNS login failed: {data.get('errorMessage', 'Unknown error')}")
-                return False
-        except Exception as e:
-            logger.error(f"DNS login error: {e}")
-            return False
-
-    def create_zone(self, zone: str) -> bool:
-        """Create a primary zone"""
-        if not self.token:
-            return False
-
-        try:
-            response = requests.get(
-                f"{self.base_url}/api/zones/create",
-                params={
-                    "token": self.token,
-                    "zone": zone,
-                    "type": "Primary"
-                },
-                timeout=10
-            )
-            data = response.json()
-            if data.get("status") == "ok":
-                logger.info(f"Created DNS zone: {zone}")
-                return True
-            elif "already exists" in data.get("errorMessage", "").lower():
-                logger.info(f"DNS zone already exists: {zone}")
-                return True
-            else:
-                logger.error(f"Failed to create zone: {data.get('errorMessage', 'Unknown error')}")
-                return False
-        except Exception as e:
-            logger.error(f"Error creating zone: {e}")
-            return False
-
-    def add_record(self, zone: str, hostname: str, ip: str) -> bool:
-        """Add an A record to the zone"""
-        if not self.token:
-            return False
-
-        fqdn = f"{hostname}.{zone}" if not hostname.endswith(zone) else hostname
-
-        try:
-            response = requests.get(
-                f"{self.base_url}/api/zones/records/add",
-                params={
-                    "token": self.token,
-                    "zone": zone,
-                    "domain": fqdn,
-                    "type": "A",
-                    "ipAddress": ip,
-                    "ttl": 3600,
-                    "overwrite": "true"
-                },
-                timeout=10
-            )
-            data = response.json()
-            if data.get("status") == "ok":
-                logger.info(f"Added DNS record: {fqdn} -> {ip}")
-                return True
-            else:
-                logger.error(f"Failed to add record {fqdn}: {data.get('errorMessage', 'Unknown error')}")
-                return False
-        except Exception as e:
-            logger.error(f"Error adding record {fqdn}: {e}")
-            return False
-
-    def configure_forwarders(self, forwarders: List[str]) -> bool:
-        """Configure upstream DNS forwarders"""
-        if not self.token:
-            return False
-
-        try:
-            response = requests.get(
-                f"{self.base_url}/api/settings/set",
-                params={
-                    "token": self.token,
-                    "forwarders": ",".join(forwarders)
-                },
-                timeout=10
-            )
-            data = response.json()
-            if data.get("status") == "ok":
-                logger.info(f"Configured DNS forwarders: {', '.join(forwarders)}")
-                return True
-            else:
-                logger.error(f"Failed to set forwarders: {data.get('errorMessage', 'Unknown error')}")
-                return False
-        except Exception as e:
-            logger.error(f"Error setting forwarders: {e}")
-            return False
+                logger.error(f"Error fetching clients from Unifi site {unifi_site}: {e}")
+                failures.append(f"clients of Unifi site {unifi_site}")
+                return
+        logger.info(f"Retrieved {len(clients)} clients from Unifi site {unifi_site}")
+
+    drains: List[asyncio.Task] = []
+    try:
+        await asyncio.gather(*(pull(unifi_site) for unifi_site in unifi_sites))
+        clients = [client for site_clients in clients_by_site.values() for client in site_clients]
+
+        if not clients:
+            logger.warning("No clients retrieved from Unifi. Continuing with setup anyway...")
+        else:
+            # Export to CSV
+            csv_file = "/tmp/unifi-clients.csv"
+            await unifi.export_to_csv(clients, csv_file)
+            logger.info(f"Exported client list to: {csv_file}")
+
+        logger.info("\n[2/3] Finishing Netbox and DNS imports...")
+        await asyncio.gather(netbox_ready, dns_ready)
+        drains = [asyncio.create_task(buffer.drain()) for buffer in (addresses, records)]
+        imported, added = await asyncio.gather(*drains)
+        for failure in failures:
+            logger.error(f"Not imported: {failure}")
+        return clients, imported, added, not failures
+    finally:
+        # A SetupError from one backend leaves the other's setup and the
+        # buffered writes in flight; stop them and collect their errors
+        tasks = [netbox_ready, dns_ready, *drains, *addresses.tasks, *records.tasks]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
 
 
 def main():
@@ -423,90 +309,40 @@ def main():
     logger.info("Homelab DNS and IPAM Setup")
     logger.info("=" * 70)
 
-    # Step 1: Pull data from Unifi
-    logger.info("\n[1/5] Pulling device data from Unifi Controller...")
-    unifi = UnifiController(UNIFI_URL, UNIFI_API_KEY)
-    clients = unifi.get_clients()
-
-    if not clients:
-        logger.warning("No clients retrieved from Unifi. Continuing with setup anyway...")
-    else:
-        # Export to CSV
-        csv_file = "/tmp/unifi-clients.csv"
-        unifi.export_to_csv(clients, csv_file)
-        logger.info(f"Exported client list to: {csv_file}")
-
-    # Step 2: Setup Netbox
-    logger.info("\n[2/5] Configuring Netbox IPAM...")
-    netbox = NetboxClient(NETBOX_URL, token=NETBOX_TOKEN, username=NETBOX_USER, password=NETBOX_PASS)
-
-    if not netbox.login():
-        logger.error("Failed to authenticate with Netbox. Exiting.")
-        sys.exit(1)
-
-    # Create site
-    site_id = netbox.create_site(SITE_NAME, SITE_SLUG)
-    if not site_id:
-        logger.error("Failed to create site. Exiting.")
-        sys.exit(1)
-
-    # Create prefix
-    prefix_id = netbox.create_prefix(PREFIX_NETWORK, site_id)
-    if not prefix_id:
-        logger.error("Failed to create prefix. Exiting.")
+    # One pooled session shared by every client, site and zone
+    session = make_session(HTTP_POOL_SIZE, HTTP_RETRIES, HTTP_BACKOFF)
+    journal = StepJournal(SETUP_JOURNAL, SETUP_JOURNAL_MAX_AGE)
+
+    unifi = AsyncUnifiClient(UNIFI_URL, UNIFI_API_KEY, session=session)
+    netbox = AsyncNetboxClient(NETBOX_URL, token=NETBOX_TOKEN, username=NETBOX_USER, password=NETBOX_PASS,
+                               session=session)
+    dns = AsyncTechnitiumDNS(DNS_URL, DNS_USER, DNS_PASS, session=session,
+                             token_cache=TOKEN_CACHE_FILE, token_max_age=TOKEN_MAX_AGE)
+    zones = list(dict.fromkeys(site["zone"] for site in SITES))
+
+    logger.info("\n[1/3] Pulling device data from Unifi into Netbox and DNS...")
+    try:
+        clients, success_count, dns_success, complete = asyncio.run(
+            provision(unifi, netbox, dns, zones, journal))
+    except SetupError as e:
+        logger.error(f"{e}. Exiting.")
         sys.exit(1)
 
-    # Import IPs from Unifi
-    logger.info("\n[3/5] Importing IP addresses to Netbox...")
-    success_count = 0
-    for client in clients:
-        ip = client.get("ip")
-        hostname = client.get("hostname") or client.get("name") or "unknown"
-        mac = client.get("mac", "")
-
-        if ip and hostname != "unknown":
-            description = f"MAC: {mac}"
-            if netbox.create_ip_address(ip, hostname, description):
-                success_count += 1
-
     logger.info(f"Imported {success_count}/{len(clients)} IP addresses to Netbox")
-
-    # Step 3: Configure DNS
-    logger.info("\n[4/5] Configuring Technitium DNS...")
-    dns = TechnitiumDNS(DNS_URL, DNS_USER, DNS_PASS)
-
-    if not dns.login():
-        logger.error("Failed to authenticate with DNS server. Exiting.")
-        sys.exit(1)
-
-    # Create zone
-    if not dns.create_zone(DNS_ZONE):
-        logger.error("Failed to create DNS zone. Exiting.")
-        sys.exit(1)
-
-    # Configure forwarders
-    dns.configure_forwarders(DNS_UPSTREAM)
-
-    # Add DNS records
-    logger.info(f"Adding DNS records to zone {DNS_ZONE}...")
-    dns_success = 0
-    for client in clients:
-        ip = client.get("ip")
-        hostname = client.get("hostname") or client.get("name")
-
-        if ip and hostname and hostname != "unknown":
-            if dns.add_record(DNS_ZONE, hostname, ip):
-                dns_success += 1
-
     logger.info(f"Added {dns_success}/{len(clients)} DNS records")
+    if complete:
+        journal.remove()
+    else:
+        # Keep the journal so the rerun only retries what didn't land
+        logger.error(f"Some imports failed; rerun to retry them (progress kept in {SETUP_JOURNAL})")
 
-    # Step 4: Display summary
-    logger.info("\n[5/5] Setup Complete!")
+    # Display summary
+    logger.info("\n[3/3] Setup Complete!")
     logger.info("=" * 70)
     logger.info("Summary:")
     logger.info(f"  - Netbox:     http://10.203.3.202:8080 (admin/changeme)")
     logger.info(f"  - DNS:        http://10.203.3.203:5380 (admin/changeme)")
-    logger.info(f"  - Zone:       {DNS_ZONE}")
+    logger.info(f"  - Zones:      {', '.join(zones)}")
     logger.info(f"  - IPs added:  {success_count}")
     logger.info(f"  - DNS records: {dns_success}")
     logger.info("")
@@ -530,6 +366,8 @@ def main():
 
     # Save Netbox token for reference
     logger.info(f"\nNetbox API Token (save this): {netbox.token}")
+    if not complete:
+        sys.exit(1)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,11 @@
+"""
+Make homelab_dns and the bench fakes importable from the tests
+"""
+
+import os
+import sys
+
+STACK_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in (STACK_DIR, os.path.join(STACK_DIR, "bench")):
+    if path not in sys.path:
+        sys.path.insert(0, path)
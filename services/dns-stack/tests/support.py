@@ -0,0 +1,17 @@
+"""
+Load the dash-named command line scripts as modules
+"""
+
+import importlib.util
+import os
+
+from conftest import STACK_DIR
+
+
+def load_script(filename: str):
+    """Import a script such as unifi-dns-sync.py under a fresh module name"""
+    name = os.path.splitext(filename)[0].replace("-", "_")
+    spec = importlib.util.spec_from_file_location(name, os.path.join(STACK_DIR, filename))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
@@ -0,0 +1,145 @@
+"""
+unifi-dns-sync.py --daemon against the fake UniFi event websocket
+
+sync() is replaced with a recorder, so these tests only check when the
+daemon decides to sync: bursts of events are coalesced after the
+debounce delay, a stream that never goes quiet still syncs every
+max_delay seconds, and a sync that raises doesn't stop the daemon.
+"""
+
+import importlib.util
+import os
+import signal
+import tempfile
+import threading
+import time
+import unittest
+
+from support import load_script
+
+from fakes import FakeEventServer
+
+DEBOUNCE = 0.3
+MAX_DELAY = 1.0
+CONNECTED = {"meta": {"message": "events"}, "data": [{"key": "EVT_WU_Connected"}]}
+
+
+@unittest.skipIf(importlib.util.find_spec("websocket") is None, "needs websocket-client")
+class DaemonCoalescingTest(unittest.TestCase):
+
+    def setUp(self):
+        self.module = load_script("unifi-dns-sync.py")
+        self.server = FakeEventServer()
+        self.syncs = []  # (monotonic time, full)
+        self.failures = 0  # Syncs still to fail
+        self.metrics = self.module.new_metrics()
+        self.module.sync = self.record_sync
+        self.workdir = tempfile.TemporaryDirectory()
+        self.handlers = {sig: signal.getsignal(sig) for sig in (signal.SIGTERM, signal.SIGINT)}
+
+    def tearDown(self):
+        self.server.close()
+        self.workdir.cleanup()
+        for sig, handler in self.handlers.items():
+            signal.signal(sig, handler)
+
+    def record_sync(self, full_resync=False, **kwargs):
+        self.syncs.append((time.monotonic(), full_resync))
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("DNS server unreachable")
+        return 0, 0, 0, 0
+
+    def incremental(self, since: float):
+        return [at for at, full in self.syncs if not full and at >= since]
+
+    def wait_for(self, condition, timeout: float = 5):
+        deadline = time.monotonic() + timeout
+        while not condition():
+            if time.monotonic() > deadline:
+                self.fail("timed out waiting for the daemon")
+            time.sleep(0.02)
+
+    def run_daemon(self, scenario):
+        """Run the daemon on the main thread while `scenario` drives the fake stream"""
+        def drive():
+            try:
+                scenario()
+            finally:
+                signal.pthread_kill(threading.main_thread().ident, signal.SIGTERM)
+
+        driver = threading.Thread(target=drive)
+        driver.start()
+        options = {"state_file": os.path.join(self.workdir.name, "state.json"), "metrics": self.metrics}
+        code = self.module.run_daemon(options, debounce=DEBOUNCE, max_delay=MAX_DELAY,
+                                      reconcile_interval=600, metrics_file="", metrics_port=0,
+                                      events_url=self.server.url)
+        driver.join()
+        self.assertEqual(code, 0)
+
+    def connect(self):
+        """Wait for the listener and the sync its (re)connect triggers"""
+        self.wait_for(lambda: self.server.connections)
+        self.wait_for(lambda: self.incremental(0))
+        time.sleep(DEBOUNCE)
+
+    def test_burst_is_coalesced_after_debounce(self):
+        def scenario():
+            self.connect()
+            started = time.monotonic()
+            for _ in range(10):
+                self.server.send(CONNECTED)
+                time.sleep(0.05)
+            last_event = time.monotonic()
+            time.sleep(DEBOUNCE + 0.5)
+            synced = self.incremental(started)
+            self.assertEqual(len(synced), 1)
+            self.assertGreaterEqual(synced[0], last_event + DEBOUNCE - 0.05)
+
+        self.run_daemon(scenario)
+        self.assertTrue(self.syncs[0][1], "start-up sync should be a full resync")
+
+    def test_steady_stream_syncs_every_max_delay(self):
+        def scenario():
+            self.connect()
+            started = time.monotonic()
+            while time.monotonic() - started < 3.2:
+                self.server.send(CONNECTED)
+                time.sleep(0.1)
+            synced = self.incremental(started)
+            self.assertIn(len(synced), (2, 3, 4))
+            gaps = [b - a for a, b in zip(synced, synced[1:])]
+            self.assertTrue(all(gap >= MAX_DELAY - 0.1 for gap in gaps), gaps)
+
+        self.run_daemon(scenario)
+
+    def test_irrelevant_messages_do_not_sync(self):
+        def scenario():
+            self.connect()
+            started = time.monotonic()
+            for _ in range(5):
+                self.server.send({"meta": {"message": "device:sync"}, "data": [{"state": 1}]})
+                time.sleep(0.05)
+            time.sleep(DEBOUNCE + 0.5)
+            self.assertEqual(self.incremental(started), [])
+
+        self.run_daemon(scenario)
+
+    def test_failed_sync_keeps_the_daemon_running(self):
+        self.failures = 2  # The start-up sync and the one the connect triggers
+
+        def scenario():
+            self.connect()
+            started = time.monotonic()
+            self.server.send(CONNECTED)
+            self.wait_for(lambda: self.incremental(started))
+
+        with self.assertLogs(level="ERROR") as logs:
+            self.run_daemon(scenario)
+        self.assertEqual(sum(record.getMessage() == "Sync failed" for record in logs.records), 2)
+        self.assertEqual(self.metrics.counters[("daemon_exceptions_total", ())], 2)
+        self.assertEqual(self.metrics.counters[("runs_total", (("result", "error"),))], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,93 @@
+"""
+Damper: change damping for hosts whose address keeps moving
+"""
+
+import os
+import tempfile
+import unittest
+
+from homelab_dns import Damper
+
+ZONE = "hq.doofus.co"
+PUBLISHED = {"laptop": {"ip": "10.203.3.50", "mac": "", "last_seen": 0}}
+
+
+def seen(ip: str, source: str = "unifi"):
+    return {"laptop": {"ip": ip, "mac": "", "last_seen": 0, "source": source}}
+
+
+class DamperTest(unittest.TestCase):
+
+    def setUp(self):
+        self.damper = Damper("", observations=3, hold=300, max_hold=3600, flap_window=3600)
+
+    def published_ip(self, ip: str, now: float, source: str = "unifi") -> str:
+        return self.damper.filter(ZONE, seen(ip, source), PUBLISHED, now=now)["laptop"]["ip"]
+
+    def test_new_hosts_are_not_held(self):
+        hosts = {"phone": {"ip": "10.203.3.60", "mac": "", "last_seen": 0}}
+        self.assertEqual(self.damper.filter(ZONE, hosts, PUBLISHED, now=1000), hosts)
+        self.assertEqual(self.damper.held[ZONE], 0)
+
+    def test_change_released_after_enough_observations(self):
+        self.assertEqual(self.published_ip("10.203.3.51", 1000), "10.203.3.50")
+        self.assertEqual(self.damper.held[ZONE], 1)
+        self.assertEqual(self.published_ip("10.203.3.51", 1010), "10.203.3.50")
+        self.assertEqual(self.published_ip("10.203.3.51", 1020), "10.203.3.51")
+        self.assertEqual(self.damper.held[ZONE], 0)
+
+    def test_change_released_after_hold_time(self):
+        self.assertEqual(self.published_ip("10.203.3.51", 1000), "10.203.3.50")
+        self.assertEqual(self.published_ip("10.203.3.51", 1300), "10.203.3.51")
+
+    def test_a_new_candidate_restarts_the_count(self):
+        self.published_ip("10.203.3.51", 1000)
+        self.published_ip("10.203.3.51", 1010)
+        self.assertEqual(self.published_ip("10.203.3.52", 1020), "10.203.3.50")
+        self.assertEqual(self.damper.next_release(), 1020 + 300)
+
+    def test_revert_counts_as_flap_and_doubles_thresholds(self):
+        self.published_ip("10.203.3.51", 1000)
+        self.assertEqual(self.published_ip("10.203.3.50", 1010), "10.203.3.50")  # Reverted
+        self.assertEqual(self.damper.thresholds(1), (6, 600))
+        for now in range(1020, 1070, 10):
+            self.assertEqual(self.published_ip("10.203.3.51", now), "10.203.3.50")
+        self.assertEqual(self.published_ip("10.203.3.51", 1070), "10.203.3.51")  # Sixth sighting
+        self.assertEqual(self.damper.entries[ZONE]["laptop"][3], 2)  # The release itself was recent too
+
+    def test_hold_is_capped(self):
+        self.assertEqual(self.damper.thresholds(10)[1], 3600)
+
+    def test_netbox_and_static_records_are_not_held(self):
+        self.assertEqual(self.published_ip("10.203.3.51", 1000, source="netbox"), "10.203.3.51")
+        self.assertIsNone(self.damper.next_release())
+
+    def test_next_release_by_zone(self):
+        self.published_ip("10.203.3.51", 1000)
+        self.damper.filter("lab.doofus.co", seen("10.203.4.51"),
+                           {"laptop": {"ip": "10.203.4.50", "mac": "", "last_seen": 0}}, now=1100)
+        self.assertEqual(self.damper.next_release(), 1300)
+        self.assertEqual(self.damper.next_release(["lab.doofus.co"]), 1400)
+        self.assertIsNone(self.damper.next_release(["other.doofus.co"]))
+
+    def test_host_leaving_drops_its_candidate(self):
+        self.published_ip("10.203.3.51", 1000)
+        self.damper.filter(ZONE, {}, PUBLISHED, now=1010)
+        self.assertIsNone(self.damper.next_release())
+
+    def test_state_round_trip(self):
+        with tempfile.TemporaryDirectory() as workdir:
+            path = os.path.join(workdir, "damping.json")
+            self.damper.path = path
+            self.published_ip("10.203.3.51", 1000)
+            self.damper.save()
+            loaded = Damper.load(path, observations=3, hold=300)
+            self.assertEqual(loaded.entries, self.damper.entries)
+
+            with open(path, "w") as f:
+                f.write("[]")
+            self.assertEqual(Damper.load(path).entries, {})
+
+
+if __name__ == "__main__":
+    unittest.main()
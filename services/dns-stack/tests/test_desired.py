@@ -0,0 +1,77 @@
+"""
+Desired-state compiler: source precedence and static records
+"""
+
+import json
+import os
+import tempfile
+import unittest
+
+from homelab_dns import compile_zone, load_static_records
+
+
+def host(ip: str):
+    return {"ip": ip, "mac": "", "last_seen": 0}
+
+
+class CompileZoneTest(unittest.TestCase):
+
+    def test_first_source_wins_with_its_ttl(self):
+        hosts, overridden = compile_zone({
+            "static": {"NAS": host("10.203.3.10")},
+            "netbox": {"nas": host("10.203.3.11"), "printer": host("10.203.3.20")},
+            "unifi": {"nas": host("10.203.3.12"), "laptop": host("10.203.3.50")},
+        })
+        self.assertEqual({name: (h["ip"], h["ttl"], h["source"]) for name, h in hosts.items()}, {
+            "nas": ("10.203.3.10", 3600, "static"),
+            "printer": ("10.203.3.20", 3600, "netbox"),
+            "laptop": ("10.203.3.50", 300, "unifi"),
+        })
+        self.assertEqual(overridden, 1)  # nas, however many sources lost it
+
+    def test_agreeing_sources_are_not_overrides(self):
+        _, overridden = compile_zone({"netbox": {"nas": host("10.203.3.10")},
+                                      "unifi": {"nas": host("10.203.3.10")}},
+                                     ttls={"static": 3600, "netbox": 300, "unifi": 300})
+        self.assertEqual(overridden, 0)
+
+
+class StaticRecordsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.workdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.workdir.name, "static-records.json")
+
+    def tearDown(self):
+        self.workdir.cleanup()
+
+    def test_valid_entries_are_lowercased(self):
+        records = load_static_records(self.write({"HQ.Doofus.co": {"NAS": "10.203.3.10", "v6": "fd00::10"}}))
+        self.assertEqual({zone: {name: h["ip"] for name, h in hosts.items()} for zone, hosts in records.items()},
+                         {"hq.doofus.co": {"nas": "10.203.3.10", "v6": "fd00::10"}})
+
+    def test_invalid_entries_are_dropped(self):
+        with self.assertLogs("homelab_dns.desired", "ERROR"):
+            records = load_static_records(self.write({"hq.doofus.co": {"nas": "10.203.3.10", "bad": "nas",
+                                                                       "num": 5}, "lab.doofus.co": ["x"]}))
+        self.assertEqual(list(records), ["hq.doofus.co"])
+        self.assertEqual(list(records["hq.doofus.co"]), ["nas"])
+
+    def test_unusable_file_is_none_and_missing_file_is_empty(self):
+        with self.assertLogs("homelab_dns.desired", "ERROR"):
+            self.assertIsNone(load_static_records(self.write(["10.203.3.10"])))
+        with open(self.path, "w") as f:
+            f.write("{not json")
+        with self.assertLogs("homelab_dns.desired", "ERROR"):
+            self.assertIsNone(load_static_records(self.path))
+        self.assertEqual(load_static_records(os.path.join(self.workdir.name, "missing.json")), {})
+        self.assertEqual(load_static_records(""), {})
+
+    def write(self, data) -> str:
+        with open(self.path, "w") as f:
+            json.dump(data, f)
+        return self.path
+
+
+if __name__ == "__main__":
+    unittest.main()
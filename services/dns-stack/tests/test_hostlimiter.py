@@ -0,0 +1,101 @@
+"""
+HostLimiter: per-host rate limit, adaptive concurrency and circuit breaker
+"""
+
+import threading
+import time
+import unittest
+
+from homelab_dns import CircuitOpenError, HostLimiter
+
+
+class HostLimiterTest(unittest.TestCase):
+
+    def run_requests(self, limiter: HostLimiter, count: int, duration: float = 0.02) -> int:
+        """Fire `count` concurrent requests; returns the peak number in flight"""
+        lock = threading.Lock()
+        in_flight = peak = 0
+
+        def request():
+            nonlocal in_flight, peak
+            limiter.acquire()
+            with lock:
+                in_flight += 1
+                peak = max(peak, in_flight)
+            time.sleep(duration)
+            with lock:
+                in_flight -= 1
+            limiter.release(True, duration)
+
+        threads = [threading.Thread(target=request) for _ in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return peak
+
+    def test_concurrency_limit_holds(self):
+        limiter = HostLimiter("dns", max_concurrency=3, rate=0)
+        self.assertLessEqual(self.run_requests(limiter, 12), 3)
+
+    def test_concurrency_limit_holds_while_rate_limited(self):
+        # Threads waiting for a token must not slip past the concurrency check
+        limiter = HostLimiter("dns", max_concurrency=2, rate=20, burst=1)
+        self.assertLessEqual(self.run_requests(limiter, 8, duration=0.2), 2)
+
+    def test_rate_limit_paces_requests(self):
+        limiter = HostLimiter("dns", max_concurrency=10, rate=50, burst=1)
+        started = time.monotonic()
+        self.run_requests(limiter, 6, duration=0)
+        # The first request uses the burst token, the other five wait 1/50s each
+        self.assertGreaterEqual(time.monotonic() - started, 5 / 50 * 0.9)
+
+    def test_slow_responses_halve_the_limit(self):
+        limiter = HostLimiter("dns", max_concurrency=8, rate=0, latency_target=0.5)
+        limiter.acquire()
+        limiter.release(True, elapsed=2.0)
+        self.assertEqual(limiter.limit, 4)
+        limiter.acquire()
+        limiter.release(False, elapsed=0.1)  # Within one latency target of the last decrease
+        self.assertEqual(limiter.limit, 4)
+
+    def test_fast_responses_raise_the_limit_up_to_the_maximum(self):
+        limiter = HostLimiter("dns", max_concurrency=4, rate=0)
+        limiter.limit = 2.0
+        for _ in range(20):
+            limiter.acquire()
+            limiter.release(True, elapsed=0.01)
+        self.assertEqual(limiter.limit, 4)
+
+    def test_breaker_opens_and_a_probe_closes_it(self):
+        limiter = HostLimiter("dns", max_concurrency=4, rate=0, failure_threshold=3, cooldown=0.1)
+        tripped = []
+        for _ in range(3):
+            limiter.acquire()
+            tripped.append(limiter.release(False, elapsed=0.01))
+        self.assertEqual(tripped, [False, False, True])
+        self.assertTrue(limiter.is_open)
+        with self.assertRaises(CircuitOpenError):
+            limiter.acquire()
+
+        time.sleep(0.15)
+        _, probe = limiter.acquire()
+        self.assertTrue(probe)
+        with self.assertRaises(CircuitOpenError):
+            limiter.acquire()  # Only one probe at a time
+        limiter.release(True, elapsed=0.01, probe=probe)
+        self.assertFalse(limiter.is_open)
+        self.assertFalse(limiter.acquire()[1])
+
+    def test_failed_probe_reopens_the_circuit(self):
+        limiter = HostLimiter("dns", max_concurrency=4, rate=0, failure_threshold=1, cooldown=0.05)
+        limiter.acquire()
+        limiter.release(False, elapsed=0.01)
+        time.sleep(0.08)
+        _, probe = limiter.acquire()
+        limiter.release(False, elapsed=0.01, probe=probe)
+        self.assertTrue(limiter.is_open)
+
+
+if __name__ == "__main__":
+    unittest.main()
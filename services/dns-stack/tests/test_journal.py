@@ -0,0 +1,117 @@
+"""
+Resume journals: StepJournal (setup-dns-ipam.py) and PlanJournal, the
+write-ahead log of unifi-dns-sync.py
+"""
+
+import json
+import os
+import tempfile
+import time
+import unittest
+
+from homelab_dns import Change, PlanJournal, StepJournal, step_key
+
+
+class StepKeyTest(unittest.TestCase):
+
+    def test_key_depends_on_input_not_key_order(self):
+        key = step_key("dns-import", "hq.doofus.co nas", {"ip": "10.203.3.10", "ttl": 3600})
+        self.assertEqual(key, step_key("dns-import", "hq.doofus.co nas", {"ttl": 3600, "ip": "10.203.3.10"}))
+        self.assertNotEqual(key, step_key("dns-import", "hq.doofus.co nas", {"ip": "10.203.3.11", "ttl": 3600}))
+        self.assertTrue(key.startswith("dns-import hq.doofus.co nas "))
+
+
+class StepJournalTest(unittest.TestCase):
+
+    def setUp(self):
+        self.workdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.workdir.name, "setup", "journal.jsonl")
+
+    def tearDown(self):
+        self.workdir.cleanup()
+
+    def test_marks_survive_a_restart(self):
+        journal = StepJournal(self.path)
+        journal.mark("a")
+        journal.mark("b", "c")
+        self.assertTrue(journal.done("b"))
+        resumed = StepJournal(self.path)
+        self.assertEqual(resumed.completed, {"a", "b", "c"})
+        self.assertFalse(resumed.done("d"))
+
+    def test_torn_final_write_is_ignored(self):
+        StepJournal(self.path).mark("a", "b")
+        with open(self.path, "a") as f:
+            f.write('{"step": "c", "at"')
+        self.assertEqual(StepJournal(self.path).completed, {"a", "b"})
+
+    def test_stale_journal_is_discarded(self):
+        StepJournal(self.path).mark("a")
+        old = time.time() - 3600
+        os.utime(self.path, (old, old))
+        self.assertEqual(StepJournal(self.path, max_age=60).completed, set())
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_remove(self):
+        journal = StepJournal(self.path)
+        journal.mark("a")
+        journal.remove()
+        journal.remove()  # Already gone
+        self.assertEqual(StepJournal(self.path).completed, set())
+
+    def test_no_path_keeps_marks_in_memory(self):
+        journal = StepJournal("")
+        journal.mark("a")
+        self.assertTrue(journal.done("a"))
+
+
+class PlanJournalTest(unittest.TestCase):
+
+    def setUp(self):
+        self.workdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.workdir.name, "state.journal")
+        self.plan = [Change("add", "nas", "10.203.3.10"),
+                     Change("update", "printer", "10.203.3.21", "10.203.3.20"),
+                     Change("delete", "old", "10.203.3.30")]
+        self.hosts = {"nas": {"ip": "10.203.3.10", "mac": "", "last_seen": 1}}
+
+    def tearDown(self):
+        self.workdir.cleanup()
+
+    def test_resume_applies_only_unmarked_changes(self):
+        journal = PlanJournal.write(self.path, "hq.doofus.co", self.plan, self.hosts, ["old"], True)
+        journal.mark(0, True)
+        journal.mark(2, False)
+        journal.file.close()  # Simulate the process dying without remove()
+
+        resumed = PlanJournal.load(self.path)
+        self.assertEqual(resumed.zone, "hq.doofus.co")
+        self.assertEqual(resumed.plan, self.plan)
+        self.assertEqual(resumed.hosts, self.hosts)
+        self.assertEqual(resumed.forget, ["old"])
+        self.assertTrue(resumed.full)
+        self.assertEqual(resumed.done, {0: True, 2: False})
+        self.assertEqual(resumed.pending(), [1])
+
+    def test_torn_mark_is_ignored(self):
+        journal = PlanJournal.write(self.path, "hq.doofus.co", self.plan, self.hosts, [], False)
+        journal.mark(1, True)
+        journal.file.write('{"done": 2')
+        journal.file.close()
+        self.assertEqual(PlanJournal.load(self.path).pending(), [0, 2])
+
+    def test_missing_or_unsupported_journal(self):
+        self.assertIsNone(PlanJournal.load(self.path))
+        with open(self.path, "w") as f:
+            f.write(json.dumps({"journal": 99, "zone": "hq.doofus.co"}) + "\n")
+        self.assertIsNone(PlanJournal.load(self.path))
+
+    def test_remove(self):
+        journal = PlanJournal.write(self.path, "hq.doofus.co", self.plan, self.hosts, [], False)
+        journal.mark(0, True)
+        journal.remove()
+        self.assertFalse(os.path.exists(self.path))
+
+
+if __name__ == "__main__":
+    unittest.main()
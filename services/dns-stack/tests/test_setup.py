@@ -0,0 +1,54 @@
+"""
+setup-dns-ipam.py's provisioning pipeline against the fake backends
+"""
+
+import asyncio
+import gc
+import os
+import tempfile
+import unittest
+
+from support import load_script
+
+from fakes import FakeBackend, FakeServer
+
+ZONE = "hq.doofus.co"
+
+
+class ProvisionFailureTest(unittest.TestCase):
+
+    def setUp(self):
+        self.module = load_script("setup-dns-ipam.py")
+        self.workdir = tempfile.TemporaryDirectory()
+        self.backend = FakeBackend(error_rate=0.0)
+        self.backend.reset(200)
+        self.server = FakeServer(self.backend).__enter__()
+        self.addCleanup(self.server.__exit__, None, None, None)
+        module = self.module
+        module.UNIFI_URL = module.NETBOX_URL = module.DNS_URL = self.server.url
+        module.DNS_ZONE = ZONE
+        module.SITES = [{"unifi_site": "default", "name": "Test", "slug": "test", "zone": ZONE,
+                         "prefixes": ["10.203.0.0/16"]}]
+        module.HTTP_BACKOFF = 0
+        module.NETBOX_BULK_CHUNK_SIZE = module.DNS_BULK_BATCH_SIZE = 20
+        module.SETUP_JOURNAL = os.path.join(self.workdir.name, "journal.jsonl")
+        module.TOKEN_CACHE_FILE = os.path.join(self.workdir.name, "tokens.json")
+
+    def tearDown(self):
+        self.workdir.cleanup()
+
+    def test_setup_error_stops_writes_in_flight(self):
+        async def broken_setup(dns, zones):
+            await asyncio.sleep(0.2)  # Netbox writes are under way by now
+            raise self.module.SetupError("DNS setup failed")
+
+        self.module.setup_dns = broken_setup
+        with self.assertNoLogs("asyncio"):
+            with self.assertRaises(SystemExit) as exit:
+                self.module.main()
+            gc.collect()  # Unretrieved task exceptions are reported on collection
+        self.assertEqual(exit.exception.code, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
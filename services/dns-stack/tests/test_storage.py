@@ -0,0 +1,76 @@
+"""
+Atomic writes and the unifi-dns-sync state cache built on them
+"""
+
+import json
+import os
+import stat
+import tempfile
+import unittest
+
+from homelab_dns import atomic_write, atomic_write_json, load_state, save_state, zone_hash
+
+
+class AtomicWriteTest(unittest.TestCase):
+
+    def setUp(self):
+        self.workdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.workdir.name, "cache", "state.json")
+
+    def tearDown(self):
+        self.workdir.cleanup()
+
+    def test_creates_directory_and_replaces_file(self):
+        atomic_write_json(self.path, {"a": 1})
+        atomic_write_json(self.path, {"a": 2}, fsync=True)
+        with open(self.path) as f:
+            self.assertEqual(json.load(f), {"a": 2})
+        self.assertEqual(stat.S_IMODE(os.stat(self.path).st_mode), 0o600)
+        self.assertEqual(os.listdir(os.path.dirname(self.path)), ["state.json"])
+
+    def test_mode(self):
+        atomic_write(self.path, "metric 1\n", mode=0o644)
+        self.assertEqual(stat.S_IMODE(os.stat(self.path).st_mode), 0o644)
+
+    def test_failed_write_keeps_the_old_file(self):
+        atomic_write_json(self.path, {"a": 1})
+        with self.assertRaises(TypeError):
+            atomic_write_json(self.path, {"a": object()})
+        with open(self.path) as f:
+            self.assertEqual(json.load(f), {"a": 1})
+        self.assertEqual(os.listdir(os.path.dirname(self.path)), ["state.json"])
+
+    def test_unwritable_directory_raises_oserror(self):
+        with self.assertRaises(OSError):
+            atomic_write("/proc/homelab-dns-test/state.json", "{}")
+
+
+class StateCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.workdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.workdir.name, "state.json")
+
+    def tearDown(self):
+        self.workdir.cleanup()
+
+    def test_round_trip_keeps_failed_and_forgets_removed(self):
+        previous = {"clients": {"old": {"ip": "10.203.3.9"}, "nas": {"ip": "10.203.3.10"}}}
+        hosts = {"nas": {"ip": "10.203.3.11"}, "new": {"ip": "10.203.3.12"}}
+        save_state(self.path, previous, hosts, failed=["nas"], removed=["old"], zone="hq.doofus.co", full=True)
+        state = load_state(self.path, "hq.doofus.co")
+        self.assertEqual(state["clients"], {"nas": {"ip": "10.203.3.10"}, "new": {"ip": "10.203.3.12"}})
+        self.assertEqual(state["zone_hash"], zone_hash({"nas": "10.203.3.10", "new": "10.203.3.12"}))
+        self.assertGreater(state["last_full_sync"], 0)
+
+    def test_other_zone_or_unreadable_state_is_ignored(self):
+        save_state(self.path, {}, {}, [], [], zone="hq.doofus.co")
+        self.assertIsNone(load_state(self.path, "lab.doofus.co"))
+        with open(self.path, "w") as f:
+            f.write("[]")
+        self.assertIsNone(load_state(self.path, "hq.doofus.co"))
+        self.assertIsNone(load_state(os.path.join(self.workdir.name, "missing.json"), "hq.doofus.co"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,47 @@
+"""
+iter_json_items: the streaming parser behind large UniFi and Netbox responses
+"""
+
+import json
+import unittest
+
+from homelab_dns import iter_json_items
+
+
+def chunked(text: str, size: int):
+    data = text.encode()
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+class IterJsonItemsTest(unittest.TestCase):
+
+    DOCUMENT = {
+        "meta": {"rc": "ok"},
+        "data": [{"hostname": "nas", "ip": "10.203.3.10"}, 12345678, -1.5e3, "héllo ✓", None, [1, [2]]],
+        "count": 6,
+    }
+
+    def test_every_chunk_size_yields_the_same_items(self):
+        text = json.dumps(self.DOCUMENT, ensure_ascii=False)
+        for size in (1, 2, 3, 7, 64, len(text.encode())):
+            header = {}
+            items = list(iter_json_items(chunked(text, size), "data", header))
+            self.assertEqual(items, self.DOCUMENT["data"], f"chunk size {size}")
+            self.assertEqual(header, {"meta": {"rc": "ok"}, "count": 6})
+
+    def test_numbers_split_across_chunks(self):
+        chunks = [b'{"data": [12', b'34, 5', b'.25', b"e2]}"]
+        self.assertEqual(list(iter_json_items(chunks, "data")), [1234, 525.0])
+
+    def test_missing_key_and_empty_array(self):
+        self.assertEqual(list(iter_json_items([b'{"meta": {}}'], "data")), [])
+        self.assertEqual(list(iter_json_items([b'{"data": [ ]}'], "data")), [])
+
+    def test_truncated_or_malformed_json_raises(self):
+        for chunks in ([b'{"data": [1, 2'], [b'{"data": [{"a": 1'], [b'[1, 2]'], [b""]):
+            with self.assertRaises(ValueError, msg=chunks):
+                list(iter_json_items(chunks, "data"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,94 @@
+"""
+ZoneIndex: the two-way name/address index behind the sync's diff
+"""
+
+import unittest
+
+from homelab_dns import ZoneIndex, pack_ip, unpack_ip
+
+
+class PackIpTest(unittest.TestCase):
+
+    def test_round_trip(self):
+        for ip in ("0.0.0.0", "10.203.3.10", "255.255.255.255", "::", "::1", "fd00:203::10"):
+            self.assertEqual(unpack_ip(pack_ip(ip)), ip)
+
+    def test_ipv6_sorts_above_ipv4(self):
+        self.assertGreater(pack_ip("::"), pack_ip("255.255.255.255"))
+
+    def test_invalid(self):
+        for ip in ("", "10.0.0", "host", "10.0.0.256"):
+            with self.assertRaises(ValueError, msg=ip):
+                pack_ip(ip)
+
+
+class ZoneIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.zone = ZoneIndex([
+            {"name": "NAS", "ip": "10.203.3.10", "ttl": 300, "owned": True},
+            {"name": "printer", "ip": "10.203.3.20", "ttl": 300},
+            {"name": "router", "ip": "10.203.3.1", "ttl": 300, "owned": True},
+            {"name": "router", "ip": "10.203.4.1", "ttl": 300, "owned": True},
+            {"name": "router-alias", "ip": "10.203.3.1", "ttl": 3600},
+        ])
+
+    def test_lookups_both_ways(self):
+        self.assertEqual(len(self.zone), 5)
+        self.assertEqual(self.zone.addresses("nas"), ("10.203.3.10",))
+        self.assertEqual(self.zone.addresses("router"), ("10.203.3.1", "10.203.4.1"))
+        self.assertEqual(self.zone.names("10.203.3.1"), ("router", "router-alias"))
+        self.assertEqual(self.zone.addresses("missing"), ())
+        self.assertEqual(self.zone.names("10.203.9.9"), ())
+        self.assertEqual(self.zone.names("not-an-ip"), ())
+
+    def test_names_are_case_insensitive(self):
+        self.assertIn("Nas", self.zone)
+        self.assertTrue(self.zone.has("nas", "10.203.3.10"))
+        self.assertEqual(sorted(self.zone), ["nas", "printer", "router", "router-alias"])
+
+    def test_owner_tag_is_per_record(self):
+        self.assertTrue(self.zone.owned("nas", "10.203.3.10"))
+        self.assertFalse(self.zone.owned("printer", "10.203.3.20"))
+        self.assertTrue(self.zone.has("printer", "10.203.3.20"))
+        # Seen again with the tag, e.g. from a second listing
+        self.zone.add("printer", "10.203.3.20", owned=True)
+        self.assertTrue(self.zone.owned("printer", "10.203.3.20"))
+        self.assertEqual(len(self.zone), 5)
+
+    def test_ttls(self):
+        self.assertEqual(self.zone.ttl("nas"), 300)
+        self.assertEqual(self.zone.ttl("router-alias"), 3600)
+        self.assertIsNone(self.zone.ttl("missing"))
+        self.zone.add("router-alias", "10.203.3.1", ttl=300)
+        self.assertEqual(self.zone.ttl("router-alias"), 300)
+
+    def test_discard(self):
+        self.zone.discard("router", "10.203.3.1")
+        self.assertEqual(self.zone.addresses("router"), ("10.203.4.1",))
+        self.assertEqual(self.zone.names("10.203.3.1"), ("router-alias",))
+        self.assertTrue(self.zone.owned("router", "10.203.4.1"))
+        self.zone.discard("router", "10.203.4.1")
+        self.assertNotIn("router", self.zone)
+        self.zone.discard("router", "10.203.4.1")  # Already gone
+        self.assertEqual(len(self.zone), 3)
+
+    def test_invalid_addresses_are_skipped(self):
+        self.assertFalse(self.zone.add("bad", "not-an-ip"))
+        self.assertFalse(self.zone.add("bad", None))
+        self.assertNotIn("bad", self.zone)
+        self.assertFalse(self.zone.has("nas", "not-an-ip"))
+
+    def test_items_and_ipv6(self):
+        self.zone.add("nas", "fd00:203::10")
+        self.assertEqual(self.zone.addresses("nas"), ("10.203.3.10", "fd00:203::10"))
+        self.assertIn(("nas", "fd00:203::10"), set(self.zone.items()))
+        self.assertEqual(len(list(self.zone.items())), len(self.zone))
+
+    def test_ptr_listing_indexes_by_target(self):
+        pointers = ZoneIndex([{"target": "nas.hq.doofus.co", "ip": "10.203.3.10", "owned": True}])
+        self.assertEqual(pointers.names("10.203.3.10"), ("nas.hq.doofus.co",))
+
+
+if __name__ == "__main__":
+    unittest.main()
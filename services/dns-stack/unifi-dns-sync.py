@@ -3,30 +3,65 @@
 UniFi to Technitium DNS Sync
 
 Pulls client data from UniFi Controller and updates DNS A records.
-Designed to run on a schedule via systemd timer.
+Designed to run on a schedule via systemd timer, or as a long-running
+daemon that reacts to UniFi client events. Netbox and static records can
+be merged in with explicit precedence, making this the zone's only writer.
 
 Usage:
-    ./unifi-dns-sync.py              # Normal sync
-    ./unifi-dns-sync.py --dry-run    # Preview changes without applying
-    ./unifi-dns-sync.py --verbose    # Verbose output
+    ./unifi-dns-sync.py                # Normal sync
+    ./unifi-dns-sync.py --dry-run      # Preview changes without applying
+    ./unifi-dns-sync.py --verbose      # Verbose output
+    ./unifi-dns-sync.py --workers 8    # Push up to 8 record changes at once
+    ./unifi-dns-sync.py --bulk         # Push adds/updates as zone file imports
+    ./unifi-dns-sync.py --full-resync  # Ignore the state cache and diff the whole zone
+    ./unifi-dns-sync.py --dry-run --plan-file plan.jsonl  # Save the previewed changes
+    ./unifi-dns-sync.py --apply-plan plan.jsonl           # Apply exactly those changes
+    ./unifi-dns-sync.py --damping-file ""  # Push address changes without damping
+    ./unifi-dns-sync.py --daemon       # Sync on UniFi events (needs websocket-client)
+
+Each run writes Prometheus metrics (phase timings, per-endpoint request
+counts and latency) to METRICS_FILE for the node_exporter textfile
+collector; the daemon also serves them on http://<host>:METRICS_PORT/metrics.
 """
 
 import sys
+import os
+import ssl
 import json
 import re
+import time
+import signal
 import argparse
 import logging
+import threading
+import bisect
+import ipaddress
+import itertools
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import Dict, List, Optional, Tuple
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
 
 try:
     import requests
-    import urllib3
-    urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 except ImportError:
     print("ERROR: requests library required. Install with: pip3 install requests")
     sys.exit(1)
 
+from homelab_dns import (Change, ClientRecord, Damper, DynamicUpdater, Metrics, NetboxClient, PlanJournal,
+                         RecordUpdate, TechnitiumDNS, UnifiClient, ZoneIndex, compile_zone, journal_file,
+                         load_state, load_static_records, make_session, netbox_hosts, reverse_name,
+                         save_state, zone_hash, zone_state_file)
+from homelab_dns.desired import SOURCE_PRECEDENCE, SOURCE_TTLS
+from homelab_dns.tokens import TOKEN_MAX_AGE
+from homelab_dns.transport import (BREAKER_COOLDOWN, BREAKER_FAILURES, HTTP_BACKOFF, HTTP_POOL_SIZE,
+                                   HTTP_RATE_LIMIT, HTTP_RETRIES)
+
+try:
+    import websocket  # websocket-client, only needed for --daemon
+except ImportError:
+    websocket = None
+
 # =============================================================================
 # Configuration - Update these values for your environment
 # =============================================================================
@@ -40,8 +75,91 @@ DNS_PASS = "2262-EatonGate"
 DNS_ZONE = "hq.doofus.co"
 DNS_TTL = 300  # 5 minutes - short TTL for dynamic clients
 
-# Only sync clients from these networks (empty = all networks)
-ALLOWED_NETWORKS = ["10.203."]
+# Only sync clients from these networks (CIDR, empty = all networks)
+ALLOWED_NETWORKS = ["10.203.0.0/16"]
+
+# Never sync clients from these networks, even inside ALLOWED_NETWORKS
+DENIED_NETWORKS = []
+
+# UniFi site -> DNS zone mappings. A client is published in the first
+# mapping for its site whose networks contain its IP (empty = any network).
+# Several sites can feed one zone, and one site can be split across zones.
+SITE_MAPPINGS = [
+    {"site": "default", "zone": DNS_ZONE, "networks": ALLOWED_NETWORKS},
+]
+SITE_WORKERS = 4  # UniFi sites fetched concurrently
+
+# Record sources merged into each zone, by homelab_dns.desired's
+# SOURCE_PRECEDENCE (static > netbox > unifi) and SOURCE_TTLS, so this sync
+# is the zone's only writer; UniFi records get DNS_TTL. The netbox-dns-sync
+# role leaves its Netbox -> DNS timer off (sync_enable_timer: false) for that
+# reason; turn it back on only with NETBOX_URL = "", or the two will fight.
+STATIC_RECORDS_FILE = "/etc/unifi-dns-sync/static-records.json"  # {zone: {hostname: ip}} ("" = none)
+NETBOX_URL = "http://10.203.3.202:8080"  # Netbox IPAM to merge names from ("" = UniFi and static records only)
+NETBOX_TOKEN = ""  # Read-only API token, required while NETBOX_URL is set
+NETBOX_STATUSES = []  # Only merge IPs with these statuses (empty = all)
+
+# Reverse zones: every synced host whose IP falls in one of these also gets
+# a PTR record (empty = A records only). The zones must already exist;
+# setup-dns-ipam.py creates them.
+PTR_ZONES = ["203.10.in-addr.arpa"]
+
+# Concurrent DNS writes during sync (1 = one record at a time)
+SYNC_WORKERS = 4
+
+# Records per zone file import in --bulk mode
+BULK_BATCH_SIZE = 500
+
+# RFC 2136 dynamic updates - writes to these zones (forward or reverse) go out
+# as TSIG-signed UPDATE messages over one TCP connection, falling back to the
+# HTTP API for anything that fails. Needs dnspython (pip3 install dnspython)
+# and a TSIG key allowed to update the zones in Technitium.
+DYNAMIC_UPDATE_ZONES = []  # e.g. [DNS_ZONE, "203.10.in-addr.arpa"]
+DYNAMIC_UPDATE_SERVER = "10.203.3.203"
+DYNAMIC_UPDATE_PORT = 53
+TSIG_KEY_NAME = "unifi-dns-sync"
+TSIG_SECRET = ""  # Base64 key secret ("" = HTTP API only)
+TSIG_ALGORITHM = "hmac-sha256"
+
+# State cache - lets runs with no client changes skip the zone entirely
+STATE_FILE = "/var/lib/unifi-dns-sync/state.json"
+FULL_RESYNC_INTERVAL = 6 * 3600  # Compare against the full zone at least this often
+
+# Write-ahead journal - planned changes are logged before they are applied,
+# so an interrupted run is resumed instead of redone
+JOURNAL_MAX_AGE = FULL_RESYNC_INTERVAL  # Older interrupted runs are redone from scratch
+
+# Change damping - a known host's new address is only pushed once it has
+# persisted; the thresholds are in homelab_dns/damping.py
+DAMPING_FILE = "/var/lib/unifi-dns-sync/damping.json"  # "" = push every change at once
+
+# Session token cache - reused across runs instead of logging in every time
+TOKEN_CACHE_FILE = "/var/lib/unifi-dns-sync/tokens.json"  # Written 0600 ("" = disabled)
+
+# Stale record cleanup - records this sync wrote carry OWNER_TAG as their
+# comment (or are in the state cache); only those are ever deleted
+OWNER_TAG = "managed-by:unifi-dns-sync"
+GC_GRACE_PERIOD = 72 * 3600  # Delete hosts not seen by UniFi for this long
+GC_BATCH_SIZE = 200          # Max deletions per run
+
+# Daemon mode - UniFi event stream plus a periodic full resync
+UNIFI_EVENTS_PATH = "/proxy/network/wss/s/{site}/events?clients=v2"
+UNIFI_EVENTS_URL = ""  # Websocket base for the event stream, e.g. "ws://127.0.0.1:8765" ("" = from UNIFI_URL)
+DAEMON_DEBOUNCE = 3              # Seconds of quiet before syncing a burst of events
+DAEMON_MAX_DELAY = 15            # Never hold pending events longer than this
+DAEMON_RECONCILE_INTERVAL = 900  # Full resync safety net (seconds)
+DAEMON_RELEASE_BACKOFF = 60      # First retry of held changes in a zone a sync skipped; doubles
+
+# UniFi events that mean a client appeared or moved
+CLIENT_EVENT_SUFFIXES = ("_Connected", "_Reconnected", "_Roam", "_RoamRadio")
+
+# Pool size, retries, rate limit, circuit breaker and token lifetime defaults
+# live in homelab_dns (transport.py, tokens.py); see --pool-size/--retries/--backoff
+
+# Prometheus metrics
+METRICS_NAMESPACE = "unifi_dns_sync"
+METRICS_FILE = "/var/lib/prometheus/node-exporter/unifi_dns_sync.prom"  # Textfile collector dir
+METRICS_PORT = 9687  # Daemon mode /metrics endpoint (0 = disabled)
 
 # Skip these hostnames (case-insensitive patterns)
 SKIP_PATTERNS = [
@@ -54,266 +172,1234 @@ SKIP_PATTERNS = [
 # Classes
 # =============================================================================
 
-class UnifiClient:
-    """Client for UniFi Controller API"""
+class SiteMapping(NamedTuple):
+    """Publish clients of a UniFi site in `networks` to a DNS zone"""
+    site: str
+    zone: str
+    networks: Tuple[str, ...]
 
-    def __init__(self, base_url: str, api_key: str):
-        self.base_url = base_url.rstrip('/')
-        self.headers = {
-            "X-API-KEY": api_key,
-            "Accept": "application/json",
-        }
 
-    def get_clients(self) -> List[Dict]:
-        """Get all active clients from UniFi"""
-        try:
-            response = requests.get(
-                f"{self.base_url}/proxy/network/api/s/default/stat/sta",
-                headers=self.headers,
-                verify=False,
-                timeout=15
-            )
-            if response.status_code == 200:
-                return response.json().get("data", [])
-            else:
-                logging.error(f"UniFi API error: {response.status_code}")
-                return []
-        except Exception as e:
-            logging.error(f"UniFi connection error: {e}")
-            return []
-
-
-class TechnitiumDNS:
-    """Client for Technitium DNS API"""
+# =============================================================================
+# Helper Functions
+# =============================================================================
 
-    def __init__(self, base_url: str, username: str, password: str):
-        self.base_url = base_url.rstrip('/')
-        self.username = username
-        self.password = password
-        self.token = None
+def new_metrics() -> Metrics:
+    """Metrics registry for this script, with HELP text for its own series"""
+    return Metrics(METRICS_NAMESPACE, help={
+        "hosts": "Hosts published by the last run",
+        "source_hosts": "Hosts each source proposed in the last run, before precedence",
+        "overridden": "Hostnames where a lower-precedence source lost to a higher one",
+        "damped": "Address changes held back by damping in the last run",
+        "flapping": "Hosts whose damping hold is backed off for flapping",
+        "conflicts": "Hosts whose address is also published under a hand-managed name",
+        "daemon_exceptions_total": "Daemon syncs aborted by an unexpected exception",
+    })
 
-    def login(self) -> bool:
-        """Authenticate and get session token"""
-        try:
-            response = requests.get(
-                f"{self.base_url}/api/user/login",
-                params={"user": self.username, "pass": self.password},
-                timeout=10
-            )
-            data = response.json()
-            if data.get("status") == "ok":
-                self.token = data.get("token")
-                return True
-            logging.error(f"DNS login failed: {data.get('errorMessage')}")
-            return False
-        except Exception as e:
-            logging.error(f"DNS connection error: {e}")
-            return False
-
-    def get_records(self, zone: str) -> Dict[str, str]:
-        """Get all A records in zone as {hostname: ip}"""
-        if not self.token:
-            return {}
-        try:
-            response = requests.get(
-                f"{self.base_url}/api/zones/records/get",
-                params={"token": self.token, "zone": zone, "listZone": "true"},
-                timeout=10
-            )
-            data = response.json()
-            records = {}
-            if data.get("status") == "ok":
-                for record in data.get("response", {}).get("records", []):
-                    if record.get("type") == "A":
-                        # Extract hostname from FQDN
-                        name = record.get("name", "")
-                        if name.endswith(f".{zone}"):
-                            name = name[:-len(f".{zone}")]
-                        elif name == zone:
-                            name = "@"
-                        ip = record.get("rData", {}).get("ipAddress", "")
-                        if name and ip:
-                            records[name.lower()] = ip
-            return records
-        except Exception as e:
-            logging.error(f"Error fetching DNS records: {e}")
-            return {}
-
-    def add_or_update_record(self, zone: str, hostname: str, ip: str, ttl: int = 300) -> bool:
-        """Add or update an A record"""
-        if not self.token:
-            return False
-
-        fqdn = f"{hostname}.{zone}"
-        try:
-            response = requests.get(
-                f"{self.base_url}/api/zones/records/add",
-                params={
-                    "token": self.token,
-                    "zone": zone,
-                    "domain": fqdn,
-                    "type": "A",
-                    "ipAddress": ip,
-                    "ttl": ttl,
-                    "overwrite": "true"
-                },
-                timeout=10
-            )
-            data = response.json()
-            return data.get("status") == "ok"
-        except Exception as e:
-            logging.error(f"Error adding record {hostname}: {e}")
-            return False
-
-    def delete_record(self, zone: str, hostname: str, ip: str) -> bool:
-        """Delete an A record"""
-        if not self.token:
-            return False
-
-        fqdn = f"{hostname}.{zone}"
-        try:
-            response = requests.get(
-                f"{self.base_url}/api/zones/records/delete",
-                params={
-                    "token": self.token,
-                    "zone": zone,
-                    "domain": fqdn,
-                    "type": "A",
-                    "ipAddress": ip
-                },
-                timeout=10
-            )
-            data = response.json()
-            return data.get("status") == "ok"
-        except Exception as e:
-            logging.error(f"Error deleting record {hostname}: {e}")
-            return False
 
+_SEPARATORS = re.compile(r'[\s_]+')
+_INVALID_CHARS = re.compile(r'[^a-z0-9-]')
+_HYPHEN_RUNS = re.compile(r'-+')
 
-# =============================================================================
-# Helper Functions
-# =============================================================================
 
+@lru_cache(maxsize=65536)
 def sanitize_hostname(name: str) -> str:
-    """Convert name to valid DNS hostname"""
+    """Convert name to valid DNS hostname (memoized - client names repeat every run)"""
     if not name:
         return ""
     # Convert to lowercase
     name = name.lower()
     # Replace spaces and underscores with hyphens
-    name = re.sub(r'[\s_]+', '-', name)
+    name = _SEPARATORS.sub('-', name)
     # Remove invalid characters (keep only a-z, 0-9, hyphen)
-    name = re.sub(r'[^a-z0-9-]', '', name)
+    name = _INVALID_CHARS.sub('', name)
     # Remove leading/trailing hyphens
     name = name.strip('-')
     # Collapse multiple hyphens
-    name = re.sub(r'-+', '-', name)
+    name = _HYPHEN_RUNS.sub('-', name)
     # Truncate to 63 chars (DNS label limit)
     return name[:63]
 
 
+def ptr_zone_for(ip: str) -> Optional[str]:
+    """Most specific PTR_ZONES entry covering `ip` (None if not covered)"""
+    name = reverse_name(ip)
+    if not name:
+        return None
+    zones = [zone for zone in PTR_ZONES if name.endswith(f".{zone.lower()}")]
+    return max(zones, key=len) if zones else None
+
+
+@lru_cache(maxsize=None)
+def skip_matcher(patterns: Tuple[str, ...]):
+    """Compile all skip patterns into a single case-insensitive regex"""
+    return re.compile("|".join(f"(?:{p})" for p in patterns), re.IGNORECASE)
+
+
 def should_skip(hostname: str) -> bool:
     """Check if hostname should be skipped"""
-    for pattern in SKIP_PATTERNS:
-        if re.match(pattern, hostname, re.IGNORECASE):
-            return True
-    return False
+    if not SKIP_PATTERNS:
+        return False
+    return skip_matcher(tuple(SKIP_PATTERNS)).match(hostname) is not None
+
+
+class NetworkSet:
+    """
+    A set of CIDR networks stored as merged, sorted integer ranges per
+    address family, so membership is a single binary search.
+    """
+
+    def __init__(self, networks: Tuple[str, ...]):
+        ranges: Dict[int, List[Tuple[int, int]]] = {4: [], 6: []}
+        for entry in networks:
+            network = parse_network(entry)
+            ranges[network.version].append(
+                (int(network.network_address), int(network.broadcast_address))
+            )
+
+        self.starts: Dict[int, List[int]] = {}
+        self.ends: Dict[int, List[int]] = {}
+        for version, spans in ranges.items():
+            merged: List[List[int]] = []
+            for start, end in sorted(spans):
+                if merged and start <= merged[-1][1] + 1:
+                    merged[-1][1] = max(merged[-1][1], end)
+                else:
+                    merged.append([start, end])
+            self.starts[version] = [start for start, _ in merged]
+            self.ends[version] = [end for _, end in merged]
+
+    def __contains__(self, address) -> bool:
+        value = int(address)
+        starts = self.starts[address.version]
+        i = bisect.bisect_right(starts, value) - 1
+        return i >= 0 and value <= self.ends[address.version][i]
+
 
+def parse_network(entry: str):
+    """Parse a CIDR, also accepting legacy dotted prefixes like "10.203." """
+    if entry.endswith("."):
+        octets = entry.rstrip(".").split(".")
+        entry = ".".join(octets + ["0"] * (4 - len(octets))) + f"/{8 * len(octets)}"
+    return ipaddress.ip_network(entry, strict=False)
 
-def is_allowed_network(ip: str) -> bool:
-    """Check if IP is in allowed networks"""
-    if not ALLOWED_NETWORKS:
+
+@lru_cache(maxsize=None)
+def network_filter(allowed: Tuple[str, ...], denied: Tuple[str, ...]) -> Tuple[NetworkSet, NetworkSet]:
+    """Build (and cache) the allow/deny sets for a configuration"""
+    return NetworkSet(allowed), NetworkSet(denied)
+
+
+def is_allowed_network(ip: str, networks: Optional[Tuple[str, ...]] = None) -> bool:
+    """Check if IP is in allowed networks (default ALLOWED_NETWORKS) and not in denied ones"""
+    networks = tuple(ALLOWED_NETWORKS) if networks is None else networks
+    if not networks and not DENIED_NETWORKS:
         return True
-    return any(ip.startswith(net) for net in ALLOWED_NETWORKS)
+    try:
+        address = ipaddress.ip_address(ip)
+    except ValueError:
+        return False
+    allowed, denied = network_filter(networks, tuple(DENIED_NETWORKS))
+    if address in denied:
+        return False
+    return not networks or address in allowed
+
+
+def load_mappings(mappings: Optional[List[Dict]] = None) -> List[SiteMapping]:
+    """Normalise SITE_MAPPINGS entries (site defaults to "default", networks to any)"""
+    return [
+        SiteMapping(entry.get("site", "default"), entry["zone"], tuple(entry.get("networks") or ()))
+        for entry in (SITE_MAPPINGS if mappings is None else mappings)
+    ]
+
+
+def new_updater() -> Optional[DynamicUpdater]:
+    """Dynamic update client for DYNAMIC_UPDATE_ZONES (None if not configured)"""
+    if not DYNAMIC_UPDATE_ZONES or not TSIG_SECRET:
+        return None
+    updater = DynamicUpdater(DYNAMIC_UPDATE_SERVER, TSIG_KEY_NAME, TSIG_SECRET, DYNAMIC_UPDATE_ZONES,
+                             TSIG_ALGORITHM, DYNAMIC_UPDATE_PORT)
+    if not updater.available:
+        logging.warning("DYNAMIC_UPDATE_ZONES is set but dnspython is not installed "
+                        "(pip3 install dnspython); using the HTTP API")
+        return None
+    return updater
+
+
+# =============================================================================
+# Stale Record Cleanup
+# =============================================================================
+
+def plan_cleanup(hosts: Dict[str, Dict], known: Dict[str, Dict], grace: float,
+                 zone: Optional[ZoneIndex] = None) -> Tuple[List[Change], List[str]]:
+    """
+    Find records for hosts UniFi hasn't reported for longer than `grace`.
+
+    `known` is the state cache's client map. When a zone listing is given,
+    tagged records we have no state for are adopted into `known` (their
+    grace period starts now), and hosts whose record has since been changed
+    by hand are left alone; only our own addresses of a multi-homed name
+    are deleted. Returns (deletions, hostnames to forget).
+    """
+    now = time.time()
+    if zone is not None:
+        for name in zone:
+            if name not in hosts and name not in known:
+                owned = [ip for ip in zone.addresses(name) if zone.owned(name, ip)]
+                if owned:
+                    known[name] = {"ip": owned[0], "mac": "", "last_seen": now}
+
+    deletions, forget = [], []
+    for hostname in sorted(known):
+        entry = known[hostname]
+        if hostname in hosts or now - entry.get("last_seen", now) < grace:
+            continue
+
+        ips = [entry.get("ip", "")]
+        if zone is not None:
+            addresses = zone.addresses(hostname)
+            if not addresses:
+                forget.append(hostname)  # Already gone from the zone
+                continue
+            if not zone.has(hostname, ips[0]):
+                ips = [ip for ip in addresses if zone.owned(hostname, ip)]
+                if not ips:
+                    forget.append(hostname)  # Taken over by a hand-managed record
+                    continue
+        deletions.extend(Change("delete", hostname, ip) for ip in ips)
+
+    if len(deletions) > GC_BATCH_SIZE:
+        logging.info(f"Deferring {len(deletions) - GC_BATCH_SIZE} expired records to later runs")
+        deletions = deletions[:GC_BATCH_SIZE]
+    return deletions, forget
+
+
+def plan_ptr_changes(plan: List[Change], hosts: Dict[str, Dict], zone: str,
+                     existing: Optional[ZoneIndex] = None,
+                     known: Optional[Dict[str, Dict]] = None) -> List[Change]:
+    """
+    Derive the PTR changes for a zone from its A record plan.
+
+    Without a listing of the reverse zones each A change maps straight to
+    its pointer (a moved host also loses the pointer at its old address);
+    check_ptr_writes() then keeps those writes off hand-managed pointers.
+    With `existing` (pointers indexed by target and address) every host
+    is checked, so missing or stale pointers are repaired as well. A
+    pointer is ours if it carries OWNER_TAG or targets a host in
+    `hosts`/`known` (zone imports can't set comments); anything else is
+    left alone.
+    """
+    known = known or {}
+
+    def ours(target: str, ip: str) -> bool:
+        return ptr_is_ours(target, existing.owned(target, ip), zone, hosts, known)
+
+    changes: List[Change] = []
+    if existing is None:
+        for change in plan:
+            if change.action == "update" and change.current_ip not in (None, change.ip) \
+                    and ptr_zone_for(change.current_ip):
+                changes.append(Change("delete", change.hostname, change.current_ip, rtype="PTR"))
+            if ptr_zone_for(change.ip):
+                action = "delete" if change.action == "delete" else "add"
+                changes.append(Change(action, change.hostname, change.ip, rtype="PTR", ttl=change.ttl))
+        return changes
+
+    deleting = {change.hostname for change in plan if change.action == "delete"}
+    for hostname, host in hosts.items():
+        ip = host["ip"]
+        if hostname in deleting or not ptr_zone_for(ip):
+            continue
+        targets = existing.names(ip)
+        if not targets:
+            changes.append(Change("add", hostname, ip, rtype="PTR", ttl=host.get("ttl")))
+        elif not existing.has(f"{hostname}.{zone}", ip):
+            if all(ours(target, ip) for target in targets):
+                changes.append(Change("update", hostname, ip, rtype="PTR", ttl=host.get("ttl")))
+            else:
+                logging.debug(f"  [skipped] {ip} has a hand-managed PTR record")
+
+    # Our pointers left behind at addresses a host no longer has
+    for hostname in itertools.chain(hosts, deleting - hosts.keys()):
+        fqdn = f"{hostname}.{zone}".lower()
+        for ip in existing.addresses(fqdn):
+            host = hosts.get(hostname)
+            if ours(fqdn, ip) and (hostname in deleting or host["ip"] != ip):
+                changes.append(Change("delete", hostname, ip, rtype="PTR"))
+    return changes
+
+
+def ptr_is_ours(target: str, owned: bool, zone: str, hosts: Dict[str, Dict],
+                known: Dict[str, Dict]) -> bool:
+    """True if a pointer to `target` was written by this sync for `zone`"""
+    if owned:
+        return True
+    suffix = f".{zone.lower()}"
+    if not target.endswith(suffix):
+        return False
+    hostname = target[:-len(suffix)]
+    return hostname in hosts or hostname in known
+
+
+def check_ptr_writes(dns: TechnitiumDNS, changes: List[Change], hosts: Dict[str, Dict],
+                     known: Dict[str, Dict], zone: str) -> List[Change]:
+    """
+    Drop PTR writes that would replace a hand-managed pointer. Incremental
+    runs have no reverse zone listing, so the pointers at each address
+    about to be written are looked up first. Writes whose lookup fails
+    are left to the next full resync.
+    """
+    kept: List[Change] = []
+    connected = None
+    for change in changes:
+        if change.action == "delete":
+            kept.append(change)  # Removes only our own pointer
+            continue
+        if connected is None:
+            connected = connect(dns)
+        records = dns.get_ptr_records(ptr_zone_for(change.ip), change.ip) if connected else None
+        if records is None:
+            logging.debug(f"  [skipped] PTR for {change.ip}: lookup failed, left to the next full resync")
+            continue
+        fqdn = f"{change.hostname}.{zone}".lower()
+        if all(record["target"] == fqdn or ptr_is_ours(record["target"], record["owned"], zone, hosts, known)
+               for record in records):
+            kept.append(change)
+        else:
+            logging.debug(f"  [skipped] {change.ip} has a hand-managed PTR record")
+    return kept
+
+
+def load_ptr_records(dns: TechnitiumDNS, cache: Dict[str, Optional[ZoneIndex]]) -> Optional[ZoneIndex]:
+    """
+    List every reverse zone and index the pointers by target and address,
+    once per run (the index is kept in `cache`). None if any zone couldn't
+    be listed.
+    """
+    if "ptr" not in cache:
+        existing: Optional[ZoneIndex] = ZoneIndex()
+        for ptr_zone in PTR_ZONES:
+            records = dns.list_ptr_records(ptr_zone)
+            if records is None:
+                existing = None
+                break
+            for record in records:
+                existing.add(record["target"], record["ip"], owned=record["owned"])
+        cache["ptr"] = existing
+    return cache["ptr"]
 
 
 # =============================================================================
 # Main Sync Logic
 # =============================================================================
 
-def sync(dry_run: bool = False, verbose: bool = False) -> Tuple[int, int, int]:
+def apply_changes(dns: TechnitiumDNS, plan: List[Change], workers: int = 1,
+                  bulk: bool = False, zone: str = DNS_ZONE,
+                  on_done: Optional[Callable[[int, bool], None]] = None,
+                  updater: Optional[DynamicUpdater] = None) -> List[Optional[bool]]:
     """
-    Sync UniFi clients to DNS.
-    Returns: (added, updated, errors)
+    Push planned changes to DNS over a bounded thread pool.
+
+    Changes to zones the `updater` handles are first sent as RFC 2136
+    UPDATE messages; whatever fails there takes the HTTP path below. In
+    bulk mode adds/updates are sent as zone file imports of up to
+    BULK_BATCH_SIZE records per zone (PTRs go to their reverse zone); a
+    batch that fails falls back to one API call per record. Returns one
+    success flag per change, in plan order: None for changes not attempted
+    because the DNS server's circuit breaker opened part way through.
+    `on_done(index, ok)` is called as each attempted change finishes.
     """
-    added = updated = errors = 0
+    def finish(i: int, ok: Optional[bool]):
+        results[i] = ok
+        if on_done and ok is not None:
+            on_done(i, ok)
 
-    # Connect to UniFi
-    logging.info("Connecting to UniFi Controller...")
-    unifi = UnifiClient(UNIFI_URL, UNIFI_API_KEY)
-    clients = unifi.get_clients()
+    def apply(change: Change) -> Optional[bool]:
+        if not dns.available():
+            return None
+        if change.rtype == "PTR":
+            target = f"{change.hostname}.{zone}"
+            if change.action == "delete":
+                return dns.delete_record(ptr_zone_for(change.ip), reverse_name(change.ip), "PTR", target)
+            return dns.add_record(ptr_zone_for(change.ip), reverse_name(change.ip), "PTR", target,
+                                  change.ttl or DNS_TTL)
+        if change.action == "delete":
+            return dns.delete_record(zone, change.hostname, "A", change.ip)
+        return dns.add_record(zone, change.hostname, "A", change.ip, change.ttl or DNS_TTL)
 
-    if not clients:
-        logging.warning("No clients retrieved from UniFi")
-        return 0, 0, 1
+    def apply_each(indexes: List[int]):
+        if workers <= 1 or len(indexes) <= 1:
+            for i in indexes:
+                finish(i, apply(plan[i]))
+            return
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for i, ok in zip(indexes, pool.map(apply, [plan[i] for i in indexes])):
+                finish(i, ok)
 
-    logging.info(f"Retrieved {len(clients)} clients from UniFi")
+    def target_zone(change: Change) -> str:
+        return ptr_zone_for(change.ip) if change.rtype == "PTR" else zone
 
-    # Connect to DNS
-    logging.info("Connecting to Technitium DNS...")
-    dns = TechnitiumDNS(DNS_URL, DNS_USER, DNS_PASS)
-    if not dns.login():
-        logging.error("Failed to authenticate with DNS server")
-        return 0, 0, 1
+    results: List[Optional[bool]] = [False] * len(plan)
+    remaining = list(range(len(plan)))
+    if updater is not None:
+        remaining = send_updates(updater, plan, zone, target_zone, finish)
+    if not bulk:
+        apply_each(remaining)
+        return results
 
-    # Get existing records
-    existing = dns.get_records(DNS_ZONE)
-    logging.info(f"Found {len(existing)} existing A records in {DNS_ZONE}")
+    # Group writes by the zone they land in and their TTL
+    groups: Dict[Tuple[str, str, int], List[int]] = {}
+    fallback = [i for i in remaining if plan[i].action == "delete"]
+    for i in remaining:
+        change = plan[i]
+        if change.action != "delete":
+            groups.setdefault((target_zone(change), change.rtype, change.ttl or DNS_TTL), []).append(i)
+
+    for (target, rtype, ttl), writes in groups.items():
+        for start in range(0, len(writes), BULK_BATCH_SIZE):
+            batch = writes[start:start + BULK_BATCH_SIZE]
+            if not dns.available():
+                for i in batch:
+                    finish(i, None)
+                continue
+            if rtype == "PTR":
+                records = [(plan[i].ip, f"{plan[i].hostname}.{zone}") for i in batch]
+            else:
+                records = [(plan[i].hostname, plan[i].ip) for i in batch]
+            if dns.import_records(target, records, ttl, rtype):
+                for i in batch:
+                    finish(i, True)
+            else:
+                logging.warning(f"Bulk import of {len(batch)} records failed, falling back to per-record calls")
+                fallback.extend(batch)
+    apply_each(sorted(fallback))
+    return results
+
+
+def send_updates(updater: DynamicUpdater, plan: List[Change], zone: str,
+                 target_zone: Callable[[Change], str],
+                 finish: Callable[[int, Optional[bool]], None]) -> List[int]:
+    """
+    Send the changes whose zone `updater` handles as dynamic updates,
+    one connection per zone. Returns the indexes still to be applied over
+    HTTP: other zones' changes and any the UPDATE messages didn't apply.
+    """
+    by_zone: Dict[str, List[int]] = {}
+    remaining = []
+    for i, change in enumerate(plan):
+        target = target_zone(change)
+        if updater.handles(target):
+            by_zone.setdefault(target, []).append(i)
+        else:
+            remaining.append(i)
+
+    for target, indexes in by_zone.items():
+        updates = []
+        for i in indexes:
+            change = plan[i]
+            action = "delete" if change.action == "delete" else "add"
+            if change.rtype == "PTR":
+                updates.append(RecordUpdate(action, reverse_name(change.ip), "PTR",
+                                            f"{change.hostname}.{zone}", change.ttl or DNS_TTL))
+            else:
+                updates.append(RecordUpdate(action, change.hostname, "A", change.ip, change.ttl or DNS_TTL))
+        results = updater.apply(target, updates)
+        for i, ok in zip(indexes, results):
+            if ok:
+                finish(i, True)
+            else:
+                remaining.append(i)
+        if not all(results):
+            logging.warning(f"{target}: {results.count(False)} of {len(results)} dynamic updates failed, "
+                            f"falling back to the HTTP API")
+        else:
+            logging.info(f"{target}: applied {len(results)} changes as dynamic updates")
+    return sorted(remaining)
 
-    # Process clients
-    processed = set()
-    for client in clients:
-        ip = client.get("ip", "")
 
-        # Get hostname (prefer hostname, fall back to name)
-        hostname = client.get("hostname") or client.get("name") or ""
-        hostname = sanitize_hostname(hostname)
+def collect_clients(clients: Iterable[ClientRecord],
+                    mappings: Optional[List[SiteMapping]] = None) -> Tuple[Dict[str, Dict[str, Dict]], int]:
+    """
+    Filter one site's UniFi clients down to the hosts we publish, routing
+    each to the zone of the first mapping whose networks contain its IP.
+    `clients` is consumed lazily, so only published hosts are kept in memory.
+    Returns ({zone: {hostname: {"ip", "mac", "last_seen"}}} in UniFi order,
+    clients seen).
+    """
+    if mappings is None:
+        mappings = [SiteMapping("default", DNS_ZONE, tuple(ALLOWED_NETWORKS))]
+    zones: Dict[str, Dict[str, Dict]] = {mapping.zone: {} for mapping in mappings}
+    seen = 0
+    for client in clients:
+        seen += 1
+        ip = client.ip
+        hostname = sanitize_hostname(client.hostname)
 
         # Skip invalid entries
         if not ip or not hostname:
             continue
         if should_skip(hostname):
             continue
-        if not is_allowed_network(ip):
+        for mapping in mappings:
+            if is_allowed_network(ip, mapping.networks):
+                break
+        else:
             continue
-        if hostname in processed:
+        hosts = zones[mapping.zone]
+        if hostname in hosts:
             continue  # Skip duplicates
 
-        processed.add(hostname)
-        current_ip = existing.get(hostname.lower())
+        hosts[hostname] = {
+            "ip": ip,
+            "mac": client.mac,
+            "last_seen": client.last_seen or int(time.time()),
+        }
+    return zones, seen
+
 
-        if current_ip == ip:
-            if verbose:
-                logging.debug(f"  [unchanged] {hostname} -> {ip}")
+def fetch_sites(unifi: UnifiClient, mappings: List[SiteMapping], metrics: Metrics,
+                workers: int = SITE_WORKERS) -> Tuple[Dict[str, Dict[str, Dict]], List[str]]:
+    """
+    Fetch every mapped UniFi site concurrently and merge the hosts per zone
+    (in mapping order, so the first site to claim a hostname keeps it).
+    Returns ({zone: hosts}, zones fed by a site that couldn't be fetched).
+    """
+    sites = list(dict.fromkeys(mapping.site for mapping in mappings))
+
+    def fetch(site: str):
+        # Clients are filtered while the response streams in
+        with metrics.phase("unifi_fetch", site=site):
+            try:
+                zones, seen = collect_clients(unifi.iter_clients(site),
+                                              [m for m in mappings if m.site == site])
+            except Exception as e:
+                logging.error(f"UniFi connection error (site {site}): {e}")
+                return None
+        if not seen:
+            logging.warning(f"No clients retrieved from UniFi site {site}")
+            return None
+        logging.info(f"Retrieved {seen} clients from UniFi site {site}")
+        return zones
+
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(sites)))) as pool:
+        fetched = dict(zip(sites, pool.map(fetch, sites)))
+
+    hosts: Dict[str, Dict[str, Dict]] = {}
+    failed: List[str] = []
+    for mapping in mappings:
+        zone_hosts = hosts.setdefault(mapping.zone, {})
+        site_zones = fetched[mapping.site]
+        if site_zones is None:
+            if mapping.zone not in failed:
+                failed.append(mapping.zone)
             continue
+        for hostname, host in site_zones.get(mapping.zone, {}).items():
+            zone_hosts.setdefault(hostname, host)
+    return hosts, failed
 
-        action = "update" if current_ip else "add"
 
-        if dry_run:
-            if current_ip:
-                logging.info(f"  [DRY-RUN] Would update: {hostname} {current_ip} -> {ip}")
-            else:
-                logging.info(f"  [DRY-RUN] Would add: {hostname} -> {ip}")
+def merge_sources(unifi_hosts: Dict[str, Dict[str, Dict]], zones: List[str],
+                  session: requests.Session, metrics: Metrics) -> Tuple[Dict[str, Dict[str, Dict]], List[str]]:
+    """
+    Compile each zone's desired hosts from UniFi, Netbox (if NETBOX_URL is
+    set) and STATIC_RECORDS_FILE by SOURCE_PRECEDENCE, so one diff covers
+    every source. Returns ({zone: hosts}, zones missing their Netbox or
+    static records because they couldn't be loaded).
+    """
+    sources = {zone: {"unifi": unifi_hosts.get(zone, {})} for zone in zones}
+    incomplete: List[str] = []
+    static = load_static_records(STATIC_RECORDS_FILE)
+    if static is None:
+        incomplete = list(zones)
+    else:
+        for zone, records in static.items():
+            if zone in sources:
+                sources[zone]["static"] = records
+
+    if NETBOX_URL and not NETBOX_TOKEN:
+        logging.error("NETBOX_URL is set but NETBOX_TOKEN is empty, can't merge Netbox records "
+                      "(set NETBOX_TOKEN, or NETBOX_URL = \"\" to sync without Netbox)")
+        incomplete = list(zones)
+    elif NETBOX_URL:
+        netbox = NetboxClient(NETBOX_URL, NETBOX_TOKEN, session=session, statuses=NETBOX_STATUSES)
+        with metrics.phase("netbox_fetch"):
+            projected = netbox_hosts(netbox.iter_ip_addresses(), zones)
+        if netbox.fetch_ok:
+            for zone in zones:
+                sources[zone]["netbox"] = projected[zone]
         else:
-            if dns.add_or_update_record(DNS_ZONE, hostname, ip, DNS_TTL):
-                if current_ip:
-                    logging.info(f"  [updated] {hostname}: {current_ip} -> {ip}")
-                    updated += 1
-                else:
-                    logging.info(f"  [added] {hostname} -> {ip}")
-                    added += 1
+            incomplete = list(zones)
+
+    hosts: Dict[str, Dict[str, Dict]] = {}
+    for zone, zone_sources in sources.items():
+        for source, source_hosts in zone_sources.items():
+            metrics.set("source_hosts", len(source_hosts), zone=zone, source=source)
+        hosts[zone], overridden = compile_zone(zone_sources, SOURCE_PRECEDENCE,
+                                                dict(SOURCE_TTLS, unifi=DNS_TTL))
+        metrics.set("overridden", overridden, zone=zone)
+        if overridden:
+            logging.info(f"{zone}: {overridden} hostnames where sources disagree, "
+                         f"resolved by precedence ({' > '.join(SOURCE_PRECEDENCE)})")
+    return hosts, incomplete
+
+
+def sync_zone(dns: TechnitiumDNS, zone: str, hosts: Dict[str, Dict], metrics: Metrics,
+              dry_run: bool = False, verbose: bool = False,
+              workers: int = SYNC_WORKERS, bulk: bool = False,
+              full_resync: bool = False, state_file: str = STATE_FILE,
+              gc: bool = True, gc_grace: float = GC_GRACE_PERIOD,
+              ptr: bool = True, ptr_cache: Optional[Dict] = None,
+              plan_file: str = "", damper: Optional[Damper] = None,
+              updater: Optional[DynamicUpdater] = None) -> Tuple[int, int, int, int]:
+    """
+    Bring one zone in line with the hosts UniFi reported for it.
+
+    When the zone's state cache is usable, only hosts whose address
+    changed since the last run are pushed and the zone listing is skipped.
+    With `ptr`, matching PTR records are planned from the same diff and
+    pushed alongside the A records. A records are counted in the result;
+    failed PTR writes count as errors. The plan is journaled before it is
+    applied; a journal left by an interrupted run is finished first. A
+    dry run writes its plan to `plan_file` if one is given. With a
+    `damper`, address changes that haven't persisted yet are held back.
+    Writes to zones the `updater` handles go out as dynamic updates.
+    Returns: (added, updated, deleted, errors)
+    """
+    added = updated = deleted = errors = 0
+    metrics.set("hosts", len(hosts), zone=zone)
+    metrics.set("deferred", 0, zone=zone)
+
+    if not dry_run:
+        # Finish an interrupted run first so the plan below starts from its outcome
+        added, updated, deleted, errors = resume_zone(dns, zone, metrics, state_file, workers, bulk, updater)
+
+    state = load_state(state_file, zone)
+    incremental = False
+    if full_resync:
+        logging.info(f"{zone}: full resync requested")
+    elif state and time.time() - state.get("last_full_sync", 0) > FULL_RESYNC_INTERVAL:
+        logging.info(f"{zone}: state cache is due for a periodic full resync")
+    elif state:
+        incremental = True
+    state = state or {"clients": {}}
+    known = state["clients"]
+    if damper is not None:
+        hosts = damper.filter(zone, hosts, known)
+        metrics.set("damped", damper.held[zone], zone=zone)
+        metrics.set("flapping", damper.flapping(zone), zone=zone)
+        if damper.held[zone]:
+            logging.info(f"{zone}: holding back {damper.held[zone]} address changes until they persist "
+                         f"({damper.flapping(zone)} hosts backed off for flapping)")
+
+    # Work out what needs to change (sequential, so ordering is stable)
+    plan: List[Change] = []
+    forget: List[str] = []
+    if incremental:
+        with metrics.phase("diff", zone=zone):
+            for hostname, host in hosts.items():
+                previous = known.get(hostname, {})
+                previous_ip = previous.get("ip")
+                ttl = host.get("ttl", DNS_TTL)
+                if previous_ip == host["ip"] and previous.get("ttl", DNS_TTL) == ttl:
+                    continue
+                plan.append(Change("update" if previous_ip else "add", hostname, host["ip"], previous_ip, ttl=ttl))
+
+            logging.info(f"{zone}: incremental sync, {len(plan)} of {len(hosts)} hosts changed since last run")
+            if gc:
+                deletions, forget = plan_cleanup(hosts, known, gc_grace)
+                plan.extend(deletions)
+            if ptr:
+                plan.extend(check_ptr_writes(dns, plan_ptr_changes(plan, hosts, zone), hosts, known, zone))
+        if not plan:
+            if not dry_run:
+                save_state(state_file, state, hosts, [], forget, zone=zone)
+            return added, updated, deleted, errors
+    else:
+        # Full resync: compare every host against the zone
+        if not connect(dns):
+            return added, updated, deleted, errors + 1
+
+        with metrics.phase("zone_list", zone=zone):
+            existing = dns.get_records(zone)
+        logging.info(f"Found {len(existing)} existing A records in {zone}")
+
+        with metrics.phase("diff", zone=zone):
+            if known:
+                # What we published, if it's still there (other addresses of the name aside)
+                snapshot = {h: entry.get("ip", "") if existing.has(h, entry.get("ip"))
+                            else ",".join(existing.addresses(h)) for h, entry in known.items()}
+                if state.get("zone_hash") != zone_hash(snapshot):
+                    logging.info(f"{zone}: zone changed outside this sync since the last snapshot")
+
+            conflicts = 0
+            for hostname, host in hosts.items():
+                ip = host["ip"]
+                ttl = host.get("ttl", DNS_TTL)
+                others = [name for name in existing.names(ip)
+                          if name not in hosts and name not in known and not existing.owned(name, ip)]
+                if others:
+                    conflicts += 1
+                    logging.debug(f"  [conflict] {hostname} -> {ip} is also published as {', '.join(others)}")
+                current = existing.addresses(hostname)
+                # A write replaces every address at the name, so a multi-homed
+                # name that already has ours is left as it is
+                if existing.has(hostname, ip) and (existing.ttl(hostname) in (None, ttl) or len(current) > 1):
+                    if verbose:
+                        logging.debug(f"  [unchanged] {hostname} -> {ip}")
+                    continue
+                previous_ip = known.get(hostname, {}).get("ip")
+                current_ip = previous_ip if previous_ip in current else (current[0] if current else None)
+                plan.append(Change("update" if current_ip else "add", hostname, ip, current_ip, ttl=ttl))
+            metrics.set("conflicts", conflicts, zone=zone)
+            if conflicts:
+                logging.info(f"{zone}: {conflicts} hosts share their address with a hand-managed name "
+                             f"(see --verbose)")
+
+            if gc:
+                deletions, forget = plan_cleanup(hosts, known, gc_grace, existing)
+                plan.extend(deletions)
+
+        if ptr:
+            with metrics.phase("ptr_list"):
+                existing_ptrs = load_ptr_records(dns, ptr_cache if ptr_cache is not None else {})
+            plan.extend(plan_ptr_changes(plan, hosts, zone, existing_ptrs, known))
+
+    expired = sum(1 for change in plan if change.action == "delete" and change.rtype == "A")
+    if expired:
+        logging.info(f"{zone}: {expired} records expired after {gc_grace / 3600:g}h without a UniFi sighting")
+
+    if dry_run:
+        for change in plan:
+            if change.rtype == "PTR":
+                logging.info(f"  [DRY-RUN] Would {change.action} PTR: {change.ip} -> {change.hostname}.{zone}")
+            elif change.action == "update" and change.current_ip == change.ip:
+                logging.info(f"  [DRY-RUN] Would set TTL: {change.hostname} -> {change.ttl}")
+            elif change.action == "update":
+                logging.info(f"  [DRY-RUN] Would update: {change.hostname} {change.current_ip} -> {change.ip}")
+            elif change.action == "delete":
+                logging.info(f"  [DRY-RUN] Would delete: {change.hostname} -> {change.ip}")
+            else:
+                logging.info(f"  [DRY-RUN] Would add: {change.hostname} -> {change.ip}")
+        if plan_file:
+            if PlanJournal.write(plan_file, zone, plan, hosts, forget, full=not incremental).path:
+                logging.info(f"{zone}: wrote {len(plan)} planned changes to {plan_file}")
             else:
-                logging.error(f"  [FAILED] {hostname} -> {ip}")
                 errors += 1
+        return added, updated, deleted, errors
+
+    if not connect(dns):
+        return added, updated, deleted, errors + 1
+
+    journal = PlanJournal.write(journal_file(state_file), zone, plan, hosts, forget, full=not incremental)
+    a, u, d, e = apply_plan(dns, journal, metrics, state_file, workers, bulk, state, updater)
+    return added + a, updated + u, deleted + d, errors + e
+
+
+def connect(dns: TechnitiumDNS) -> bool:
+    """Log in to DNS unless this run already has"""
+    if dns.token:
+        return True
+    logging.info("Connecting to Technitium DNS...")
+    if dns.login():
+        return True
+    logging.error("Failed to authenticate with DNS server")
+    return False
+
+
+def apply_plan(dns: TechnitiumDNS, journal: PlanJournal, metrics: Metrics, state_file: str,
+               workers: int = SYNC_WORKERS, bulk: bool = False,
+               state: Optional[Dict] = None,
+               updater: Optional[DynamicUpdater] = None) -> Tuple[int, int, int, int]:
+    """
+    Apply the changes in `journal` that have no completion mark, marking
+    each as it finishes, then fold the outcome of the whole plan (including
+    changes an interrupted run already made) into the state cache and drop
+    the journal. Only changes applied by this call are counted.
+    Returns: (added, updated, deleted, errors)
+    """
+    added = updated = deleted = errors = 0
+    zone, plan = journal.zone, journal.plan
+    pending = journal.pending()
+    if state is None and os.path.exists(state_file):
+        state = load_state(state_file, zone)
+    state = state or {"clients": {}}
+
+    # Push changes (results come back in plan order regardless of workers)
+    with metrics.phase("apply", zone=zone):
+        results = apply_changes(dns, [plan[i] for i in pending], workers, bulk, zone,
+                                on_done=lambda i, ok: journal.mark(pending[i], ok), updater=updater)
+    outcome: Dict[int, Optional[bool]] = dict(journal.done)
+    outcome.update(zip(pending, results))
+    applied_now = set(pending)
+
+    failed, removed = [], list(journal.forget)
+    deferred = 0
+    for i, change in enumerate(plan):
+        ok = outcome.get(i)
+        if ok is None:
+            deferred += 1
+            if change.action != "delete":
+                failed.append(change.hostname)
+            continue
+        if i not in applied_now:
+            # Applied before the interruption: only its effect on the state matters
+            if not ok and change.action != "delete":
+                failed.append(change.hostname)
+            elif ok and change.action == "delete" and change.rtype == "A":
+                removed.append(change.hostname)
+            continue
+        if change.rtype == "PTR":
+            if ok:
+                logging.info(f"  [PTR {change.action}] {change.ip} -> {change.hostname}.{zone}")
+                continue
+            logging.error(f"  [FAILED] PTR {change.ip} -> {change.hostname}.{zone}")
+            errors += 1
+            if change.action != "delete":
+                failed.append(change.hostname)  # Retried with its A record next run
+            continue
+        if not ok:
+            logging.error(f"  [FAILED] {change.hostname} -> {change.ip}")
+            failed.append(change.hostname)
+            errors += 1
+        elif change.action == "update":
+            logging.info(f"  [updated] {change.hostname}: {change.current_ip} -> {change.ip}")
+            updated += 1
+        elif change.action == "add":
+            logging.info(f"  [added] {change.hostname} -> {change.ip}")
+            added += 1
+        else:
+            logging.info(f"  [deleted] {change.hostname} -> {change.ip}")
+            removed.append(change.hostname)
+            deleted += 1
+
+    if deferred:
+        # Partial progress: what was applied is kept, the rest is retried next run
+        errors += deferred
+        metrics.set("deferred", deferred, zone=zone)
+        logging.warning(f"{zone}: DNS server unavailable, applied {len(plan) - deferred} of "
+                        f"{len(plan)} changes; {deferred} deferred to the next run")
+
+    # Only record what actually reached DNS, so failures are retried next run
+    with metrics.phase("state_save", zone=zone):
+        save_state(state_file, state, journal.hosts, failed, removed, full=journal.full, zone=zone)
+    journal.remove()
+
+    return added, updated, deleted, errors
+
+
+def resume_zone(dns: TechnitiumDNS, zone: str, metrics: Metrics, state_file: str,
+                workers: int = SYNC_WORKERS, bulk: bool = False,
+                updater: Optional[DynamicUpdater] = None) -> Tuple[int, int, int, int]:
+    """
+    Finish the changes an interrupted run left in the zone's journal.
+    Returns: (added, updated, deleted, errors); all zero if there was none
+    """
+    journal = PlanJournal.load(journal_file(state_file))
+    if journal is None:
+        return 0, 0, 0, 0
+    if journal.zone != zone or time.time() - journal.created > JOURNAL_MAX_AGE:
+        logging.info(f"{zone}: discarding an interrupted run's journal that is too old to resume")
+        journal.remove()
+        return 0, 0, 0, 0
+
+    logging.info(f"{zone}: resuming an interrupted run, {len(journal.done)} of "
+                 f"{len(journal.plan)} changes were already applied")
+    if not connect(dns):
+        return 0, 0, 0, 1
+    return apply_plan(dns, journal, metrics, state_file, workers, bulk, updater=updater)
+
+
+def sync(dry_run: bool = False, verbose: bool = False,
+         session: Optional[requests.Session] = None,
+         workers: int = SYNC_WORKERS, bulk: bool = False,
+         full_resync: bool = False, state_file: str = STATE_FILE,
+         gc: bool = True, gc_grace: float = GC_GRACE_PERIOD,
+         metrics: Optional[Metrics] = None,
+         mappings: Optional[List[SiteMapping]] = None,
+         ptr: bool = True, token_cache: str = TOKEN_CACHE_FILE,
+         plan_file: str = "", from_plan: str = "",
+         damper: Optional[Damper] = None,
+         updater: Optional[DynamicUpdater] = None) -> Tuple[int, int, int, int]:
+    """
+    Sync UniFi clients to DNS for every site -> zone mapping.
+
+    All sites are fetched concurrently over one shared session and merged
+    with Netbox and static records (merge_sources), then each zone is
+    synced in turn with a single Technitium login. Each zone keeps
+    its own state cache: when it is usable only changed hosts are pushed,
+    and a zone with no changes costs no DNS requests at all. With gc
+    enabled, records this sync owns are deleted once their host has been
+    absent from UniFi for `gc_grace` seconds. With `ptr`, hosts in
+    PTR_ZONES also get PTR records. The DNS session token is reused from
+    `token_cache` between runs. A dry run writes its plan to `plan_file`;
+    `from_plan` applies such a file verbatim instead of asking UniFi.
+    A `damper` holds back address changes of flapping hosts (its state is
+    saved unless this is a dry run). Zones the `updater` handles (by
+    default DYNAMIC_UPDATE_ZONES when TSIG_SECRET is set) are written with
+    RFC 2136 dynamic updates.
+    Phase timings go to `metrics`; attach it to the session to also
+    count requests.
+    Returns: (added, updated, deleted, errors) summed over all zones
+    """
+    totals = [0, 0, 0, 0]
+    session = session or make_session(HTTP_POOL_SIZE, HTTP_RETRIES, HTTP_BACKOFF,
+                                      HTTP_RATE_LIMIT, BREAKER_FAILURES, BREAKER_COOLDOWN)
+    metrics = metrics or new_metrics()
+    mappings = mappings or load_mappings()
+    zones = list(dict.fromkeys(mapping.zone for mapping in mappings))
+    dns = TechnitiumDNS(DNS_URL, DNS_USER, DNS_PASS, session=session, token_cache=token_cache,
+                        token_max_age=TOKEN_MAX_AGE, owner=OWNER_TAG)
+    if updater is None:
+        updater = new_updater()
+
+    if from_plan:
+        return apply_plan_files(dns, zones, from_plan, state_file, metrics, workers, bulk, updater)
+
+    # Connect to UniFi
+    logging.info("Connecting to UniFi Controller...")
+    unifi = UnifiClient(UNIFI_URL, UNIFI_API_KEY, session=session)
+    unifi_hosts, unavailable = fetch_sites(unifi, mappings, metrics)
+    hosts, incomplete = merge_sources(unifi_hosts, zones, session, metrics)
+
+    # DNS logs in lazily, so runs where nothing changed never touch it
+    ptr_cache: Dict[str, Optional[ZoneIndex]] = {}  # Reverse zones are listed once per run
+    for zone in zones:
+        if zone in unavailable:
+            # A partial client list would look like hosts leaving the network
+            logging.warning(f"Skipping {zone}: not every UniFi site feeding it could be fetched")
+            totals[3] += 1
+            continue
+        if zone in incomplete:
+            logging.warning(f"Skipping {zone}: its Netbox or static records could not be loaded")
+            totals[3] += 1
+            continue
+        if not dns.available():
+            logging.warning(f"Skipping {zone}: DNS server unavailable (circuit open)")
+            totals[3] += 1
+            continue
+        result = sync_zone(dns, zone, hosts[zone], metrics, dry_run=dry_run, verbose=verbose,
+                           workers=workers, bulk=bulk, full_resync=full_resync,
+                           state_file=zone_state_file(state_file, zone, zones),
+                           gc=gc, gc_grace=gc_grace, ptr=ptr, ptr_cache=ptr_cache,
+                           plan_file=zone_state_file(plan_file, zone, zones) if plan_file else "",
+                           damper=damper, updater=updater)
+        totals = [total + count for total, count in zip(totals, result)]
+
+    if damper is not None and not dry_run:
+        damper.save()
 
-    return added, updated, errors
+    added, updated, deleted, errors = totals
+    return added, updated, deleted, errors
+
+
+def apply_plan_files(dns: TechnitiumDNS, zones: List[str], plan_file: str, state_file: str,
+                     metrics: Metrics, workers: int = SYNC_WORKERS, bulk: bool = False,
+                     updater: Optional[DynamicUpdater] = None) -> Tuple[int, int, int, int]:
+    """
+    Apply the plans a `--dry-run --plan-file` run wrote, exactly as
+    reviewed. Each plan is copied into the zone's journal first, so an
+    interrupted apply resumes like any other run.
+    Returns: (added, updated, deleted, errors) summed over all zones
+    """
+    totals = [0, 0, 0, 0]
+    for zone in zones:
+        path = zone_state_file(plan_file, zone, zones)
+        plan = PlanJournal.load(path)
+        if plan is None or plan.zone != zone:
+            logging.error(f"{zone}: no usable plan in {path}")
+            totals[3] += 1
+            continue
+        if plan.done:
+            logging.error(f"{zone}: {path} is a journal of a run that already started, not a plan")
+            totals[3] += 1
+            continue
+        zone_state = zone_state_file(state_file, zone, zones)
+        if PlanJournal.load(journal_file(zone_state)):
+            logging.error(f"{zone}: an interrupted run must be finished before applying a plan")
+            totals[3] += 1
+            continue
+        if not connect(dns):
+            totals[3] += 1
+            break
+        logging.info(f"{zone}: applying {len(plan.plan)} planned changes from {path}")
+        journal = PlanJournal.write(journal_file(zone_state), zone, plan.plan, plan.hosts,
+                                plan.forget, plan.full)
+        result = apply_plan(dns, journal, metrics, zone_state, workers, bulk, updater=updater)
+        totals = [total + count for total, count in zip(totals, result)]
+
+    added, updated, deleted, errors = totals
+    return added, updated, deleted, errors
+
+
+# =============================================================================
+# Daemon Mode
+# =============================================================================
+
+class EventListener(threading.Thread):
+    """
+    Follows the UniFi event websocket and calls on_change() whenever a
+    client connects, roams or shows up with a new IP. Reconnects with
+    backoff; every (re)connect also counts as a change since events may
+    have been missed while disconnected.
+    """
+
+    def __init__(self, base_url: str, api_key: str, on_change, stop: threading.Event,
+                 site: str = "default", events_url: str = ""):
+        super().__init__(name=f"unifi-events-{site}", daemon=True)
+        if events_url:
+            base = events_url.rstrip('/')
+        else:
+            scheme, rest = base_url.rstrip('/').split("://", 1)
+            base = f"{'wss' if scheme == 'https' else 'ws'}://{rest}"
+        self.url = f"{base}{UNIFI_EVENTS_PATH.format(site=site)}"
+        self.headers = [f"X-API-KEY: {api_key}"]
+        self.on_change = on_change
+        self.stop = stop
+        self.known_ips: Dict[str, str] = {}  # mac -> ip, refreshed after each sync
+        self.seen_ips: Dict[str, str] = {}   # mac -> last ip reported on the stream
+
+    def is_relevant(self, message: Dict) -> bool:
+        """Check whether a websocket message should trigger a sync"""
+        kind = message.get("meta", {}).get("message")
+        for entry in message.get("data", []):
+            if kind == "events" and str(entry.get("key", "")).endswith(CLIENT_EVENT_SUFFIXES):
+                return True
+            if kind == "sta:sync":
+                mac, ip = entry.get("mac"), entry.get("ip")
+                if not mac or not ip:
+                    continue
+                previous = self.seen_ips.get(mac, self.known_ips.get(mac))
+                self.seen_ips[mac] = ip
+                if previous and previous != ip:
+                    return True
+        return False
+
+    def run(self):
+        backoff = 1
+        while not self.stop.is_set():
+            ws = None
+            try:
+                ws = websocket.create_connection(
+                    self.url, header=self.headers, timeout=10,
+                    sslopt={"cert_reqs": ssl.CERT_NONE}
+                )
+                logging.info(f"Subscribed to UniFi events at {self.url}")
+                backoff = 1
+                self.on_change()
+                ws.settimeout(1)
+                while not self.stop.is_set():
+                    try:
+                        raw = ws.recv()
+                    except websocket.WebSocketTimeoutException:
+                        continue
+                    try:
+                        message = json.loads(raw)
+                    except ValueError:
+                        continue
+                    if self.is_relevant(message):
+                        self.on_change()
+            except Exception as e:
+                logging.warning(f"UniFi event stream error: {e} (reconnecting in {backoff}s)")
+                self.stop.wait(backoff)
+                backoff = min(backoff * 2, 60)
+            finally:
+                if ws is not None:
+                    ws.close()
+
+
+def run_daemon(sync_options: Dict, debounce: float = DAEMON_DEBOUNCE,
+               max_delay: float = DAEMON_MAX_DELAY,
+               reconcile_interval: float = DAEMON_RECONCILE_INTERVAL,
+               metrics_file: str = METRICS_FILE, metrics_port: int = METRICS_PORT,
+               events_url: str = UNIFI_EVENTS_URL) -> int:
+    """
+    Keep DNS in step with UniFi until SIGTERM/SIGINT.
+
+    Bursts of events are coalesced: an incremental sync runs once the
+    stream has been quiet for `debounce` seconds, or at most `max_delay`
+    seconds after the first pending event. A full resync runs at start-up
+    and every `reconcile_interval` seconds, and an incremental one when an
+    address change held back by damping reaches its hold time. Metrics accumulate across runs
+    and are served on `metrics_port`. Events come from `events_url` when
+    set, otherwise from the controller at UNIFI_URL. Returns the process
+    exit code.
+    """
+    if websocket is None:
+        logging.error("websocket-client library required for --daemon. "
+                      "Install with: pip3 install websocket-client")
+        return 1
+
+    stop = threading.Event()
+    wake = threading.Event()
+    lock = threading.Lock()
+    pending = {"first": 0.0, "last": 0.0, "events": 0}
+
+    def on_change():
+        with lock:
+            now = time.monotonic()
+            if not pending["events"]:
+                pending["first"] = now
+            pending["last"] = now
+            pending["events"] += 1
+        wake.set()
+
+    def shutdown(signum, frame):
+        logging.info("Shutting down")
+        stop.set()
+        wake.set()
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+
+    # One event stream per UniFi site; any of them triggers a sync of every zone
+    mappings = sync_options.get("mappings") or load_mappings()
+    sites = list(dict.fromkeys(mapping.site for mapping in mappings))
+    zones = list(dict.fromkeys(mapping.zone for mapping in mappings))
+    listeners = [EventListener(UNIFI_URL, UNIFI_API_KEY, on_change, stop, site, events_url) for site in sites]
+    state_file = sync_options.get("state_file", STATE_FILE)
+    metrics = sync_options.get("metrics") or new_metrics()
+    damper = sync_options.get("damper")
+    # When the next held address change is due, and the retry delay for
+    # changes held in zones the last sync couldn't reach
+    schedule = {"release": float("inf"), "backoff": 0.0}
+    if metrics_port:
+        metrics.serve(metrics_port)
+
+    def run_sync(full: bool, reason: str):
+        logging.info(f"Running {'full' if full else 'incremental'} sync ({reason})")
+        if damper is not None:
+            damper.held.clear()  # Refilled by the zones this run gets to filter
+        try:
+            with metrics.phase("total"):
+                added, updated, deleted, errors = sync(**dict(sync_options, full_resync=full, metrics=metrics))
+        except Exception:
+            # Stay up: the next event, held change or reconciliation retries
+            logging.exception("Sync failed")
+            metrics.inc("daemon_exceptions_total")
+            added = updated = deleted = 0
+            errors = 1
+        metrics.record_run(errors, added=added, updated=updated, deleted=deleted)
+        if metrics_file:
+            metrics.write_textfile(metrics_file)
+        logging.info(f"Sync complete: {added} added, {updated} updated, "
+                     f"{deleted} deleted, {errors} errors")
+        if damper is not None:
+            logging.info(f"Damping: {sum(damper.held.values())} address changes held back, "
+                         f"{sum(damper.flapping(zone) for zone in damper.held)} hosts flapping")
+            schedule["release"] = release_time(damper)
+        known_ips = {}
+        for zone in zones:
+            state = load_state(zone_state_file(state_file, zone, zones), zone)
+            if state:
+                known_ips.update((h["mac"], h["ip"]) for h in state["clients"].values() if h.get("mac"))
+        for listener in listeners:
+            listener.known_ips = known_ips
+
+    def release_time(damper: Damper) -> float:
+        """
+        Monotonic time of the next sync for held changes. Only zones filtered
+        this run have fresh due times; changes held in zones the sync skipped
+        (UniFi, Netbox or DNS unreachable) are retried with a backoff instead
+        of at their long-past due time. Never sooner than `debounce`.
+        """
+        filtered = [zone for zone in zones if zone in damper.held]
+        skipped = [zone for zone in zones if zone not in damper.held]
+        due = []
+        release = damper.next_release(filtered)
+        if release is not None:
+            due.append(release - time.time())
+        if damper.next_release(skipped) is not None:
+            schedule["backoff"] = min(reconcile_interval,
+                                      schedule["backoff"] * 2 or DAEMON_RELEASE_BACKOFF)
+            due.append(schedule["backoff"])
+            logging.info(f"Held address changes in {', '.join(skipped)} retried in {schedule['backoff']:g}s")
+        else:
+            schedule["backoff"] = 0.0
+        return time.monotonic() + max(debounce, min(due)) if due else float("inf")
+
+    run_sync(True, "start-up")
+    next_full = time.monotonic() + reconcile_interval
+    for listener in listeners:
+        listener.start()
+
+    while not stop.is_set():
+        now = time.monotonic()
+        with lock:
+            events = pending["events"]
+            due = min(pending["last"] + debounce, pending["first"] + max_delay) if events else next_full
+        due = min(due, schedule["release"])
+        if now < min(due, next_full):
+            wake.wait(min(due, next_full) - now)
+            wake.clear()
+            continue
+
+        if now >= next_full:
+            with lock:
+                pending["events"] = 0
+            run_sync(True, "periodic reconciliation")
+            next_full = time.monotonic() + reconcile_interval
+        elif events:
+            with lock:
+                pending["events"] = 0
+            run_sync(False, f"{events} coalesced events")
+        else:
+            run_sync(False, "held address changes due")
+
+    for listener in listeners:
+        listener.join(timeout=5)
+    return 0
 
 
 def main():
     parser = argparse.ArgumentParser(description="Sync UniFi clients to DNS")
     parser.add_argument("--dry-run", action="store_true", help="Preview changes without applying")
     parser.add_argument("--verbose", "-v", action="store_true", help="Verbose output")
+    parser.add_argument("--workers", type=int, default=SYNC_WORKERS,
+                        help=f"Concurrent DNS record writes (default: {SYNC_WORKERS})")
+    parser.add_argument("--bulk", action="store_true",
+                        help=f"Push adds/updates as zone imports of {BULK_BATCH_SIZE} records")
+    parser.add_argument("--full-resync", action="store_true",
+                        help="Ignore the state cache and compare every host against the zone")
+    parser.add_argument("--state-file", default=STATE_FILE,
+                        help=f"State cache location (default: {STATE_FILE})")
+    parser.add_argument("--token-cache", default=TOKEN_CACHE_FILE,
+                        help=f"DNS session token cache, '' to log in every run (default: {TOKEN_CACHE_FILE})")
+    parser.add_argument("--plan-file", default="",
+                        help="With --dry-run, write the planned changes to this file")
+    parser.add_argument("--apply-plan", default="", metavar="PLAN_FILE",
+                        help="Apply a plan written by --dry-run --plan-file instead of asking UniFi")
+    parser.add_argument("--no-gc", action="store_true",
+                        help="Never delete records for hosts that left the network")
+    parser.add_argument("--gc-grace-hours", type=float, default=GC_GRACE_PERIOD / 3600,
+                        help=f"Delete owned records after this long without a UniFi sighting "
+                             f"(default: {GC_GRACE_PERIOD / 3600:g})")
+    parser.add_argument("--damping-file", default=DAMPING_FILE,
+                        help=f"Change damping state, '' to push every address change at once "
+                             f"(default: {DAMPING_FILE})")
+    parser.add_argument("--no-ptr", action="store_true",
+                        help="Only manage A records, not PTR records in PTR_ZONES")
+    parser.add_argument("--daemon", action="store_true",
+                        help="Run continuously, syncing on UniFi client events")
+    parser.add_argument("--debounce", type=float, default=DAEMON_DEBOUNCE,
+                        help=f"Daemon: quiet seconds before syncing an event burst (default: {DAEMON_DEBOUNCE})")
+    parser.add_argument("--events-url", default=UNIFI_EVENTS_URL,
+                        help="Daemon: websocket base URL of the event stream (default: derived from UNIFI_URL)")
+    parser.add_argument("--reconcile-interval", type=float, default=DAEMON_RECONCILE_INTERVAL,
+                        help=f"Daemon: seconds between full resyncs (default: {DAEMON_RECONCILE_INTERVAL})")
+    parser.add_argument("--pool-size", type=int, default=HTTP_POOL_SIZE,
+                        help=f"Max keep-alive connections per host (default: {HTTP_POOL_SIZE})")
+    parser.add_argument("--retries", type=int, default=HTTP_RETRIES,
+                        help=f"HTTP retries on connection errors and 5xx (default: {HTTP_RETRIES})")
+    parser.add_argument("--backoff", type=float, default=HTTP_BACKOFF,
+                        help=f"HTTP retry backoff factor in seconds (default: {HTTP_BACKOFF})")
+    parser.add_argument("--metrics-file", default=METRICS_FILE,
+                        help=f"Prometheus textfile to write after each run, '' to disable (default: {METRICS_FILE})")
+    parser.add_argument("--metrics-port", type=int, default=METRICS_PORT,
+                        help=f"Daemon: serve /metrics on this port, 0 to disable (default: {METRICS_PORT})")
     args = parser.parse_args()
+    if args.plan_file and not args.dry_run:
+        parser.error("--plan-file requires --dry-run")
+    if args.apply_plan and (args.dry_run or args.daemon):
+        parser.error("--apply-plan cannot be combined with --dry-run or --daemon")
 
     # Setup logging
     level = logging.DEBUG if args.verbose else logging.INFO
@@ -325,15 +1411,43 @@ def main():
 
     logging.info("=" * 60)
     logging.info("UniFi to DNS Sync")
-    logging.info(f"Zone: {DNS_ZONE}")
+    for mapping in load_mappings():
+        logging.info(f"Site {mapping.site} -> {mapping.zone} ({', '.join(mapping.networks) or 'all networks'})")
     if args.dry_run:
         logging.info("MODE: DRY-RUN (no changes will be made)")
     logging.info("=" * 60)
 
-    added, updated, errors = sync(dry_run=args.dry_run, verbose=args.verbose)
+    # Keep enough pooled connections for every worker
+    metrics = new_metrics()
+    session = metrics.attach(make_session(max(args.pool_size, args.workers), args.retries, args.backoff,
+                                          HTTP_RATE_LIMIT, BREAKER_FAILURES, BREAKER_COOLDOWN))
+    sync_options = dict(dry_run=args.dry_run, verbose=args.verbose,
+                        session=session, workers=args.workers, bulk=args.bulk,
+                        full_resync=args.full_resync, state_file=args.state_file,
+                        gc=not args.no_gc, gc_grace=args.gc_grace_hours * 3600,
+                        metrics=metrics, ptr=not args.no_ptr, token_cache=args.token_cache,
+                        plan_file=args.plan_file, from_plan=args.apply_plan)
+    damper = Damper.load(args.damping_file) if args.damping_file and not args.apply_plan else None
+    sync_options["damper"] = damper
+
+    if args.daemon:
+        sys.exit(run_daemon(sync_options, debounce=args.debounce,
+                            reconcile_interval=args.reconcile_interval,
+                            metrics_file=args.metrics_file, metrics_port=args.metrics_port,
+                            events_url=args.events_url))
+
+    with metrics.phase("total"):
+        added, updated, deleted, errors = sync(**sync_options)
+    if not args.dry_run:
+        metrics.record_run(errors, added=added, updated=updated, deleted=deleted)
+        if args.metrics_file:
+            metrics.write_textfile(args.metrics_file)
 
     logging.info("=" * 60)
-    logging.info(f"Sync complete: {added} added, {updated} updated, {errors} errors")
+    logging.info(f"Sync complete: {added} added, {updated} updated, {deleted} deleted, {errors} errors")
+    if damper is not None:
+        logging.info(f"Damping: {sum(damper.held.values())} address changes held back, "
+                     f"{sum(damper.flapping(zone) for zone in damper.held)} hosts flapping")
     logging.info("=" * 60)
 
     sys.exit(1 if errors > 0 else 0)